@@ -2,6 +2,10 @@ import logging
 import time
 import json as json_lib
 
+import metrics
+
+log = logging.getLogger(__name__)
+
 class AiChatManager:
     SYSTEM_PROMPT = (
         "You are a concise AI assistant embedded in a Meshtastic mesh radio network. "
@@ -59,7 +63,7 @@ class AiChatManager:
             else:
                 return f"Unknown AI vendor '{self.vendor}'."
         except Exception as e:
-            logging.error(f"AI API error: {e}")
+            log.error(f"AI API error: {e}")
             session["messages"].pop()
             return f"AI Error: {str(e)[:150]}"
 
@@ -82,11 +86,12 @@ class AiChatManager:
             "messages": messages
         }
         body = json_lib.dumps(payload)
-        logging.info(f"Anthropic API call: model={self.model}, url={url}")
-        resp = requests.post(url, data=body, headers=headers, timeout=30)
-        logging.info(f"Anthropic response status: {resp.status_code}")
+        log.info(f"Anthropic API call: model={self.model}, url={url}")
+        with metrics.http_timer(url):
+            resp = requests.post(url, data=body, headers=headers, timeout=30)
+        log.info(f"Anthropic response status: {resp.status_code}")
         if resp.status_code != 200:
-            logging.error(f"Anthropic error body: {resp.text[:500]}")
+            log.error(f"Anthropic error body: {resp.text[:500]}")
             error_data = resp.json() if resp.text else {}
             error_msg = error_data.get("error", {}).get("message", resp.text[:150])
             raise Exception(f"{resp.status_code}: {error_msg}")
@@ -108,7 +113,8 @@ class AiChatManager:
             "messages": oai_messages
         }
         body = json_lib.dumps(payload)
-        resp = requests.post(url, data=body, headers=headers, timeout=30)
+        with metrics.http_timer(url):
+            resp = requests.post(url, data=body, headers=headers, timeout=30)
         if resp.status_code != 200:
             error_data = resp.json() if resp.text else {}
             error_msg = error_data.get("error", {}).get("message", resp.text[:150])
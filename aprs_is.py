@@ -0,0 +1,349 @@
+"""
+aprs_is.py — MeshUpGrade APRS-IS Session
+The one APRS-IS connection the gateway keeps. APRS-IS allows one login per
+callsign, so the SMS gateway and the APRS bridge share this session instead of
+logging in twice and knocking each other off.
+
+Subscribers register the callsigns they receive messages for. The login filter
+is the merged group-message filter (g/CALL1/CALL2/...) of every subscriber, and
+one receive loop reads the socket, sends the keepalives and hands each message
+line to the subscriber that owns its addressee.
+
+When the set of callsigns changes (APRS ON/OFF, setup), the new filter is
+pushed to the open session with the "#filter" server command instead of a new
+login, so no traffic is lost. Changes within FILTER_DEBOUNCE seconds go out as
+one command; only if the server rejects it does the session log in again.
+
+Received bytes are framed by LineFramer without decoding the stream: only
+lines addressed to a subscribed callsign (and server "#" lines) are turned
+into str, so a busy feed costs little more than the socket reads
+(benchmarks/bench_framer.py).
+"""
+
+import logging
+import re
+import socket
+import threading
+import time
+
+import endpoints
+import metrics
+
+log = logging.getLogger(__name__)
+
+VERSION = "MeshUpGrade 0.4.0"
+KEEPALIVE_INTERVAL = 60   # Seconds between our "#keepalive" lines
+RX_TIMEOUT = 120          # Seconds without anything from the server before the link counts as dead
+FILTER_DEBOUNCE = 2.0     # Seconds to collect filter changes before sending one "#filter"
+FILTER_REJECTED = ("invalid", "reject", "denied", "error", "fail")  # Words in a "# filter ..." refusal
+
+APRS_IS_CONNECTS = metrics.counter("meshupgrade_aprs_is_connects_total", "APRS-IS login attempts by result", ("result",))
+
+
+def addressee(line):
+    """Addressee of an APRS message line (SRC>DEST,PATH::ADDRESSEE:text), upper case, or None."""
+    idx = line.find("::")
+    if idx < 0 or len(line) < idx + 12 or line[idx + 11] != ":":
+        return None
+    return line[idx + 2:idx + 11].strip().upper()
+
+
+class LineFramer:
+    """Splits an APRS-IS byte stream into lines inside one fixed bytearray.
+
+    Complete lines are located with C-level searches on the buffer itself. With
+    a wanted pattern (bytes regex), only server "#" lines and lines the pattern
+    matches inside are sliced out and decoded; every other line is skipped
+    without a copy. The unfinished tail moves to the front of the buffer once
+    per read. A line longer than the buffer is dropped.
+    """
+
+    def __init__(self, size=65536):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.end = 0              # Bytes of data in buf
+        self.discarding = False   # Inside an oversized line; drop up to the next newline
+        self.lines_seen = 0
+        self.lines_kept = 0
+        self.oversized = 0
+
+    def _make_room(self):
+        if self.end == len(self.buf):
+            self.oversized += 1
+            self.end = 0
+            self.discarding = True
+
+    def recv_into(self, sock):
+        """Read from sock into the free part of the buffer. Returns the byte count (0 = closed)."""
+        self._make_room()
+        n = sock.recv_into(self.view[self.end:])
+        self.end += n
+        return n
+
+    def feed(self, data, wanted=None):
+        """Append data and return the lines it completes (for streams that are not sockets)."""
+        out = []
+        data = memoryview(data)
+        while data:
+            self._make_room()
+            n = min(len(data), len(self.buf) - self.end)
+            self.view[self.end:self.end + n] = data[:n]
+            self.end += n
+            data = data[n:]
+            out.extend(self.lines(wanted))
+        return out
+
+    def lines(self, wanted=None):
+        """Complete lines in the buffer as str (all of them, or only those wanted) and consume them."""
+        buf, view, end = self.buf, self.view, self.end
+        stop = buf.rfind(b"\n", 0, end) + 1
+        if not stop:
+            if self.discarding:
+                self.end = 0  # Still inside the oversized line
+            return []
+        start = 0
+        if self.discarding:
+            start = buf.find(b"\n", 0, stop) + 1
+            self.discarding = False
+        self.lines_seen += buf.count(b"\n", start, stop)
+
+        if wanted is None:
+            out = [line.strip() for line in str(view[start:stop], "utf-8", "ignore").split("\n")]
+            out = [line for line in out if line]
+        else:
+            starts = set()
+            for m in wanted.finditer(buf, start, stop):
+                starts.add(buf.rfind(b"\n", start, m.start()) + 1 or start)
+            if start < stop and buf[start] == 35:  # '#'
+                starts.add(start)
+            i = buf.find(b"\n#", start, stop)
+            while i >= 0:
+                starts.add(i + 1)
+                i = buf.find(b"\n#", i + 1, stop)
+            out = []
+            for i in sorted(starts):
+                line = str(view[i:buf.find(b"\n", i, stop)], "utf-8", "ignore").strip()
+                if line:
+                    out.append(line)
+        self.lines_kept += len(out)
+
+        rest = end - stop
+        buf[:rest] = buf[stop:end]
+        self.end = rest
+        return out
+
+
+def addressee_pattern(callsigns):
+    """Bytes regex matching a message addressed to any of callsigns (the 9-char padded field, any case)."""
+    keys = set()
+    for call in callsigns:
+        field = call.ljust(9).encode("utf-8")
+        keys.update((field, field.upper(), field.lower()))
+    if not keys:
+        return re.compile(rb"(?!)")  # Nothing is addressed to us
+    return re.compile(b"::(?:" + b"|".join(re.escape(k) for k in sorted(keys)) + b"):")
+
+
+class AprsIsSession:
+    def __init__(self):
+        self.server = None
+        self.port = None
+        self.callsign = ""
+        self.passcode = ""
+        self.sock = None
+        self.connected = False
+        self.should_run = False
+        self.listen_thread = None
+        self.last_rx_time = 0
+        self.capture = None  # CaptureWriter shared with the engine in capture mode
+
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._subscribers = []   # (handler, callsigns_fn)
+        self._routes = {}        # CALLSIGN-SSID -> handler
+        self._wanted = addressee_pattern(())  # LineFramer prefilter for the routed callsigns
+        self.filter = ""         # Filter we want
+        self.active_filter = ""  # Filter the server has (from the login or the last "#filter")
+        self._filter_timer = None
+        self._filter_sent = None
+
+    def configure(self, callsign, passcode):
+        login = (callsign.upper().strip(), str(passcode).strip())
+        changed = login != (self.callsign, self.passcode)
+        self.callsign, self.passcode = login
+        self.refresh_filter()
+        if changed and self.connected:
+            log.info(f"APRS-IS login changed to {self.callsign}; logging in again.")
+            self._reconnect()
+
+    def subscribe(self, handler, callsigns):
+        """handler(line) gets every message line addressed to one of callsigns() (re-read on refresh_filter)."""
+        with self._lock:
+            self._subscribers.append((handler, callsigns))
+        self.refresh_filter()
+
+    def _build_routes(self):
+        routes = {}
+        for handler, callsigns in self._subscribers:
+            for call in callsigns():
+                if call:
+                    routes.setdefault(call.upper().strip(), handler)  # Earlier subscribers win a shared callsign
+        return routes
+
+    def refresh_filter(self):
+        """Recompute the merged filter after a subscriber's callsigns changed and push it to the open session."""
+        with self._lock:
+            self._routes = self._build_routes()
+            self._wanted = addressee_pattern(self._routes)
+            self.filter = "g/" + "/".join(sorted(self._routes)) if self._routes else ""
+            if not self.connected or self.filter == self.active_filter or self._filter_timer:
+                return  # The next login carries it, nothing changed, or an update is already scheduled
+            self._filter_timer = threading.Timer(FILTER_DEBOUNCE, self._push_filter)
+            self._filter_timer.daemon = True
+            self._filter_timer.start()
+
+    def _push_filter(self):
+        with self._lock:
+            self._filter_timer = None
+            new_filter = self.filter
+            if not self.connected or new_filter == self.active_filter:
+                return
+            self._filter_sent = new_filter
+        log.info(f"APRS-IS filter update: {new_filter or '(none)'}")
+        if not self.send(f"#filter {new_filter}"):
+            self._filter_sent = None  # The link is down; the reconnect logs in with the new filter
+
+    def _on_filter_reply(self, line):
+        """Server answer to the login filter or a "#filter" command."""
+        sent = self._filter_sent
+        if sent is None:
+            return  # Confirmation of the login filter
+        self._filter_sent = None
+        if any(word in line.lower() for word in FILTER_REJECTED):
+            log.warning(f"APRS-IS refused the filter update ({line}); logging in again.")
+            self._reconnect()
+        else:
+            self.active_filter = sent
+            log.info(f"APRS-IS filter active: {sent or '(none)'}")
+
+    def _reconnect(self):
+        self.disconnect()
+        self.connect()
+
+    def connect(self):
+        if not self.callsign or not self.passcode:
+            log.warning("APRS-IS not configured. Cannot connect.")
+            self.connected = False
+            return False
+
+        # A failed send marks the session down but leaves its socket open; close it before replacing it
+        with self._lock:
+            if self.sock:
+                try:
+                    self.sock.close()
+                except OSError:
+                    pass
+                self.sock = None
+
+        try:
+            self.server, self.port = endpoints.address('aprs_is')
+            log.info(f"Connecting to APRS-IS ({self.server}:{self.port}) as {self.callsign}...")
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(10)
+            sock.connect((self.server, self.port))
+
+            login_str = f"user {self.callsign} pass {self.passcode} vers {VERSION}"
+            if self.filter:
+                login_str += f" filter {self.filter}"
+            sock.send((login_str + "\r\n").encode("utf-8"))
+
+            sock.settimeout(0.5)  # Short timeout so the loop can send keepalives and notice a dead link
+            self.sock = sock
+            self.active_filter = self.filter
+            self._filter_sent = None
+            self.connected = True
+            self.should_run = True
+            self.last_rx_time = time.time()
+            self.listen_thread = threading.Thread(target=self._listen_loop, args=(sock,), daemon=True)
+            self.listen_thread.start()
+            log.info(f"APRS-IS session connected. Filter: {self.filter or '(none)'}")
+            APRS_IS_CONNECTS.inc(result="ok")
+            return True
+        except Exception as e:
+            log.error(f"APRS-IS Connection failed: {e}")
+            APRS_IS_CONNECTS.inc(result="failed")
+            self.connected = False
+            return False
+
+    def disconnect(self):
+        self.should_run = False
+        self.connected = False
+        if self.sock:
+            try:
+                self.sock.close()
+            except:
+                pass
+        self.sock = None
+        log.info("APRS-IS session disconnected.")
+
+    def send(self, packet):
+        """Write one APRS-IS line. False (and the session marked down) if the socket failed."""
+        if not self.connected or not self.sock:
+            return False
+        if not packet.endswith("\n"):
+            packet += "\r\n"
+        try:
+            with self._send_lock:
+                self.sock.send(packet.encode("utf-8"))
+            return True
+        except Exception as e:
+            log.error(f"APRS-IS send failed: {e}")
+            self.connected = False
+            return False
+
+    def dispatch(self, line):
+        """Hand one received line to the subscriber for its addressee."""
+        if line.startswith("#"):
+            if line.startswith("# filter"):
+                self._on_filter_reply(line)
+            return  # Server comments and keepalives
+        log.debug(f"APRS-IS RX: {line}")
+        call = addressee(line)
+        handler = self._routes.get(call) if call else None
+        if handler is None:
+            return
+        try:
+            handler(line)
+        except Exception as e:
+            log.error(f"APRS-IS subscriber error: {e} | line={line!r}")
+
+    def _listen_loop(self, sock):
+        framer = LineFramer()
+        last_keepalive = time.time()
+        while self.should_run and sock is self.sock:
+            try:
+                if not framer.recv_into(sock):
+                    log.error("APRS-IS connection closed by server.")
+                    break
+
+                self.last_rx_time = time.time()
+                # A capture records every line, so nothing is filtered out while one is running
+                for line in framer.lines(None if self.capture else self._wanted):
+                    if self.capture:
+                        self.capture.aprs_line("is", line)
+                    self.dispatch(line)
+            except socket.timeout:
+                now = time.time()
+                if now - last_keepalive > KEEPALIVE_INTERVAL:
+                    self.send("#keepalive")
+                    last_keepalive = now
+                if now - self.last_rx_time > RX_TIMEOUT:
+                    log.error(f"APRS-IS connection timed out (nothing received for {RX_TIMEOUT}s). Dropping.")
+                    break
+            except Exception as e:
+                if sock is self.sock:
+                    log.error(f"APRS-IS listening error: {e}")
+                break
+
+        if sock is self.sock:
+            self.connected = False
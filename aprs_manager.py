@@ -1,11 +1,17 @@
 import json
 import logging
-import os
 import re
-import socket
 import threading
 import time
 
+from aprs_tracker import AprsMessageTracker
+from aprs_uplink import get_uplink, SENT, REJECTED, DROPPED
+from storage import get_storage
+import endpoints
+import metrics
+
+log = logging.getLogger(__name__)
+
 APRS_USERS_FILE = "aprs_users.json"
 
 def convert_to_aprs_coord(lat, lon):
@@ -27,135 +33,55 @@ def convert_to_aprs_coord(lat, lon):
     
     return lat_str, lon_str
 
-def inject_aprs_packet_and_wait_ack(callsign, passcode, packet_str, wait_ack_id=None, timeout=30):
-    import http.client
-    try:
-        logging.info(f"APRS Ephemeral Inject via HTTP: {packet_str.strip()}")
-        login_call = callsign
-        if "-" not in login_call:
-            login_call += "-13"
-
-        payload = f"user {login_call} pass {passcode} vers MeshUpGrade 0.3.0\r\n{packet_str}"
-        body = payload.encode('utf-8')
-        headers = {
-            'Content-Type': 'application/octet-stream',
-            'Content-Length': str(len(body)),
-        }
-
-        conn = http.client.HTTPConnection("rotate.aprs2.net", 8080, timeout=10)
-        conn.request("POST", "/", body=body, headers=headers)
-        resp = conn.getresponse()
-        resp_body = resp.read().decode('utf-8', errors='ignore')
-        conn.close()
-
-        logging.info(f"APRS HTTP status={resp.status}: {resp_body.strip()}")
-
-        if resp.status in (200, 204):
-            return True
-        elif resp.status == 403:
-            logging.error("APRS HTTP Login rejected: Invalid passcode")
-            return False
-        else:
-            logging.error(f"APRS HTTP Inject failed with status {resp.status}: {resp_body}")
-            return False
-
-    except Exception as e:
-        logging.error(f"APRS HTTP Inject Exception: {e}")
-        return False
+def inject_aprs_packet(callsign, passcode, packet_str, on_done=None):
+    """Queue a packet on the shared APRS-IS HTTP uplink (see aprs_uplink.py). Never blocks."""
+    return get_uplink().submit(callsign, passcode, packet_str, on_done)
 
 class AprsManager:
     def __init__(self, engine, send_reply_func):
         self.engine = engine
         self.send_reply = send_reply_func
+        self.storage = get_storage()
         self.users = self._load_users()
+        self._users_lock = threading.RLock()  # Held across a change to users and its save
         self.setup_sessions = {}
-        self.rx_running = False
-        self.bounce_sock = False
-        self.host_call = "NOCALL"
-        self.host_pass = "-1"
+        self.session = None  # Shared APRS-IS session, see start_rx
+        self.rx_users = self.enabled_users()
+        # Outbound messages wait for a real ack, which only arrives over the shared session (see aprs_tracker.py)
+        self.tracker = AprsMessageTracker(lambda *args: inject_aprs_packet(*args),
+                                          link_up=lambda: bool(self.session and self.session.connected))
         
     def _load_users(self):
-        if os.path.exists(APRS_USERS_FILE):
-            try:
-                with open(APRS_USERS_FILE, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logging.error(f"Error loading {APRS_USERS_FILE}: {e}")
+        try:
+            self.storage.migrate_json(APRS_USERS_FILE, {"aprs_users": None})
+            return self.storage.load("aprs_users")
+        except Exception as e:
+            log.error(f"Error loading APRS users: {e}")
         return {}
         
-    def _save_users(self, bounce=False):
-        """Persist users to disk. Set bounce=True to force the RX daemon to reconnect (e.g. after toggling APRS on/off)."""
+    def _save_users(self):
+        """Persist users to disk and update the APRS-IS filter for whoever is now enabled."""
         try:
-            with open(APRS_USERS_FILE, 'w') as f:
-                json.dump(self.users, f, indent=4)
+            self.storage.sync("aprs_users", self.users)
         except Exception as e:
-            logging.error(f"Error saving {APRS_USERS_FILE}: {e}")
-        if bounce:
-            self.bounce_sock = True
-
-    def start_rx_daemon(self, host_call, host_pass):
-        self.host_call = host_call
-        self.host_pass = host_pass
-        if not self.rx_running:
-            self.rx_running = True
-            threading.Thread(target=self._rx_loop, daemon=True).start()
-
-    def _rx_loop(self):
-        while self.rx_running:
-            enabled_users = {}
-            for node_id, v in self.users.items():
-                if v.get('enabled'):
-                    call_with_ssid = f"{v['callsign']}-{v['suffix']}"
-                    enabled_users[call_with_ssid.upper()] = node_id
-
-            if not enabled_users:
-                time.sleep(10)
-                continue
-
-            rx_sock = None
-            try:
-                rx_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                rx_sock.settimeout(30)
-                rx_sock.connect(('rotate.aprs2.net', 14580))
-
-                login_call = self.host_call
-                if "-" not in login_call:
-                    login_call += "-15"
-
-                # Use message filter 'm/' which specifically delivers messages addressed to our registered callsigns
-                # Also add buddy filter 'b/' to additionally receive position updates from those callsigns
-                base_calls = list(set(v['callsign'] for v in self.users.values() if v.get('enabled')))
-                filter_str = "m/" + "/".join(base_calls)
-
-                login = f"user {login_call} pass {self.host_pass} vers MeshUpGrade 0.2.0 filter {filter_str}\r\n"
-                rx_sock.send(login.encode('utf-8'))
-                logging.info(f"APRS RX daemon connected. Filter: {filter_str}")
-
-                last_rx = time.time()
-                buf = ""
-
-                self.bounce_sock = False
-                while self.rx_running and not self.bounce_sock:
-                    try:
-                        data = rx_sock.recv(1024).decode('utf-8', errors='ignore')
-                        if not data: break
-                        last_rx = time.time()
-                        buf += data
-                        while '\n' in buf:
-                            line, buf = buf.split('\n', 1)
-                            self._parse_rx(line.strip(), enabled_users)
-                    except socket.timeout:
-                        if time.time() - last_rx > 120:
-                            break
-                        try: rx_sock.send(b"#keepalive\r\n")
-                        except: break
-            except Exception as e:
-                logging.error(f"APRS RX Loop Error: {e}")
-
-            if rx_sock:
-                try: rx_sock.close()
-                except: pass
-            time.sleep(5)
+            log.error(f"Error saving APRS users: {e}")
+        self.rx_users = self.enabled_users()
+        if self.session:
+            self.session.refresh_filter()
+
+    def start_rx(self, session):
+        """Receive APRS messages for every enabled user over the shared APRS-IS session (see aprs_is.py)."""
+        self.session = session
+        session.subscribe(lambda line: self._parse_rx(line, self.rx_users), lambda: self.rx_users)
+
+    def enabled_users(self):
+        """{CALLSIGN-SSID: node_id} for every user with APRS turned on."""
+        enabled_users = {}
+        for node_id, v in self.users.items():
+            if v.get('enabled'):
+                call_with_ssid = f"{v['callsign']}-{v['suffix']}"
+                enabled_users[call_with_ssid.upper()] = node_id
+        return enabled_users
 
     def _parse_rx(self, line, enabled_users):
         """Parse an incoming APRS-IS line. enabled_users is a dict of {CALLSIGN-SSID: node_id}"""
@@ -175,7 +101,11 @@ class AprsManager:
             if target_node_id:
                 src_call = head.split(">")[0]
 
-                if payload.lower().startswith("ack") or payload.lower().startswith("rej"):
+                kind = payload[:3].lower()
+                if kind in ("ack", "rej"):
+                    # Answer to one of our messages; "ack12}" is the reply-ack form
+                    acked_id = payload[3:].split("}", 1)[0].strip()
+                    self.tracker.on_ack(dest_call, src_call, acked_id, rejected=(kind == "rej"))
                     return
 
                 msg_body = payload
@@ -185,23 +115,24 @@ class AprsManager:
                     msg_body = msg_body_parts[0].strip()
                     if len(msg_body_parts) > 1:
                         msg_id = msg_body_parts[1].strip()
+                        if "}" in msg_id:
+                            # Reply-ack: "{MM}AA" also acknowledges our message AA
+                            msg_id, acked_id = msg_id.split("}", 1)
+                            if acked_id:
+                                self.tracker.on_ack(dest_call, src_call, acked_id)
 
-                logging.info(f"APRS RX match for {target_node_id} ({dest_call}): {msg_body}")
+                log.info(f"APRS RX match for {target_node_id} ({dest_call}): {msg_body}")
                 self.send_reply(target_node_id, f"APRS from {src_call}: {msg_body}")
 
                 if msg_id:
                     prof = self.users[target_node_id]
                     full_dest = f"{prof['callsign']}-{prof['suffix']}"
                     ack_pkt = f"{full_dest}>APRS,TCPIP*::{src_call.ljust(9)}:ack{msg_id}\r\n"
-                    threading.Thread(
-                        target=inject_aprs_packet_and_wait_ack,
-                        args=(prof['callsign'], prof['passcode'], ack_pkt),
-                        daemon=True
-                    ).start()
+                    inject_aprs_packet(prof['callsign'], prof['passcode'], ack_pkt)
             else:
-                logging.debug(f"APRS RX: ignored line for {tail[:9].strip()} (not in enabled_users)")
+                log.debug(f"APRS RX: ignored line for {tail[:9].strip()} (not in enabled_users)")
         except Exception as e:
-            logging.error(f"APRS Parse Error: {e} | line={line!r}")
+            log.error(f"APRS Parse Error: {e} | line={line!r}")
 
     def _get_callsign_from_longname(self, sender):
         """Extract a ham callsign from a node's longName if present."""
@@ -275,15 +206,16 @@ class AprsManager:
                         del self.setup_sessions[sender]
                         return True
                         
-                    self.users[sender] = {
-                        "callsign": callsign,
-                        "passcode": state['passcode'],
-                        "suffix": state['suffix'],
-                        "icon": state['icon'],
-                        "enabled": True,
-                        "auto_location": False
-                    }
-                    self._save_users()
+                    with self._users_lock:
+                        self.users[sender] = {
+                            "callsign": callsign,
+                            "passcode": state['passcode'],
+                            "suffix": state['suffix'],
+                            "icon": state['icon'],
+                            "enabled": True,
+                            "auto_location": False
+                        }
+                        self._save_users()
                     del self.setup_sessions[sender]
                     self.send_reply(sender, "APRS profile saved! You can now send APRS messages.")
                 else:
@@ -323,15 +255,17 @@ class AprsManager:
             if sender not in self.users:
                 self.send_reply(sender, "You must complete APRS SETUP first!")
                 return True
-            self.users[sender]['enabled'] = True
-            self._save_users(bounce=True)
+            with self._users_lock:
+                self.users[sender]['enabled'] = True
+                self._save_users()
             self.send_reply(sender, "APRS is now ON.")
             return True
             
         if cmd == "APRS OFF":
             if sender in self.users:
-                self.users[sender]['enabled'] = False
-                self._save_users(bounce=True)
+                with self._users_lock:
+                    self.users[sender]['enabled'] = False
+                    self._save_users()
             self.send_reply(sender, "APRS is now OFF.")
             return True
             
@@ -339,15 +273,17 @@ class AprsManager:
             if sender not in self.users or not self.users[sender].get('enabled'):
                 self.send_reply(sender, "You must setup and enable APRS first (APRS ON).")
                 return True
-            self.users[sender]['auto_location'] = True
-            self._save_users()
+            with self._users_lock:
+                self.users[sender]['auto_location'] = True
+                self._save_users()
             self.send_reply(sender, "APRS Auto Location is now ON. Your GPS beacons will be mirrored to aprs.fi.")
             return True
             
         if cmd == "APRS AUTO LOCATION OFF":
             if sender in self.users:
-                self.users[sender]['auto_location'] = False
-                self._save_users()
+                with self._users_lock:
+                    self.users[sender]['auto_location'] = False
+                    self._save_users()
             self.send_reply(sender, "APRS Auto Location is now OFF.")
             return True
             
@@ -390,31 +326,52 @@ class AprsManager:
             user_prof = self.users[sender]
             full_source = f"{user_prof['callsign']}-{user_prof['suffix']}"
             
-            # Message formatting
-            target_padded = target_call.ljust(9)
-            msg_id = str(int(time.time() * 10))[-3:]
-            aprs_pkt = f"{full_source}>APRS,TCPIP*::{target_padded}:{text_to_send}" + "{" + msg_id + "\r\n"
-            
-            self.send_reply(sender, f"Sending APRS message to {target_call}...")
-            
-            def bg_send():
-                success = inject_aprs_packet_and_wait_ack(
-                    user_prof['callsign'], 
-                    user_prof['passcode'], 
-                    aprs_pkt, 
-                    wait_ack_id=msg_id, 
-                    timeout=30
-                )
-                if success:
+            if not self.session or not self.session.callsign:
+                # No APRS-IS login to hear an ack on: send once without a message id, so none is expected
+                self.send_reply(sender, f"Sending APRS message to {target_call} (no delivery confirmation: the gateway has no APRS-IS login)...")
+                packet = f"{full_source}>APRS,TCPIP*::{target_call.ljust(9)}:{text_to_send}\r\n"
+                inject_aprs_packet(user_prof['callsign'], user_prof['passcode'], packet,
+                                   lambda status: self._report_untracked(sender, target_call, status))
+                return True
+
+            if not self.tracker.has_room(full_source):
+                self.send_reply(sender, "APRS: Too many messages still waiting for an ACK. Try again in a few minutes.")
+                return True
+
+            def on_result(result):
+                if result == 'acked':
                     self.send_reply(sender, f"APRS: Delivered to {target_call}!")
+                elif result == 'rejected':
+                    self.send_reply(sender, f"APRS: {target_call} rejected the message.")
+                elif result == 'failed':
+                    self.send_reply(sender, "APRS: Could not send to APRS-IS. Check your passcode with APRS SETUP.")
                 else:
                     self.send_reply(sender, f"APRS: Failed to receive ACK from {target_call}. They may be offline.")
-                    
-            threading.Thread(target=bg_send, daemon=True).start()
+
+            # Told before the first transmission, so no result can overtake it
+            if self.session.connected:
+                self.send_reply(sender, f"Sending APRS message to {target_call}...")
+            else:
+                self.send_reply(sender, f"Sending APRS message to {target_call}... APRS-IS is reconnecting; the delivery check resumes once it is back.")
+            msg_id = self.tracker.send(user_prof['callsign'], user_prof['passcode'], full_source, target_call,
+                                       text_to_send, on_result)
+            if msg_id is None:  # Another message took the last slot meanwhile
+                self.send_reply(sender, "APRS: Too many messages still waiting for an ACK. Try again in a few minutes.")
             return True
 
         return False
 
+    def _report_untracked(self, sender, target_call, status):
+        """Result of a message sent without ack tracking."""
+        if status == SENT:
+            self.send_reply(sender, f"APRS: Sent to {target_call}.")
+        elif status == REJECTED:
+            self.send_reply(sender, "APRS: Could not send to APRS-IS. Check your passcode with APRS SETUP.")
+        elif status == DROPPED:
+            self.send_reply(sender, "APRS: Gateway is busy. Try again in a minute.")
+        else:
+            self.send_reply(sender, "APRS: Could not reach APRS-IS. Try again later.")
+
     def _send_location(self, sender, manual=False):
         if sender not in self.users or not self.users[sender].get('enabled'):
             if manual:
@@ -438,9 +395,9 @@ class AprsManager:
             return
             
         # Compile packet
-        logging.info(f"APRS _send_location: raw lat={lat!r} lon={lon!r} (types: {type(lat).__name__}, {type(lon).__name__})")
+        log.info(f"APRS _send_location: raw lat={lat!r} lon={lon!r} (types: {type(lat).__name__}, {type(lon).__name__})")
         lat_str, lon_str = convert_to_aprs_coord(lat, lon)
-        logging.info(f"APRS coord strings: lat_str={lat_str!r} lon_str={lon_str!r}")
+        log.info(f"APRS coord strings: lat_str={lat_str!r} lon_str={lon_str!r}")
         user_prof = self.users[sender]
         full_source = f"{user_prof['callsign']}-{user_prof['suffix']}"
         icon_class = '/' # Primary Table
@@ -464,45 +421,39 @@ class AprsManager:
         time_str = f"{t.tm_mday:02d}{t.tm_hour:02d}{t.tm_min:02d}z"
         # Use '@' for Timestamped Position WITH Messaging to force packet uniqueness and beat duplicate filters!
         aprs_pkt = f"{full_source}>APRS,TCPIP*:@" + time_str + f"{lat_str}{icon_class}{lon_str}{icon_id}HAM licensed node. MeshUpGrade (Github!)\r\n"
-        logging.info(f"APRS final packet: {aprs_pkt.strip()!r}")
+        log.info(f"APRS final packet: {aprs_pkt.strip()!r}")
         
-        def bg_loc_send():
-            success = inject_aprs_packet_and_wait_ack(
-                user_prof['callsign'], 
-                user_prof['passcode'], 
-                aprs_pkt
-            )
-            if manual:
-                if success:
-                    self.send_reply(sender, f"APRS Location sent! Packet: {aprs_pkt.strip()}")
-                else:
-                    self.send_reply(sender, "APRS Location failed to send.")
-                    
-        threading.Thread(target=bg_loc_send, daemon=True).start()
+        def on_sent(status):
+            if status == SENT:
+                self.send_reply(sender, f"APRS Location sent! Packet: {aprs_pkt.strip()}")
+            else:
+                self.send_reply(sender, "APRS Location failed to send.")
+
+        inject_aprs_packet(user_prof['callsign'], user_prof['passcode'], aprs_pkt, on_sent if manual else None)
 
     def process_mesh_position(self, sender, lat, lon):
         """Hook for engine.py to feed live GPS data to AUTO locators."""
         if sender in self.users and self.users[sender].get('enabled') and self.users[sender].get('auto_location'):
             # Since meshtastic emits position relatively infrequently based on their own settings,
             # we respect the user's "mirror every single packet" request exactly.
-            logging.info(f"Auto-mirroring position for {sender} to APRS-IS.")
+            log.info(f"Auto-mirroring position for {sender} to APRS-IS.")
             self._send_location(sender, manual=False)
 
     def _aprs_find(self, callsign):
         """Query aprs.fi for the last-known position and info of any station. Returns a formatted string."""
-        import http.client, urllib.parse
+        import urllib.parse
         try:
             # Strip SSID for base lookup — aprs.fi returns all SSIDs of the station
             base_call = callsign.split("-")[0]
             path = f"/api/get?name={urllib.parse.quote(base_call)}&what=loc&apikey=163567.qPHfzJrAp7mMxn&format=json"
-            conn = http.client.HTTPConnection("api.aprs.fi", 80, timeout=8)
-            conn.request("GET", path, headers={"User-Agent": "MeshUpGrade/0.3"})
-            resp = conn.getresponse()
-            raw = resp.read().decode("utf-8", errors="ignore")
-            conn.close()
+            with metrics.http_timer(endpoints.host('aprs_fi')):
+                conn, base_path = endpoints.http_connection('aprs_fi', timeout=8)
+                conn.request("GET", base_path + path, headers={"User-Agent": "MeshUpGrade/0.3"})
+                resp = conn.getresponse()
+                raw = resp.read().decode("utf-8", errors="ignore")
+                conn.close()
 
-            import json as _json
-            data = _json.loads(raw)
+            data = json.loads(raw)
 
             if data.get("result") != "ok" or not data.get("entries"):
                 return f"No APRS data found for {callsign}. They may not be active."
@@ -540,6 +491,6 @@ class AprsManager:
             return "\n".join(lines)
 
         except Exception as e:
-            logging.error(f"APRS FIND error: {e}")
+            log.error(f"APRS FIND error: {e}")
             return f"Error looking up {callsign}: {e}"
 
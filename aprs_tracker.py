@@ -0,0 +1,169 @@
+"""
+aprs_tracker.py — MeshUpGrade APRS Message Tracker
+Outbound APRS messages from bridged users, tracked until the addressee acks or
+rejects them. Each source callsign has its own message-id counter, persisted so
+a restart never reuses an id that may still be live on the network, and ids
+still in flight for that source are skipped. The ack/rej comes back on the
+shared APRS-IS session (every enabled user is in its filter) and is matched on
+(source, addressee, id).
+
+Unanswered messages are retransmitted on the APRS decaying schedule: the first
+retry after RETRY_FIRST seconds, each later one twice as long (capped at
+RETRY_MAX), for at most MAX_TRIES transmissions. The in-flight table is bounded
+overall and per source, so a busy bridge can never flood APRS-IS with retries.
+While the APRS-IS session is down no ack can reach us, so retries (and the
+give-up) are held until it is back. A packet the uplink dropped or could not
+post is simply retried on the schedule; only a refused login ends the message.
+"""
+
+import logging
+import threading
+import time
+
+from aprs_uplink import REJECTED
+from engine import RetryScheduler
+from storage import get_storage
+import metrics
+
+log = logging.getLogger(__name__)
+
+RETRY_FIRST = 30        # Seconds before the first retransmit
+RETRY_MAX = 480         # Longest gap between retransmits
+MAX_TRIES = 5           # Transmissions before giving up (~15 minutes end to end)
+MAX_IN_FLIGHT = 64      # Messages awaiting an ack, all sources
+MAX_PER_SOURCE = 4      # Messages awaiting an ack from one callsign
+ID_MODULUS = 100000     # Ids run 1..99999 (APRS allows up to 5 characters)
+IDS_NS = "aprs_msg_ids"
+
+MESSAGES = metrics.counter("meshupgrade_aprs_messages_total", "Outbound APRS messages by outcome", ("result",))
+TRANSMISSIONS = metrics.counter("meshupgrade_aprs_message_transmissions_total", "APRS message transmissions (first send and retries)")
+ACK_SECONDS = metrics.histogram("meshupgrade_aprs_ack_seconds", "First transmission to APRS ack",
+                                buckets=(1, 5, 15, 30, 60, 120, 300, 900))
+
+
+def retry_interval(tries):
+    """Wait after the tries-th transmission before the next one."""
+    return min(RETRY_FIRST * 2 ** (tries - 1), RETRY_MAX)
+
+
+class AprsMessageTracker:
+    def __init__(self, transmit, link_up=None):
+        self.transmit = transmit  # transmit(callsign, passcode, packet, on_done) queues one packet on APRS-IS
+        self.link_up = link_up    # link_up() is True while acks can reach us (the APRS-IS session is connected)
+        self.storage = get_storage()
+        self._lock = threading.Lock()
+        self._in_flight = {}      # (SOURCE, ADDRESSEE, id) -> entry dict
+        self._per_source = {}     # SOURCE -> count in flight
+        self._scheduler = RetryScheduler()
+        try:
+            self._last_ids = self.storage.load(IDS_NS)
+        except Exception as e:
+            log.error(f"Error loading APRS message ids: {e}")
+            self._last_ids = {}
+        threading.Thread(target=self._retry_loop, name="aprs-retry", daemon=True).start()
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    def _next_id(self, source):
+        """Next unused message id for source (caller holds the lock)."""
+        n = int(self._last_ids.get(source, 0))
+        for _ in range(ID_MODULUS):
+            n = n % (ID_MODULUS - 1) + 1
+            if not any(key[0] == source and key[2] == str(n) for key in self._in_flight):
+                break
+        self._last_ids[source] = n
+        try:
+            self.storage.put(IDS_NS, source, n)
+        except Exception as e:
+            log.error(f"Error saving APRS message id for {source}: {e}")
+        return str(n)
+
+    def has_room(self, source):
+        """False if a message from source would be refused because the table is full."""
+        with self._lock:
+            return len(self._in_flight) < MAX_IN_FLIGHT and self._per_source.get(source.upper(), 0) < MAX_PER_SOURCE
+
+    def send(self, callsign, passcode, source, addressee, text, on_result=None):
+        """Send text from source to addressee until acked. Returns the message id, or None if the table is full.
+
+        on_result(result) runs once with 'acked', 'rejected', 'timeout' or 'failed' (APRS-IS refused the login).
+        """
+        source, addressee = source.upper(), addressee.upper()
+        with self._lock:
+            if len(self._in_flight) >= MAX_IN_FLIGHT or self._per_source.get(source, 0) >= MAX_PER_SOURCE:
+                MESSAGES.inc(result="dropped")
+                log.warning(f"APRS in-flight table full; not sending {source} -> {addressee}.")
+                return None
+            msg_id = self._next_id(source)
+            key = (source, addressee, msg_id)
+            self._in_flight[key] = {
+                'callsign': callsign,
+                'passcode': passcode,
+                'packet': f"{source}>APRS,TCPIP*::{addressee.ljust(9)}:{text}{{{msg_id}\r\n",
+                'tries': 0,
+                'first_sent': time.time(),
+                'on_result': on_result,
+            }
+            self._per_source[source] = self._per_source.get(source, 0) + 1
+        self._transmit(key)
+        return msg_id
+
+    def _transmit(self, key):
+        with self._lock:
+            entry = self._in_flight.get(key)
+            if entry is None:
+                return
+            entry['tries'] += 1
+            tries = entry['tries']
+            self._scheduler.schedule(key, time.time() + retry_interval(tries))
+        TRANSMISSIONS.inc()
+        log.info(f"APRS message {key[2]} {key[0]} -> {key[1]}: transmission {tries}/{MAX_TRIES}")
+        self.transmit(entry['callsign'], entry['passcode'], entry['packet'],
+                      lambda status: self._on_sent(key, status))
+
+    def _on_sent(self, key, status):
+        if status == REJECTED:
+            # Bad passcode: no retry can succeed
+            self._finish(key, 'failed')
+
+    def on_ack(self, source, addressee, msg_id, rejected=False):
+        """ack/rej from addressee for source's msg_id, seen on APRS-IS. True if it matched a tracked message."""
+        key = (source.upper(), addressee.upper(), msg_id.strip())
+        entry = self._finish(key, 'rejected' if rejected else 'acked')
+        if entry is None:
+            log.debug(f"APRS {'rej' if rejected else 'ack'}{msg_id} from {addressee} to {source} matched nothing.")
+            return False
+        ACK_SECONDS.observe(time.time() - entry['first_sent'])
+        return True
+
+    def _finish(self, key, result):
+        with self._lock:
+            entry = self._in_flight.pop(key, None)
+            if entry is None:
+                return None
+            self._scheduler.cancel(key)
+            self._per_source[key[0]] -= 1
+            if not self._per_source[key[0]]:
+                del self._per_source[key[0]]
+        MESSAGES.inc(result=result)
+        log.info(f"APRS message {key[2]} {key[0]} -> {key[1]}: {result} after {entry['tries']} transmission(s)")
+        if entry['on_result']:
+            try:
+                entry['on_result'](result)
+            except Exception as e:
+                log.error(f"APRS message result callback error: {e}")
+        return entry
+
+    def _retry_loop(self):
+        while True:
+            key = self._scheduler.next_due(ready=self.link_up)
+            with self._lock:
+                entry = self._in_flight.get(key)
+                exhausted = entry is not None and entry['tries'] >= MAX_TRIES
+            if entry is None:
+                continue
+            if exhausted:
+                self._finish(key, 'timeout')
+            else:
+                self._transmit(key)
@@ -0,0 +1,210 @@
+"""
+aprs_uplink.py — MeshUpGrade APRS-IS HTTP Uplink
+Sends APRS packets to APRS-IS through the HTTP inject endpoint on a small
+fixed pool of workers, each holding a keep-alive connection to the server.
+Packets for the same login go out in order, and whatever queued up for a login
+while its previous POST was in flight goes out together as one POST (APRS-IS
+takes several packet lines after the login line). An auto-location user
+beaconing every few seconds therefore costs one request on an open
+connection per beacon, not a TCP and HTTP setup plus a thread.
+"""
+
+import collections
+import http.client
+import logging
+import queue
+import threading
+
+import endpoints
+import metrics
+
+log = logging.getLogger(__name__)
+
+VERSION = "MeshUpGrade 0.3.0"
+
+PACKETS = metrics.counter("meshupgrade_aprs_uplink_packets_total", "Packets sent through the APRS-IS HTTP uplink",
+                          ("result",))
+BATCH_SIZE = metrics.histogram("meshupgrade_aprs_uplink_batch_packets", "Packets per APRS-IS HTTP POST",
+                               buckets=(1, 2, 3, 5, 10, 20))
+
+
+# How a packet ended up: accepted, login refused (bad passcode), other error, or never sent (queue full)
+SENT, REJECTED, FAILED, DROPPED = 'sent', 'rejected', 'failed', 'dropped'
+
+
+class _Packet:
+    __slots__ = ('text', 'on_done', 'status', 'done')
+
+    def __init__(self, text, on_done):
+        self.text = text if text.endswith("\r\n") else text.rstrip("\r\n") + "\r\n"
+        self.on_done = on_done
+        self.status = None
+        self.done = threading.Event()
+
+    def finish(self, status):
+        self.status = status
+        self.done.set()
+        if self.on_done:
+            try:
+                self.on_done(status)
+            except Exception as e:
+                log.error(f"APRS uplink completion callback error: {e}")
+
+    def wait(self, timeout=None):
+        """True once the server accepted the packet; False if rejected, dropped or still pending after timeout."""
+        self.done.wait(timeout)
+        return self.status == SENT
+
+
+class AprsUplink:
+    def __init__(self, workers=2, max_batch=20, max_queue=500, timeout=10):
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = {}            # (login, passcode) -> deque of packets; present while queued or posting
+        self._ready = queue.Queue()   # logins with queued packets and no worker on them
+        self._depth = 0
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.posts = 0
+        self.connects = 0
+
+        self.workers = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._worker, name=f"aprs-uplink-{i}", daemon=True)
+            t.start()
+            self.workers.append(t)
+
+    def submit(self, callsign, passcode, packet_str, on_done=None):
+        """Queue one packet; never blocks.
+
+        on_done(status) runs once with SENT, REJECTED, FAILED or DROPPED: on an uplink worker, or
+        before submit returns if the queue is full.
+        """
+        login = callsign if "-" in callsign else callsign + "-13"
+        packet = _Packet(packet_str, on_done)
+        with self._lock:
+            if self._depth >= self.max_queue:
+                self.dropped += 1
+                PACKETS.inc(result=DROPPED)
+                log.warning(f"APRS uplink queue full ({self.max_queue}). Dropping packet from {login}.")
+                drop = True
+            else:
+                drop = False
+                self._depth += 1
+                key = (login, str(passcode))
+                packets = self._pending.get(key)
+                if packets is None:
+                    self._pending[key] = collections.deque([packet])
+                    self._ready.put(key)
+                else:
+                    packets.append(packet)
+        if drop:
+            packet.finish(DROPPED)
+        return packet
+
+    def send(self, callsign, passcode, packet_str, timeout=30):
+        """Blocking submit: True if APRS-IS accepted the packet within timeout."""
+        return self.submit(callsign, passcode, packet_str).wait(timeout)
+
+    def _worker(self):
+        conn = None  # (url, HTTPConnection, base_path), kept alive between POSTs
+        while True:
+            key = self._ready.get()
+            with self._lock:
+                packets = self._pending[key]
+                batch = [packets.popleft() for _ in range(min(self.max_batch, len(packets)))]
+                self._depth -= len(batch)
+
+            conn, status = self._post(conn, key, batch)
+            with self._lock:
+                self.posts += 1
+                if status == SENT:
+                    self.sent += len(batch)
+                else:
+                    self.failed += len(batch)
+                if self._pending[key]:
+                    self._ready.put(key)
+                else:
+                    del self._pending[key]
+            BATCH_SIZE.observe(len(batch))
+            PACKETS.inc(len(batch), result=status)
+            for packet in batch:
+                packet.finish(status)
+
+    def _connect(self):
+        with self._lock:
+            self.connects += 1
+        http_conn, base_path = endpoints.http_connection('aprs_http', timeout=self.timeout)
+        return endpoints.url('aprs_http'), http_conn, base_path
+
+    def _post(self, conn, key, batch):
+        """POST batch for login key. Returns (connection to keep or None, SENT/REJECTED/FAILED)."""
+        login, passcode = key
+        body = f"user {login} pass {passcode} vers {VERSION}\r\n{''.join(p.text for p in batch)}".encode('utf-8')
+        headers = {'Content-Type': 'application/octet-stream', 'Content-Length': str(len(body))}
+        for text in (p.text for p in batch):
+            log.info(f"APRS Inject via HTTP: {text.strip()}")
+
+        if conn and conn[0] != endpoints.url('aprs_http'):
+            conn[1].close()  # Endpoint was reconfigured
+            conn = None
+        for attempt in range(2):
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            url, http_conn, base_path = conn
+            try:
+                with metrics.http_timer(endpoints.host('aprs_http')):
+                    http_conn.request("POST", base_path + "/", body=body, headers=headers)
+                    resp = http_conn.getresponse()
+                    resp_body = resp.read().decode('utf-8', errors='ignore')
+                break
+            except (http.client.HTTPException, OSError) as e:
+                http_conn.close()
+                conn = None
+                if reused and attempt == 0:
+                    continue  # The server closed the idle keep-alive connection; retry on a fresh one
+                log.error(f"APRS HTTP Inject Exception: {e}")
+                return None, FAILED
+
+        if resp.will_close:
+            http_conn.close()
+            conn = None
+        log.info(f"APRS HTTP status={resp.status} ({len(batch)} packet(s) for {login}): {resp_body.strip()}")
+        if resp.status in (200, 204):
+            return conn, SENT
+        if resp.status == 403:
+            log.error(f"APRS HTTP Login rejected for {login}: Invalid passcode")
+            return conn, REJECTED
+        log.error(f"APRS HTTP Inject failed with status {resp.status}: {resp_body}")
+        return conn, FAILED
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self._depth,
+                'active_logins': len(self._pending),
+                'workers': len(self.workers),
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'posts': self.posts,
+                'connects': self.connects,
+            }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_uplink():
+    """Shared AprsUplink for the process."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AprsUplink()
+        return _default
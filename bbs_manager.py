@@ -1,4 +1,3 @@
-import os
 import json
 import logging
 import time
@@ -6,9 +5,15 @@ import re
 import threading
 from datetime import datetime
 
+from engine import PRIORITY_NOTIFY
+from storage import get_storage
+
+log = logging.getLogger(__name__)
+
 class BbsManager:
     def __init__(self, engine, send_reply_func, settings):
         self.filename = "bbs_store.json"
+        self.storage = get_storage()
         self.engine = engine
         self.send_reply = send_reply_func
         self.settings = settings
@@ -18,6 +23,8 @@ class BbsManager:
         self.max_exp = int(self.settings.get("bbs_max_exp", 48))
         self.bbs_channel = int(self.settings.get("bbs_channel", -1))
         
+        # Commands from different senders run on parallel workers; one BBS command at a time
+        self._lock = threading.RLock()
         self.store = {"messages": {}, "subscriptions": {}}
         for g in self.groups:
             self.store["messages"][g] = []
@@ -26,28 +33,34 @@ class BbsManager:
         self.load_store()
 
     def load_store(self):
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, 'r') as f:
-                    data = json.load(f)
-                    
-                # Merge loaded data into expected structure
-                for g in self.groups:
-                    if g in data.get("messages", {}):
-                        self.store["messages"][g] = data["messages"][g]
-                    if g in data.get("subscriptions", {}):
-                        self.store["subscriptions"][g] = data["subscriptions"][g]
-                        
-            except Exception as e:
-                logging.error(f"Failed to load bbs_store.json: {e}")
+        try:
+            self.storage.migrate_json(self.filename, {
+                "bbs_messages": lambda d: d.get("messages", {}),
+                "bbs_subscriptions": lambda d: d.get("subscriptions", {}),
+            })
+            data = {
+                "messages": self.storage.load("bbs_messages"),
+                "subscriptions": self.storage.load("bbs_subscriptions"),
+            }
+
+            # Merge loaded data into expected structure
+            for g in self.groups:
+                if g in data.get("messages", {}):
+                    self.store["messages"][g] = data["messages"][g]
+                if g in data.get("subscriptions", {}):
+                    self.store["subscriptions"][g] = data["subscriptions"][g]
+
+        except Exception as e:
+            log.error(f"Failed to load BBS store: {e}")
         self._prune_expired()
 
     def save_store(self):
+        # One row per group: posting to a board only rewrites that board
         try:
-            with open(self.filename, 'w') as f:
-                json.dump(self.store, f, indent=4)
+            self.storage.sync("bbs_messages", self.store["messages"])
+            self.storage.sync("bbs_subscriptions", self.store["subscriptions"])
         except Exception as e:
-            logging.error(f"Failed to save bbs_store.json: {e}")
+            log.error(f"Failed to save BBS store: {e}")
 
     def _prune_expired(self):
         now = int(time.time())
@@ -61,6 +74,10 @@ class BbsManager:
             self.save_store()
 
     def parse_command(self, msg, sender, channel_index):
+        with self._lock:
+            self._parse_command(msg, sender, channel_index)
+
+    def _parse_command(self, msg, sender, channel_index):
         self._prune_expired()
         parts = msg.strip().split(" ")
         
@@ -168,11 +185,7 @@ class BbsManager:
             exp_ts = now + (exp_hrs * 3600)
             
             # Get shortname for sender if possible
-            sender_name = sender
-            if hasattr(self.engine, 'interface') and self.engine.interface:
-                node = self.engine.interface.nodes.get(sender)
-                if node and 'user' in node and 'shortName' in node['user']:
-                    sender_name = node['user']['shortName']
+            sender_name = self.engine.node_directory.shortname(sender) or sender
             
             self.store["messages"][group].append({
                 "sender": sender_name,
@@ -184,17 +197,11 @@ class BbsManager:
             
             self.send_reply(sender, f"Posted to {group.upper()}! (Expires in {exp_hrs}h)", channel_index)
 
-            # Notify subscribers — run in background thread so we don't block the message handler
+            # Notify subscribers — queued at notification priority, the engine's outbound scheduler paces them
             notification_str = f"BBS {group.upper()}: '{msg_body[:80]}' -{sender_name}"
-            subscribers = list(self.store["subscriptions"][group])  # snapshot
-
-            def _notify(subs, notif):
-                for sub in subs:
-                    if sub != sender:
-                        time.sleep(5)  # 5s stagger is enough; no need for 15s
-                        self.engine.send_dm(sub, notif)
-
-            threading.Thread(target=_notify, args=(subscribers, notification_str), daemon=True).start()
+            for sub in self.store["subscriptions"][group]:
+                if sub != sender:
+                    self.engine.send_dm(sub, notification_str, priority=PRIORITY_NOTIFY)
 
         if cmd == "BBSADDGROUP":
             if len(parts) < 2:
@@ -235,4 +242,4 @@ class BbsManager:
             with open("settings.json", 'w') as f:
                 json.dump(self.settings, f, indent=4)
         except Exception as e:
-            logging.error(f"Failed to save settings.json: {e}")
+            log.error(f"Failed to save settings.json: {e}")
@@ -0,0 +1,75 @@
+"""
+Cost of matching and clearing an ACK with a large number of pending DMs.
+
+The old handler looked up requestId, fell back to a str() comparison scan over
+every tracked id on a type mismatch, then scanned everything again to clear the
+acked destination. The engine now normalizes the id and pops just that packet
+from the DeliveryTracker (get + pop), which should stay flat as it grows.
+Run from the repo root: python benchmarks/bench_ack.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import DeliveryTracker
+
+SIZES = (1_000, 10_000, 50_000)
+ACKS = 500
+DESTS = 200
+
+
+def entry(i):
+    return {'dest_id': f"!{i % DESTS:08x}", 'message': "x", 'retries': 0, 'last_sent': 0}
+
+
+def legacy_ack(tracker, req_id):
+    matched_id = None
+    if req_id in tracker:
+        matched_id = req_id
+    else:
+        for tracked_id in tracker:
+            if str(tracked_id) == str(req_id):
+                matched_id = tracked_id
+                break
+    if matched_id is None:
+        return
+    dest = tracker[matched_id]['dest_id']
+    for pid in [pid for pid, d in tracker.items() if d['dest_id'] == dest]:
+        del tracker[pid]
+
+
+def bench(size):
+    # Meshtastic reports requestId as a string here, so the legacy path always hits the slow scan
+    legacy = {i: entry(i) for i in range(size)}
+    start = time.perf_counter()
+    for n in range(ACKS):
+        i = size - 1 - n
+        legacy_ack(legacy, str(i))
+        legacy.setdefault(i, entry(i))
+    legacy_t = (time.perf_counter() - start) / ACKS
+
+    tracker = DeliveryTracker()
+    for i in range(size):
+        tracker.add(i, entry(i))
+    start = time.perf_counter()
+    for n in range(ACKS):
+        i = size - 1 - n
+        if tracker.get(str(i)) is not None:
+            tracker.pop(str(i))
+        tracker.add(i, entry(i))
+    tracker_t = (time.perf_counter() - start) / ACKS
+    return legacy_t, tracker_t
+
+
+def main():
+    print(f"{'pending':>8} {'legacy us/ack':>14} {'tracker us/ack':>15} {'speedup':>8}")
+    for size in SIZES:
+        legacy_t, tracker_t = bench(size)
+        print(f"{size:>8} {legacy_t * 1e6:>14.1f} {tracker_t * 1e6:>15.1f} {legacy_t / tracker_t:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
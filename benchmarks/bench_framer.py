@@ -0,0 +1,126 @@
+"""
+Lines/s for the APRS-IS receive path: the LineFramer with the addressee
+prefilter against the str split loop it replaced.
+
+The input is an APRS-IS stream as raw bytes, e.g. a minute of the full feed:
+    timeout 60 nc rotate.aprs2.net 10152 > fullfeed.raw
+    python benchmarks/bench_framer.py fullfeed.raw
+Without a file a synthetic full-feed mix is used (positions, weather, objects,
+telemetry, server comments and a few messages, one in 500 addressed to us).
+The stream is fed in recv-sized chunks; each path runs best of 5.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aprs_is import AprsIsSession, LineFramer, addressee
+
+REPEATS = 5
+OUR_CALLS = ("N0GW", "KD9XYZ-7", "K1ABC-9")
+
+
+def synthetic_stream(lines=200000, seed=1):
+    rnd = random.Random(seed)
+    calls = [f"{rnd.choice('KNW')}{rnd.choice('ABCDEFG')}{rnd.randint(0, 9)}{''.join(rnd.choices('ABCDEFGHJKLMNPQRSTUVWXYZ', k=3))}"
+             for _ in range(2000)]
+    templates = (
+        "{c}-9>APDR16,TCPIP*,qAC,T2TEXAS:={lat}N/{lon}W[/A=000{alt} Mobile on the road",
+        "{c}>APRS,WIDE2-1,qAR,{g}:!{lat}N/{lon}W-PHG2360 Home station",
+        "{c}-13>APRX29,TCPIP*,qAC,T2SYDNEY:_10090556c220s004g005t077r000p000P000h50b09900wRSW",
+        "{c}>APN391,qAR,{g}:;444.500 *111111z{lat}N/{lon}Wr T100 R50m",
+        "{c}-1>APMI06,TCPIP*,qAC,T2FINLAND:T#123,099,120,001,000,050,00000000",
+        "{c}>APRS,TCPIP*,qAC,T2BOSTON::{d}:Net starts at 2000z{{{n}",
+    )
+    out = []
+    for i in range(lines):
+        if i % 5000 == 0:
+            out.append(f"# aprsc 2.1.19-g730c5c0 {i} GMT T2FINLAND 85.188.1.129:10152")
+            continue
+        c, g = rnd.choice(calls), rnd.choice(calls)
+        if i % 500 == 250:
+            line = f"{c}>APRS,TCPIP*,qAC,T2TEXAS::{rnd.choice(OUR_CALLS).ljust(9)}:Are you on the mesh?{{{i % 99}"
+        else:
+            line = rnd.choice(templates).format(
+                c=c, g=g, d=rnd.choice(calls).ljust(9), n=i % 99, alt=rnd.randint(100, 999),
+                lat=f"{rnd.randint(2500, 4800)}.{rnd.randint(0, 99):02d}",
+                lon=f"{rnd.randint(7000, 12000):05d}.{rnd.randint(0, 99):02d}")
+        out.append(line)
+    return ("\r\n".join(out) + "\r\n").encode("utf-8")
+
+
+def chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def legacy(parts, want):
+    """The receive loop before the framer: decode each chunk, append, split one line at a time."""
+    n = 0
+    buf = ""
+    for part in parts:
+        buf += part.decode("utf-8", errors="ignore")
+        while "\n" in buf:
+            line, buf = buf.split("\n", 1)
+            line = line.strip()
+            if want(line):
+                n += 1
+    return n
+
+
+def framed(parts, wanted):
+    n = 0
+    framer = LineFramer()
+    for part in parts:
+        n += len(framer.feed(part, wanted))
+    return n
+
+
+def best(fn):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the APRS-IS line framer.")
+    parser.add_argument("stream", nargs="?", help="raw APRS-IS stream (default: synthetic full feed)")
+    parser.add_argument("--lines", type=int, default=200000, help="synthetic stream length")
+    parser.add_argument("--chunk", type=int, default=4096, help="bytes per simulated recv")
+    args = parser.parse_args()
+
+    if args.stream:
+        with open(args.stream, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_stream(args.lines)
+    parts = chunks(data, args.chunk)
+
+    session = AprsIsSession()
+    session.subscribe(lambda line: None, lambda: OUR_CALLS)
+
+    def want(line):
+        return line.startswith("#") or addressee(line) in session._routes
+
+    total = data.count(b"\n")
+    print(f"{len(data) / 1e6:.1f} MB, {total:,} lines, {args.chunk}-byte reads")
+    print(f"{'path':28s} {'lines/s':>12s} {'MB/s':>8s} {'kept':>8s}")
+    rows = (
+        ("str split loop", lambda: legacy(parts, want)),
+        ("framer, every line decoded", lambda: framed(parts, None)),
+        ("framer + addressee filter", lambda: framed(parts, session._wanted)),
+    )
+    for name, fn in rows:
+        elapsed, kept = best(fn)
+        print(f"{name:28s} {total / elapsed:12,.0f} {len(data) / elapsed / 1e6:8.1f} {kept:8,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Ops/s and allocations for the pure-Python parsers and formatters.
+
+Every case runs against fixed fixtures with no radio and no network: APRS-IS
+lines, an Open-Meteo forecast, a satellite API answer, reminder and BBS
+commands, and the headless command chain (HELP, STATUS, ...). For each case it
+reports operations per second (best of 5 timed batches) and, under tracemalloc,
+the peak memory a single call allocates and the memory still held per call
+after a batch (a leak shows up there).
+
+Regression check between releases:
+    python benchmarks/bench_parsers.py --save baseline.json      # on the release
+    python benchmarks/bench_parsers.py --compare baseline.json   # on the candidate
+--compare exits 1 when a case is slower, or allocates more, than the baseline
+by more than --tolerance (default 25%). Compare on the same machine only.
+Run from the repo root; name cases (or prefixes like "aprs") to run a subset.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TIMED_BATCH = 0.1    # Seconds per timed batch (the batch size is calibrated to reach this)
+REPEATS = 5
+ALLOC_CALLS = 200
+ALLOC_SLACK = 256    # Bytes of peak growth ignored by --compare (interpreter noise)
+
+# Fixture APRS-IS traffic: messages for us, for others, ACKs, SMSGTE replies and positions
+LINE_RX_MATCH = "KD9ABC-7>APDR16,TCPIP*,qAC,T2TEXAS::KD9XYZ-7 :Are you on the mesh tonight?{42"
+LINE_RX_OTHER = "W1AW-9>APRS,TCPIP*,qAC,T2BOSTON::N0CALL-5 :Net starts at 2000z{17"
+LINE_RX_ACK = "KD9ABC-7>APDR16,TCPIP*,qAC,T2TEXAS::KD9XYZ-7 :ack42"
+LINE_SMS_REPLY = "SMSGTE>APSMS1,TCPIP,qAS,SMSGTE::GATEWAY  :@5551234567 Running late, be there at 6{1A"
+LINE_SMS_OTHER = "N0CALL>APRS,TCPIP*,qAC,T2SYDNEY:!3351.00S/15112.00E-PHG2360 Sydney iGate"
+
+
+def forecast_fixture():
+    """Open-Meteo answer shaped like the real one, anchored on the current hour so WX2 has data."""
+    hour = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+    today = datetime.now().date()
+    return {
+        'hourly': {
+            'time': [(hour + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(72)],
+            'temperature_2m': [55.0 + (i % 24) * 0.8 for i in range(72)],
+            'weathercode': [(0, 2, 3, 61, 80, 95)[i % 6] for i in range(72)],
+        },
+        'daily': {
+            'time': [(today + timedelta(days=i)).isoformat() for i in range(7)],
+            'temperature_2m_max': [71.4, 68.2, 75.9, 80.1, 77.3, 69.0, 66.6],
+            'temperature_2m_min': [52.1, 50.0, 55.5, 60.2, 58.8, 49.9, 47.3],
+            'weathercode': [0, 3, 61, 95, 2, 45, 71],
+        },
+        'current_weather': {'temperature': 63.2, 'windspeed': 8.1, 'winddirection': 220, 'weathercode': 2},
+    }
+
+
+class Silent:
+    """Stand-in for every outbound path (mesh sends, APRS-IS socket)."""
+    def __call__(self, *args, **kwargs):
+        pass
+
+    def send(self, data):
+        return len(data)
+
+
+def build_cases():
+    import aprs_manager
+    import headless
+    import satellite
+    from aprs_manager import AprsManager, convert_to_aprs_coord
+    from bbs_manager import BbsManager
+    from reminders import ReminderManager
+    from sms_gateway import AprsIsGateway
+    from weather import WeatherPlugin
+
+    logging.getLogger().setLevel(logging.WARNING)  # Measure the code, not the console
+    silent = Silent()
+    settings = {"lat": "40.7128", "lon": "-74.0060", "bbs_active_groups": ["general", "swap"], "use_signal_test": True}
+
+    app = headless.build(settings)
+    engine = app['engine']
+    engine.send_dm = engine.send_broadcast = silent
+    process_command = app['process_command']
+
+    aprs_manager.inject_aprs_packet = silent  # ACKs to matched messages go nowhere
+    aprs = AprsManager(engine, silent)
+    aprs.users = {'!a1b2c3d4': {'callsign': 'KD9XYZ', 'suffix': '7', 'passcode': '12345', 'enabled': True}}
+    enabled = aprs.enabled_users()
+
+    gateway = AprsIsGateway(callback_on_sms_reply=silent)
+    gateway.configure("GATEWAY", "12345")
+    gateway.session.sock = silent
+    gateway.session.connected = True
+    gateway.routing_table = {'5551234567': '!a1b2c3d4'}
+
+    wx = WeatherPlugin(40.7128, -74.0060)
+    forecast = forecast_fixture()
+    wx.get_weather_data = lambda: forecast
+
+    iss = {'latitude': 12.34, 'longitude': -45.67, 'altitude': 421.9, 'velocity': 27580.0, 'visibility': 'daylight'}
+    satellite._http_get_json = lambda host, path, timeout=8: iss
+
+    reminders = ReminderManager(silent)
+    next_year = datetime.now().year + 1
+
+    def rmd_add():
+        reminders.parse_command(f"RMD 14:00 {next_year}-03-25 Fix antenna on the tower", "!a1b2c3d4", None)
+        reminders.reminders.pop()  # Keep the table at a fixed size
+
+    bbs = BbsManager(engine, silent, settings)
+    now = int(time.time())
+    bbs.store["messages"]["general"] = [
+        {"sender": f"N{i:03d}", "timestamp": now - i * 60, "expiration": now + 86400, "message": f"Post {i} " + "x" * 100}
+        for i in range(50)
+    ]
+
+    return {
+        'aprs_parse_rx_match': lambda: aprs._parse_rx(LINE_RX_MATCH, enabled),
+        'aprs_parse_rx_other': lambda: aprs._parse_rx(LINE_RX_OTHER, enabled),
+        'aprs_parse_rx_ack': lambda: aprs._parse_rx(LINE_RX_ACK, enabled),
+        'aprs_coord': lambda: convert_to_aprs_coord(40.712776, -74.005974),
+        'sms_parse_line_reply': lambda: gateway._parse_line(LINE_SMS_REPLY),
+        'sms_parse_line_other': lambda: gateway._parse_line(LINE_SMS_OTHER),
+        'wx1': wx.format_wx1,
+        'wx2': wx.format_wx2,
+        'rmd_menu': lambda: reminders.parse_command("RMD", "!a1b2c3d4", None),
+        'rmd_add': rmd_add,
+        'bbs_menu': lambda: bbs.parse_command("BBS", "!a1b2c3d4", None),
+        'bbs_rx': lambda: bbs.parse_command("BBSRX general p7", "!a1b2c3d4", None),
+        'sat_next_pass': lambda: satellite.get_next_pass(40.7128, -74.0060),
+        'cmd_help': lambda: process_command("help", "!a1b2c3d4", {}),
+        'cmd_status': lambda: process_command("STATUS", "!a1b2c3d4", {}),
+        'cmd_rmd_menu': lambda: process_command("rmd", "!a1b2c3d4", {}),
+        'cmd_bbs_rx': lambda: process_command("bbsrx general p3", "!a1b2c3d4", {}),
+        'cmd_unknown': lambda: process_command("hello there", "!a1b2c3d4", {'rxSnr': 6.25, 'rxRssi': -97}),
+    }
+
+
+def time_case(fn):
+    n = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= TIMED_BATCH:
+            break
+        n *= 2
+    best = elapsed
+    for _ in range(REPEATS - 1):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return n / best
+
+
+def alloc_case(fn):
+    """(median peak bytes allocated by one call, bytes still held per call after a batch)"""
+    fn()  # Warm caches (strptime, regexes) outside the trace
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(20):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in range(ALLOC_CALLS):
+            fn()
+        retained = (tracemalloc.get_traced_memory()[0] - base) / ALLOC_CALLS
+    finally:
+        tracemalloc.stop()
+    return sorted(peaks)[len(peaks) // 2], max(0.0, retained)
+
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, r in results.items():
+        b = baseline.get('cases', {}).get(name)
+        if not b:
+            continue
+        if r['ops'] < b['ops'] * (1 - tolerance):
+            failures.append(f"{name}: {r['ops']:,.0f} ops/s vs {b['ops']:,.0f} baseline")
+        if r['peak_bytes'] > b['peak_bytes'] * (1 + tolerance) + ALLOC_SLACK:
+            failures.append(f"{name}: peak {r['peak_bytes']:,} B/call vs {b['peak_bytes']:,} baseline")
+        if r['retained_bytes'] > b['retained_bytes'] * (1 + tolerance) + ALLOC_SLACK:
+            failures.append(f"{name}: retains {r['retained_bytes']:,.0f} B/call vs {b['retained_bytes']:,.0f} baseline")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for MeshUpGrade parsers and formatters.")
+    parser.add_argument("cases", nargs="*", help="case names or prefixes to run (default: all)")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    save = os.path.abspath(args.save) if args.save else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    # The managers persist to meshupgrade.db in the working directory; keep the real one out of it
+    os.chdir(tempfile.mkdtemp(prefix="meshupgrade-bench-"))
+    cases = build_cases()
+    if args.cases:
+        cases = {k: v for k, v in cases.items() if any(k.startswith(p) for p in args.cases)}
+
+    results = {}
+    print(f"{'case':22s} {'ops/s':>12s} {'peak B/call':>12s} {'held B/call':>12s}")
+    for name, fn in cases.items():
+        ops = time_case(fn)
+        peak, retained = alloc_case(fn)
+        results[name] = {'ops': ops, 'peak_bytes': peak, 'retained_bytes': retained}
+        print(f"{name:22s} {ops:12,.0f} {peak:12,} {retained:12,.0f}")
+
+    if save:
+        with open(save, "w") as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'cases': results}, f, indent=2)
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        failures = compare(results, baseline, args.tolerance)
+        for line in failures:
+            print(f"REGRESSION {line}")
+        if failures:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Write amplification of state saves: full JSON dumps vs. SQLite row upserts.
+
+Simulates a busy gateway: a 2000-node cache and 20 BBS groups of 50 posts,
+then applies single-record changes. The legacy path rewrites the whole JSON
+file (indent=4) on every change; Storage.sync() upserts only the changed row.
+Bytes written for SQLite are measured as WAL growth (checkpoints disabled).
+Run from the repo root: python benchmarks/bench_storage.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Storage
+
+UPDATES = 200
+
+
+def make_state():
+    nodes = {
+        f"!{i:08x}": {'shortName': f"N{i % 1000}", 'longName': f"Node {i} KD9XYZ", 'hwModel': "HELTEC_V3", 'lastHeard': 1700000000 + i}
+        for i in range(2000)
+    }
+    bbs = {
+        f"group{g}": [{"sender": "ABCD", "timestamp": 1700000000 + n, "expiration": 1800000000, "message": "x" * 120} for n in range(50)]
+        for g in range(20)
+    }
+    return {'node_cache': nodes, 'bbs_messages': bbs}
+
+
+def mutate(state, i):
+    node_id = f"!{i % 2000:08x}"
+    state['node_cache'][node_id]['lastHeard'] += 1
+    group = state['bbs_messages'][f"group{i % 20}"]
+    group.append({"sender": "EFGH", "timestamp": 1700001000 + i, "expiration": 1800000000, "message": "y" * 120})
+    group.pop(0)
+
+
+def bench_json(tmp, state):
+    written = 0
+    start = time.perf_counter()
+    for i in range(UPDATES):
+        mutate(state, i)
+        for ns, data in state.items():
+            path = os.path.join(tmp, f"{ns}.json")
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=4)
+            written += os.path.getsize(path)
+    return written, time.perf_counter() - start
+
+
+def bench_sqlite(tmp, state):
+    store = Storage(os.path.join(tmp, "bench.db"))
+    store.conn.execute("PRAGMA wal_autocheckpoint=0")
+    for ns, data in state.items():
+        store.sync(ns, data)
+    wal = os.path.join(tmp, "bench.db-wal")
+    before = os.path.getsize(wal)
+    start = time.perf_counter()
+    for i in range(UPDATES):
+        mutate(state, i)
+        for ns, data in state.items():
+            store.sync(ns, data)
+    elapsed = time.perf_counter() - start
+    written = os.path.getsize(wal) - before
+    store.close()
+    return written, elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        json_bytes, json_t = bench_json(tmp, make_state())
+        sql_bytes, sql_t = bench_sqlite(tmp, make_state())
+    print(f"{UPDATES} updates (1 node + 1 BBS group each)")
+    print(f"JSON full dumps : {json_bytes / UPDATES / 1024:9.1f} KiB/update {json_t / UPDATES * 1000:8.2f} ms/update")
+    print(f"SQLite upserts  : {sql_bytes / UPDATES / 1024:9.1f} KiB/update {sql_t / UPDATES * 1000:8.2f} ms/update")
+    print(f"Write reduction : {json_bytes / max(sql_bytes, 1):9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Time to sweep a /24 for open Meshtastic API ports.
+
+Builds a stand-in farm on 127.0.0.x (Linux routes all of 127/8 to loopback):
+a few hosts listen on the port like a node would, and in the "silent" scenario
+every other address is a listener whose accept backlog is already full, so SYNs
+are dropped and the connect hangs until the timeout, like an empty Wi-Fi slot.
+Compares the old thread-per-host scan (75 workers, blocking connect_ex) with
+the asyncio SubnetSweeper. Linux only.
+Run from the repo root: python benchmarks/bench_sweep.py
+"""
+
+import os
+import socket
+import sys
+import time
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sweeper import SubnetSweeper
+
+PORT = 14403
+NETWORK = "127.0.0.0/24"
+NODES = [f"127.0.0.{i}" for i in (7, 42, 99, 150, 201, 254)]
+TIMEOUT = 0.75
+
+
+def start_farm(silent):
+    socks = []
+    for host in ipaddress.ip_network(NETWORK).hosts():
+        ip = str(host)
+        if ip not in NODES and not silent:
+            continue  # Nothing bound: the kernel answers with RST at once
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((ip, PORT))
+        socks.append(s)
+        if ip in NODES:
+            s.listen(128)
+            continue
+        # Silent host: fill a zero backlog so further SYNs are dropped
+        s.listen(0)
+        for _ in range(3):
+            c = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            c.setblocking(False)
+            c.connect_ex((ip, PORT))
+            socks.append(c)
+    time.sleep(0.2)
+    return socks
+
+
+def legacy_sweep():
+    def check_ip(ip):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(TIMEOUT)
+            if s.connect_ex((str(ip), PORT)) == 0:
+                return str(ip)
+        return None
+
+    found = []
+    with ThreadPoolExecutor(max_workers=75) as executor:
+        futures = [executor.submit(check_ip, ip) for ip in ipaddress.ip_network(NETWORK).hosts()]
+        for future in as_completed(futures):
+            if future.result():
+                found.append(future.result())
+    return found
+
+
+def run_scenario(silent):
+    farm = start_farm(silent)
+    try:
+        t0 = time.perf_counter()
+        legacy = legacy_sweep()
+        rows = [("threads (75 workers)", time.perf_counter() - t0, legacy, None)]
+
+        for label, rate in (("asyncio (default caps)", 2000), ("asyncio (uncapped)", 0)):
+            first = []
+            sweeper = SubnetSweeper(port=PORT, timeout=TIMEOUT, concurrency=256, rate=rate)
+            t0 = time.perf_counter()
+            found = sweeper.sweep(NETWORK, on_found=lambda ip: first.append(time.perf_counter() - t0), exclude=())
+            rows.append((label, time.perf_counter() - t0, found, first[0] if first else None))
+            assert sorted(found) == sorted(NODES), "sweeper missed a node"
+    finally:
+        for s in farm:
+            s.close()
+
+    print(f"{'Silent' if silent else 'Refusing'} empty hosts, sweep of {NETWORK} ({len(NODES)} nodes on port {PORT})")
+    for label, elapsed, found, first_hit in rows:
+        line = f"  {label:24s} {elapsed * 1000:8.1f} ms  found {len(found)}"
+        if first_hit is not None:
+            line += f", first result after {first_hit * 1000:.1f} ms"
+        print(line)
+
+
+def main():
+    run_scenario(silent=False)
+    run_scenario(silent=True)
+
+
+if __name__ == "__main__":
+    main()
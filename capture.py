@@ -0,0 +1,110 @@
+"""
+capture.py — MeshUpGrade Packet Capture
+Records everything the gateway receives, every mesh packet dict and every
+APRS-IS line, to a compact binary log so an incident can be replayed offline
+with replay.py. Payload bytes are stored as they are (marshal, no JSON or
+base64), and each record is flushed as it is written so a crash loses nothing.
+
+File layout:
+    MAGIC
+    then repeated: header <d B I> (time.time(), kind, blob length), marshal blob
+"""
+
+import logging
+import marshal
+import os
+import struct
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"MUGCAP\x00\x01"
+KIND_PACKET = 1  # {'radio': name, 'packet': packet dict}
+KIND_APRS = 2    # {'source': 'is' (older captures: 'sms' | 'rx'), 'line': APRS-IS line}
+
+_HEADER = struct.Struct("<dBI")
+_SCALARS = (str, bytes, int, float, type(None))
+_SKIP = object()
+
+
+def _plain(obj):
+    """Copy of obj with only marshal-safe values (drops e.g. the protobuf object under 'raw')."""
+    if isinstance(obj, _SCALARS):
+        return obj
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            v = _plain(v)
+            if v is not _SKIP:
+                out[k] = v
+        return out
+    if isinstance(obj, (list, tuple)):
+        return [v for v in map(_plain, obj) if v is not _SKIP]
+    return _SKIP
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} exists and is not a MeshUpGrade capture")
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+
+    def write(self, kind, obj, ts=None):
+        blob = marshal.dumps(_plain(obj))
+        record = _HEADER.pack(ts or time.time(), kind, len(blob)) + blob
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(record)
+                self._file.flush()
+                self.records += 1
+            except OSError as e:
+                log.error(f"Capture to {self.path} failed, stopping capture: {e}")
+                self._close()
+
+    def packet(self, radio, packet):
+        self.write(KIND_PACKET, {'radio': radio, 'packet': packet})
+
+    def aprs_line(self, source, line):
+        self.write(KIND_APRS, {'source': source, 'line': line})
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+
+def read_capture(path):
+    """Yield (timestamp, kind, record) from a capture file, oldest first."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a MeshUpGrade capture")
+        while True:
+            header = f.read(_HEADER.size)
+            if not header:
+                return
+            blob = b""
+            if len(header) == _HEADER.size:
+                ts, kind, size = _HEADER.unpack(header)
+                blob = f.read(size)
+            if len(header) < _HEADER.size or len(blob) < size:
+                log.warning(f"{path} ends with a truncated record; stopping there.")
+                return
+            yield ts, kind, marshal.loads(blob)
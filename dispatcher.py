@@ -0,0 +1,117 @@
+"""
+dispatcher.py — MeshUpGrade Command Dispatcher
+Runs inbound mesh commands on a bounded worker pool so a slow handler (AI chat,
+weather lookups) never blocks the meshtastic reader thread that also delivers
+the ROUTING_APP ACKs. Commands from the same sender run strictly in order;
+different senders run in parallel, so every manager a handler reaches guards
+its own shared state (and the save that follows) with a lock.
+"""
+
+import collections
+import logging
+import queue
+import threading
+import time
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+QUEUE_WAIT = metrics.histogram("meshupgrade_dispatch_queue_wait_seconds", "Time a command waited for a worker", ("pool",))
+DROPPED = metrics.counter("meshupgrade_dispatch_dropped_total", "Commands dropped because the queue was full", ("pool",))
+
+
+class CommandDispatcher:
+    def __init__(self, workers=4, max_queue=100, name="cmd"):
+        self.name = name
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pending = {}            # sender -> deque of jobs; present while sender has work or is running
+        self._ready = queue.Queue()   # senders with queued work and no worker on them
+        self._depth = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+        self.workers = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            t.start()
+            self.workers.append(t)
+
+    def submit(self, sender, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) behind sender's earlier commands. Never blocks; False if full."""
+        job = (fn, args, kwargs, time.time())
+        with self._lock:
+            if self._depth >= self.max_queue:
+                self.dropped += 1
+                DROPPED.inc(pool=self.name)
+                log.warning(f"Command queue full ({self.max_queue}). Dropping command from {sender}.")
+                return False
+            self._depth += 1
+            self.submitted += 1
+            jobs = self._pending.get(sender)
+            if jobs is None:
+                self._pending[sender] = collections.deque([job])
+                self._ready.put(sender)
+            else:
+                # Sender is already queued or running; its worker will pick this up in order
+                jobs.append(job)
+        return True
+
+    def _worker(self):
+        while True:
+            sender = self._ready.get()
+            with self._lock:
+                fn, args, kwargs, enqueued = self._pending[sender].popleft()
+                self._depth -= 1
+
+            started = time.time()
+            QUEUE_WAIT.observe(started - enqueued, pool=self.name)
+            failed = False
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                failed = True
+                log.error(f"Command handler error for {sender}: {e}")
+            finished = time.time()
+
+            with self._lock:
+                self.errors += failed
+                wait = started - enqueued
+                run = finished - started
+                self.completed += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                self.run_total += run
+                self.run_max = max(self.run_max, run)
+
+                # Hand the sender back to the pool (at the back, so busy senders don't starve others)
+                if self._pending[sender]:
+                    self._ready.put(sender)
+                else:
+                    del self._pending[sender]
+
+    def stats(self):
+        """Snapshot of queue and latency metrics (seconds)."""
+        with self._lock:
+            done = self.completed or 1
+            return {
+                'queue_depth': self._depth,
+                'active_senders': len(self._pending),
+                'workers': len(self.workers),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'queue_wait_avg': self.wait_total / done,
+                'queue_wait_max': self.wait_max,
+                'latency_avg': self.run_total / done,
+                'latency_max': self.run_max,
+            }
@@ -0,0 +1,70 @@
+"""
+endpoints.py — MeshUpGrade Upstream Endpoints
+Where every external service lives. The defaults are the public services;
+"endpoints" in settings.json overrides any of them, e.g. to point a test
+gateway at fake_services.py on an air-gapped machine:
+
+    "endpoints": {
+        "aprs_is": "127.0.0.1:14580",
+        "aprs_http": "http://127.0.0.1:8080/",
+        "open_meteo": "http://127.0.0.1:8080/v1/forecast",
+        "nws": "http://127.0.0.1:8080",
+        "aprs_fi": "http://127.0.0.1:8080",
+        "wheretheiss": "http://127.0.0.1:8080",
+        "people_in_space": "http://127.0.0.1:8080"
+    }
+"""
+
+import http.client
+import logging
+from urllib.parse import urlsplit
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'aprs_is': "rotate.aprs2.net:14580",                # APRS-IS TCP feed (SMS gateway, APRS RX)
+    'aprs_http': "http://rotate.aprs2.net:8080/",       # APRS-IS HTTP packet inject
+    'open_meteo': "https://api.open-meteo.com/v1/forecast",
+    'nws': "https://api.weather.gov",
+    'aprs_fi': "http://api.aprs.fi",
+    'wheretheiss': "https://api.wheretheiss.at",
+    'people_in_space': "https://www.howmanypeopleareinspacerightnow.com",
+}
+
+_current = dict(DEFAULTS)
+
+
+def configure(overrides):
+    """Apply the "endpoints" setting on top of the defaults (unknown names are logged and ignored)."""
+    _current.clear()
+    _current.update(DEFAULTS)
+    for name, value in (overrides or {}).items():
+        if name not in DEFAULTS:
+            log.warning(f"Ignoring unknown endpoint {name!r}.")
+            continue
+        _current[name] = str(value).strip()
+        log.info(f"Endpoint {name} -> {_current[name]}")
+
+
+def url(name):
+    """Base URL of an HTTP service, without a trailing slash."""
+    return _current[name].rstrip("/")
+
+
+def host(name):
+    """Host name of a service (the metrics label for its HTTP latency)."""
+    value = _current[name]
+    return urlsplit(value).hostname if "://" in value else value.rsplit(":", 1)[0]
+
+
+def address(name):
+    """(host, port) of a TCP service such as APRS-IS."""
+    host_part, _, port = _current[name].rpartition(":")
+    return host_part, int(port)
+
+
+def http_connection(name, timeout):
+    """(connection, base_path) for an HTTP service; plain HTTP or HTTPS as the URL says."""
+    parts = urlsplit(_current[name])
+    cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    return cls(parts.hostname, parts.port, timeout=timeout), parts.path.rstrip("/")
@@ -1,5 +1,6 @@
 import sys
 import logging
+log = logging.getLogger(__name__)
 try:
     import serial.tools.list_ports
 except ImportError:
@@ -23,18 +24,50 @@ try:
     SERIAL_AVAILABLE = True
 except Exception as e:
     # Android Termux cannot load the underlying pyserial module due to missing /dev/tty
-    logging.warning(f"Serial interface disabled (Normal for Android/Termux environments): {e}")
+    log.warning(f"Serial interface disabled (Normal for Android/Termux environments): {e}")
     SERIAL_AVAILABLE = False
 import time
 import socket
-import ipaddress
 import threading
 import json
 import os
+import heapq
+import itertools
+import random
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 INBOX_FILE = "sms_inbox.json"
 NODE_CACHE_FILE = "node_cache.json"
+NODE_HEARD_RESOLUTION = 600  # Seconds; a newer lastHeard alone is only saved once it reaches the next slot
+INBOX_SEPARATOR = "\n\n"  # Between spooled messages packed into one packet
+from storage import get_storage
+from packer import pack, utf8_len, MAX_PACKET_BYTES
+from sweeper import SubnetSweeper, local_networks, port_open, MESHTASTIC_PORT
+import metrics
+from metrics import DurationHistogram
+from capture import CaptureWriter
+
+# Outbound priority classes (lower is sent first)
+PRIORITY_ALERT = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_NOTIFY = 2
+PRIORITY_BULK = 3
+
+# Rough LoRa airtime model for the default LongFast preset (seconds)
+AIRTIME_BASE = 0.3
+AIRTIME_PER_BYTE = 0.0076
+
+# Framed ToRadio{heartbeat: {}} (0x94 0xc3 magic, 2-byte length, protobuf field 7) used as a cheap readiness check
+HEARTBEAT_FRAME = bytes([0x94, 0xc3, 0x00, 0x02, 0x3a, 0x00])
+
+PACKETS_RECEIVED = metrics.counter("meshupgrade_packets_received_total", "Unique packets received, by portnum", ("portnum",))
+DM_RETRIES = metrics.counter("meshupgrade_dm_retries_total", "Direct message retransmissions after a missing ACK")
+DM_SPOOLED = metrics.counter("meshupgrade_dm_spooled_total", "Messages spooled to the offline inbox after max retries")
+SEND_FAILED = metrics.counter("meshupgrade_send_failures_total", "Packets the radio could not transmit, by kind",
+                              ("kind",))
+ACK_RTT = metrics.histogram("meshupgrade_ack_rtt_seconds", "Time from transmitting a DM packet to its ACK",
+                            buckets=(0.5, 1, 2, 5, 10, 15, 20, 30, 60, 120))
 from pubsub import pub
 
 try:
@@ -43,11 +76,13 @@ except ImportError:
     Zeroconf = None
 
 class MeshtasticListener:
-    def __init__(self, callback):
+    def __init__(self, callback, on_info=None):
         self.callback = callback
+        self.on_info = on_info  # on_info(ip, txt) with the decoded TXT record, e.g. {'shortname': .., 'id': ..}
 
     def update_service(self, zc, type_, name):
-        pass
+        # A rebooted node re-announces itself here, often with a new address
+        self.add_service(zc, type_, name)
 
     def remove_service(self, zc, type_, name):
         pass
@@ -70,11 +105,552 @@ class MeshtasticListener:
             
             if self.callback:
                 self.callback(node_name, ip)
+            if self.on_info:
+                txt = {}
+                for k, v in (info.properties or {}).items():
+                    try:
+                        txt[k.decode('utf-8')] = v.decode('utf-8') if v is not None else ''
+                    except Exception:
+                        pass
+                self.on_info(ip, txt)
+
+
+class RetryScheduler:
+    """Deadline-ordered wake-up queue for the DM auto-retry system.
+
+    Keys are pushed onto a min-heap with the absolute time they become due and the
+    retry thread blocks on a condition variable until the earliest one, so an idle
+    engine (or one with hundreds of pending DMs, none of them due) costs nothing.
+    Rescheduled or cancelled keys leave stale heap entries behind; they are
+    discarded lazily when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, key, when):
+        with self._cond:
+            self._deadlines[key] = when
+            heapq.heappush(self._heap, (when, next(self._seq), key))
+            # Only wake the waiter if the earliest deadline moved forward
+            if self._heap[0][2] == key:
+                self._cond.notify()
+
+    def cancel(self, key):
+        with self._cond:
+            self._deadlines.pop(key, None)
+
+    def _discard_stale(self):
+        while self._heap:
+            when, _, key = self._heap[0]
+            if self._deadlines.get(key) == when:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due(self, ready=None, hold_interval=1):
+        """Block until a key is due and return it.
+
+        If `ready` is given and returns False when a key is due (e.g. the radio is
+        disconnected), due keys are held back and rechecked every `hold_interval` seconds.
+        """
+        with self._cond:
+            while True:
+                self._discard_stale()
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                if ready and not ready():
+                    self._cond.wait(hold_interval)
+                    continue
+                _, _, key = heapq.heappop(self._heap)
+                del self._deadlines[key]
+                return key
+
+
+class DeliveryTracker:
+    """Thread-safe table of DMs awaiting a routing ACK.
+
+    Packet ids are stored as strings so an ACK's requestId matches in O(1) whether
+    meshtastic hands it over as an int or a str.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_id = {}
+
+    @staticmethod
+    def normalize(pkt_id):
+        return str(pkt_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __bool__(self):
+        return bool(self._by_id)
+
+    def __contains__(self, pkt_id):
+        return self.normalize(pkt_id) in self._by_id
+
+    def ids(self):
+        with self._lock:
+            return list(self._by_id)
+
+    def get(self, pkt_id):
+        return self._by_id.get(self.normalize(pkt_id))
+
+    def add(self, pkt_id, entry):
+        key = self.normalize(pkt_id)
+        with self._lock:
+            self._by_id[key] = entry
+        return key
+
+    def pop(self, pkt_id):
+        key = self.normalize(pkt_id)
+        with self._lock:
+            return self._by_id.pop(key, None)
+
+    def replace(self, old_id, new_id, entry):
+        """Swap a retried packet's id. Returns False if the old id was ACKed meanwhile."""
+        with self._lock:
+            if self.pop(old_id) is None:
+                return False
+            self.add(new_id, entry)
+            return True
+
+
+
+def estimate_airtime(text):
+    """Approximate on-air time of a text packet in seconds."""
+    return AIRTIME_BASE + len(text.encode('utf-8')) * AIRTIME_PER_BYTE
+
+
+class TokenBucket:
+    """Airtime budget: refills at `rate` airtime-seconds per second up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, cost, now):
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0
+        return (cost - self.tokens) / self.rate
+
+    def consume(self, cost, now):
+        self._refill(now)
+        self.tokens -= min(cost, self.capacity)
+
+    @property
+    def full(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class OutboundScheduler:
+    """Single paced transmit queue for everything the node sends over the mesh.
+
+    Jobs are dispatched by priority class (alerts > interactive replies >
+    notifications > bulk), FIFO within a class, as soon as both the channel's and
+    the destination's airtime buckets can afford them. Callers only enqueue; the
+    scheduler thread is the only place that sleeps, and it sleeps exactly until
+    the next job becomes sendable.
+    """
+
+    def __init__(self, transmit, ready=None, broadcast_not_before=None, capacity=None):
+        self.transmit = transmit
+        self.ready = ready
+        self.broadcast_not_before = broadcast_not_before
+        self.capacity = capacity  # capacity() -> number of radios sharing the load (budgets scale with it)
+
+        # Channel budget: ~20% duty cycle, bursts of about one full-size packet
+        self.channel_rate = 0.2
+        self.channel_burst = 2.0
+        # Per-destination budget: keeps one node from being flooded by a fan-out
+        self.dest_rate = 0.3
+        self.dest_burst = 1.0
+        # Minimum spacing between any two packets so the firmware TX queue never backs up
+        self.min_gap = 1.0
+        self._last_tx = 0
+
+        self._queues = {p: [] for p in (PRIORITY_ALERT, PRIORITY_INTERACTIVE, PRIORITY_NOTIFY, PRIORITY_BULK)}
+        self._channel_buckets = {}
+        self._dest_buckets = {}
+        self._cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def depths(self):
+        """Queued jobs per priority class."""
+        with self._cond:
+            return {p: len(q) for p, q in self._queues.items()}
+
+    def enqueue(self, text, dest_id=None, channel_index=0, want_ack=False, priority=PRIORITY_INTERACTIVE,
+                on_sent=None, on_error=None, guard=None):
+        """Queue a packet and return immediately.
+
+        on_sent(packet) runs on the scheduler thread after transmission and
+        on_error(exc) if sendText raised. If guard() returns False at dispatch time
+        the job is dropped silently (e.g. a retry whose DM was ACKed meanwhile).
+        """
+        job = {
+            'text': text,
+            'dest_id': dest_id,
+            'channel_index': channel_index,
+            'want_ack': want_ack,
+            'priority': priority,
+            'airtime': estimate_airtime(text),
+            'on_sent': on_sent,
+            'on_error': on_error,
+            'guard': guard,
+            'enqueued': time.time(),
+        }
+        with self._cond:
+            self._queues.get(priority, self._queues[PRIORITY_BULK]).append(job)
+            self._cond.notify()
+        return job
+
+    def _bucket(self, buckets, key, rate, burst):
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) > 1024:
+                # Forget idle (full) buckets so one-off destinations don't accumulate
+                for k in [k for k, b in buckets.items() if b.full]:
+                    del buckets[k]
+            bucket = buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def _wait_for(self, job, now):
+        scale = max(1, self.capacity()) if self.capacity else 1
+        wait = self._last_tx + self.min_gap / scale - now
+        if job['dest_id'] is None and self.broadcast_not_before:
+            wait = max(wait, self.broadcast_not_before() - time.time())
+        chan = self._bucket(self._channel_buckets, job['channel_index'], self.channel_rate, self.channel_burst)
+        chan.rate, chan.capacity = self.channel_rate * scale, self.channel_burst * scale
+        wait = max(wait, chan.wait_time(job['airtime'], now))
+        if job['dest_id'] is not None:
+            dest = self._bucket(self._dest_buckets, job['dest_id'], self.dest_rate, self.dest_burst)
+            wait = max(wait, dest.wait_time(job['airtime'], now))
+        return wait
+
+    def _pick(self):
+        """Return (job, None) for the next sendable job, or (None, seconds_to_wait)."""
+        now = time.monotonic()
+        soonest = None
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            for i, job in enumerate(queue):
+                wait = self._wait_for(job, now)
+                if wait <= 0:
+                    del queue[i]
+                    self._channel_buckets[job['channel_index']].consume(job['airtime'], now)
+                    if job['dest_id'] is not None:
+                        self._dest_buckets[job['dest_id']].consume(job['airtime'], now)
+                    self._last_tx = now
+                    return job, None
+                if soonest is None or wait < soonest:
+                    soonest = wait
+        return None, soonest
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not len(self):
+                    self._cond.wait()
+                    continue
+                if self.ready and not self.ready():
+                    self._cond.wait(1)
+                    continue
+                job, wait = self._pick()
+                if job is None:
+                    self._cond.wait(wait)
+                    continue
+            self._dispatch(job)
+
+    def _dispatch(self, job):
+        guard = job['guard']
+        if guard and not guard():
+            return
+        try:
+            packet = self.transmit(job)
+        except BaseException as e:
+            log.error(f"Outbound send failed: {e}")
+            if job['on_error']:
+                try:
+                    job['on_error'](e)
+                except Exception as cb_err:
+                    log.error(f"Outbound error callback failed: {cb_err}")
+            return
+        if job['on_sent']:
+            try:
+                job['on_sent'](packet)
+            except Exception as e:
+                log.error(f"Outbound sent callback failed: {e}")
+
+
+class PacketDedup:
+    """Fixed-size memory of recently handled packets, keyed on (from, packet id).
+
+    Entries are kept in arrival order, so both the TTL sweep and the size cap only
+    ever drop from the old end: every check is O(1) however large the window is.
+    """
+
+    def __init__(self, max_size=4096, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._seen = OrderedDict()  # (from, id) -> time.monotonic() first seen
+        self._lock = threading.Lock()
+        self.stats = {'checked': 0, 'duplicates': 0, 'expired': 0, 'evicted': 0}
+
+    def __len__(self):
+        return len(self._seen)
+
+    def seen(self, sender, pkt_id, now=None):
+        """Record the packet; True if it was already handled within the window."""
+        key = (sender, pkt_id)
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self.stats['checked'] += 1
+            seen = self._seen
+            while seen:
+                oldest, stamp = next(iter(seen.items()))
+                if now - stamp < self.ttl:
+                    break
+                del seen[oldest]
+                self.stats['expired'] += 1
+            if key in seen:
+                self.stats['duplicates'] += 1
+                return True
+            seen[key] = now
+            if len(seen) > self.max_size:
+                seen.popitem(last=False)
+                self.stats['evicted'] += 1
+            return False
+
+
+class PartGroup:
+    """One ACK and one failure callback for a message that went out as several packets.
+
+    Every part is tracked (and retried) on its own; ack_callback fires once all parts are
+    ACKed, fail_callback at most once, and never both.
+    """
+
+    def __init__(self, parts, ack_callback=None, fail_callback=None):
+        self.remaining = parts
+        self.ack_callback = ack_callback
+        self.fail_callback = fail_callback
+        self.done = False
+        self._lock = threading.Lock()
+
+    def part_acked(self, dest_id):
+        with self._lock:
+            self.remaining -= 1
+            if self.remaining > 0 or self.done:
+                return
+            self.done = True
+        if self.ack_callback:
+            self.ack_callback(dest_id)
+
+    def part_failed(self, dest_id):
+        with self._lock:
+            if self.done:
+                return
+            self.done = True
+        if self.fail_callback:
+            self.fail_callback(dest_id)
+
+
+class Radio:
+    """One attached radio: its interface plus the per-radio state used to pick a transmitter."""
+    HEARD_LIMIT = 5000
+
+    def __init__(self, name, conn_type=None, params=None, airtime_rate=0.2, airtime_burst=2.0):
+        self.name = name
+        self.conn_type = conn_type  # 'tcp' or 'serial'
+        self.params = params
+        self.interface = None
+        self.airtime = TokenBucket(airtime_rate, airtime_burst)  # This radio's own duty cycle
+        self.heard = OrderedDict()  # node_id -> time.monotonic() it was last heard through this radio
+        self.stats = {'rx': 0, 'rx_duplicate': 0, 'tx': 0, 'tx_errors': 0, 'connects': 0}
+        self.last_rx = 0
+        self.last_tx = 0
+
+    @property
+    def connected(self):
+        iface = self.interface
+        if not iface:
+            return False
+        if hasattr(iface, 'isConnected') and not iface.isConnected.is_set():
+            return False
+        if hasattr(iface, 'noProto') and iface.noProto:
+            return False
+        return True
+
+    def mark_heard(self, node_id):
+        self.heard[node_id] = time.monotonic()
+        self.heard.move_to_end(node_id)
+        if len(self.heard) > self.HEARD_LIMIT:
+            self.heard.popitem(last=False)
+
+    def snapshot(self):
+        now = time.time()
+        iface = self.interface
+        return {
+            'name': self.name,
+            'type': self.conn_type,
+            'params': self.params,
+            'connected': self.connected,
+            'airtime_free': round(self.airtime.tokens, 2),
+            'firmware_queue': len(getattr(iface, 'queue', None) or {}),
+            'nodes_heard': len(self.heard),
+            'last_rx_age': round(now - self.last_rx, 1) if self.last_rx else None,
+            'last_tx_age': round(now - self.last_tx, 1) if self.last_tx else None,
+            **self.stats,
+        }
+
+
+class NodeDirectory:
+    """Name indexes over the node cache so lookups don't scan every node.
+
+    Keeps exact and case-folded shortName -> node ids, case-folded longName ->
+    node ids and node-id prefix -> node ids. When several nodes share a name the
+    most recently heard one wins. Updated incrementally by MeshEngine._update_node.
+    """
+    MIN_PREFIX = 2
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._names = {}    # node_id -> (shortName, longName)
+        self._heard = {}    # node_id -> lastHeard
+        self._short = {}
+        self._short_fold = {}
+        self._long_fold = {}
+        self._prefix = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, node_id):
+        return node_id in self._names
+
+    @staticmethod
+    def _id_hex(node_id):
+        return str(node_id).lstrip('!').lower()
+
+    def update(self, node_id, short_name='', long_name='', last_heard=0):
+        with self._lock:
+            self._heard[node_id] = last_heard or 0
+            names = (short_name or '', long_name or '')
+            old = self._names.get(node_id)
+            if old == names:
+                return
+            if old is not None:
+                self._unindex(node_id, old)
+            else:
+                hex_id = self._id_hex(node_id)
+                for n in range(self.MIN_PREFIX, len(hex_id) + 1):
+                    self._prefix.setdefault(hex_id[:n], set()).add(node_id)
+            self._names[node_id] = names
+            short_name, long_name = names
+            if short_name:
+                self._short.setdefault(short_name, set()).add(node_id)
+                self._short_fold.setdefault(short_name.casefold(), set()).add(node_id)
+            if long_name:
+                self._long_fold.setdefault(long_name.casefold(), set()).add(node_id)
+
+    def remove(self, node_id):
+        with self._lock:
+            names = self._names.pop(node_id, None)
+            self._heard.pop(node_id, None)
+            if names is None:
+                return
+            self._unindex(node_id, names)
+            hex_id = self._id_hex(node_id)
+            for n in range(self.MIN_PREFIX, len(hex_id) + 1):
+                self._discard(self._prefix, hex_id[:n], node_id)
+
+    def _unindex(self, node_id, names):
+        short_name, long_name = names
+        if short_name:
+            self._discard(self._short, short_name, node_id)
+            self._discard(self._short_fold, short_name.casefold(), node_id)
+        if long_name:
+            self._discard(self._long_fold, long_name.casefold(), node_id)
+
+    @staticmethod
+    def _discard(index, key, node_id):
+        ids = index.get(key)
+        if ids:
+            ids.discard(node_id)
+            if not ids:
+                del index[key]
+
+    def _newest(self, ids):
+        if not ids:
+            return None
+        if len(ids) == 1:
+            return next(iter(ids))
+        return max(ids, key=lambda nid: self._heard.get(nid, 0))
+
+    def shortname(self, node_id):
+        names = self._names.get(node_id)
+        return (names[0] or None) if names else None
+
+    def longname(self, node_id):
+        names = self._names.get(node_id)
+        return (names[1] or None) if names else None
+
+    def find_shortname(self, name):
+        """Find a node ID by shortname. Returns (node_id, actual_shortname, exact_match)."""
+        with self._lock:
+            node_id = self._newest(self._short.get(name))
+            if node_id:
+                return node_id, name, True
+            node_id = self._newest(self._short_fold.get(name.casefold()))
+            if node_id:
+                return node_id, self._names[node_id][0], False
+        return None, None, False
+
+    def find_longname(self, name):
+        with self._lock:
+            return self._newest(self._long_fold.get(name.casefold()))
+
+    def find_prefix(self, prefix):
+        """Node IDs whose hex id starts with prefix (with or without the leading '!')."""
+        with self._lock:
+            return sorted(self._prefix.get(self._id_hex(prefix), ()))
 
 
 class MeshEngine:
     def __init__(self, callback_on_message=None):
-        self.interface = None
+        # The primary radio is the one reboot recovery, renames and channels apply to;
+        # extra radios only add receive coverage and transmit capacity
+        self.primary = Radio("primary")
+        self.extra_radios = []
+        # Same packet via rebroadcasts, reconnect replays or a second radio is only handled once
+        self.packet_dedup = PacketDedup()
+        self._radio_watch_thread = None
+        self.capture = None  # CaptureWriter while capture mode is on (see capture.py / replay.py)
         self.callback_on_message = callback_on_message
         self.last_short_name = None
         self.last_info_broadcast_time = 0
@@ -82,15 +658,62 @@ class MeshEngine:
         self.last_conn_params = None
         
         # SMS Auto-Retry System
-        self.ack_tracker = {}
+        self.ack_tracker = DeliveryTracker()
+        self.retry_scheduler = RetryScheduler()
+        self._unsent_ids = itertools.count(1)  # Tracker keys for DM parts whose first transmission failed
         self.max_retries = 5
         self.retry_cooldown = 15
         
-        # SMS Offline Inbox
+        # Persistent state (SQLite, one row per inbox recipient / cached node)
+        self.storage = get_storage()
+        
+        # SMS Offline Inbox (command workers and the retry thread both change it)
         self.offline_inbox = self._load_inbox()
+        self._inbox_lock = threading.RLock()
         
-        # Node Cache
+        # Node Cache: kept current from node/packet events, oldest lastHeard first for LRU eviction
+        self.max_cached_nodes = 5000
+        self.node_cache_flush_interval = 60
+        self._node_lock = threading.RLock()
+        self._dirty_nodes = set()
+        self._evicted_nodes = set()
+        self.node_directory = NodeDirectory()
         self.node_cache = self._load_node_cache()
+        for nid, info in self.node_cache.items():
+            self._index_node(nid, info)
+        
+        # Last known address of each TCP radio we have connected to, so discovery can try it first
+        self.my_node_id = None
+        self.node_locations = self._load_node_locations()
+        self.verify_workers = 3  # Parallel full handshakes when an mDNS hit has no usable TXT record
+        
+        # Reconnect after drops/reboots: fast probes with exponential backoff, then discovery
+        self.reconnect_timeout = 150
+        self.reconnect_initial_delay = 0.5
+        self.reconnect_max_delay = 8
+        self.reconnect_stats = DurationHistogram()
+        self.reconnect_outcomes = {}  # 'last_ip' / 'remembered' / 'mdns' / 'serial' / 'discovery' / 'failed' -> count
+        self._recover_lock = threading.Lock()
+        self.reboot_ready_timeout = 60
+        self.reboot_stats = DurationHistogram()
+        self.heard_ttl = 7200  # How long "radio X heard node Y" counts when routing a DM
+        
+        # Outbound text is split into packets of at most this many UTF-8 bytes (see packer.py)
+        self.max_packet_bytes = MAX_PACKET_BYTES
+        self.max_message_parts = 5
+        
+        # Subnet sweep settings (CIDRs up to /16; empty = every local interface's /24)
+        self.sweep_networks = []
+        self.sweep_concurrency = 256
+        self.sweep_rate = 2000
+        
+        # Paced transmit queue shared by every outbound DM and broadcast
+        self.outbound = OutboundScheduler(
+            self._transmit,
+            ready=lambda: any(r.connected for r in self.radios),
+            broadcast_not_before=lambda: self.last_info_broadcast_time + 5,
+            capacity=lambda: sum(1 for r in self.radios if r.connected),
+        )
         
         self.retry_thread = threading.Thread(target=self._retry_loop, daemon=True)
         self.retry_thread.start()
@@ -98,156 +721,461 @@ class MeshEngine:
         self.node_cache_thread.start()
 
     def _load_inbox(self):
-        if os.path.exists(INBOX_FILE):
-            try:
-                with open(INBOX_FILE, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logging.error(f"Error loading {INBOX_FILE}: {e}")
+        try:
+            self.storage.migrate_json(INBOX_FILE, {"inbox": None})
+            return self.storage.load("inbox")
+        except Exception as e:
+            log.error(f"Error loading offline inbox: {e}")
         return {}
         
     def save_inbox(self):
         try:
-            with open(INBOX_FILE, 'w') as f:
-                json.dump(self.offline_inbox, f, indent=4)
+            self.storage.sync("inbox", self.offline_inbox)
         except Exception as e:
-            logging.error(f"Error saving {INBOX_FILE}: {e}")
+            log.error(f"Error saving offline inbox: {e}")
 
     def check_inbox(self, dest_id):
-        messages = self.offline_inbox.pop(dest_id, [])
-        if messages:
-            self.save_inbox()
+        with self._inbox_lock:
+            messages = self.offline_inbox.pop(dest_id, [])
+            if messages:
+                self.save_inbox()
         return messages
 
-    def _load_node_cache(self):
-        if os.path.exists(NODE_CACHE_FILE):
-            try:
-                with open(NODE_CACHE_FILE, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logging.error(f"Error loading {NODE_CACHE_FILE}: {e}")
+    def flush_inbox(self, dest_id, ack_callback=None, priority=PRIORITY_BULK):
+        """Deliver everything spooled for dest_id in as few packets as possible. Returns the message count.
+
+        Short messages are packed together (one ACK-tracked packet each batch). When a packet is
+        ACKed, ack_callback(dest_id, message) (default: global_ack_callback) fires once for every
+        message it carried; if it is never ACKed its messages are re-spooled one by one.
+        """
+        pending = self.check_inbox(dest_id)
+        if not pending:
+            return 0
+        ack_callback = ack_callback or getattr(self, 'global_ack_callback', None)
+        batches = self._batch_messages(pending)
+        log.info(f"Flushing {len(pending)} inbox messages to {dest_id} in {len(batches)} packets.")
+
+        def make_ack(batch):
+            def on_ack(acked_dest):
+                if not ack_callback:
+                    return
+                for msg_text in batch:
+                    try:
+                        ack_callback(acked_dest, msg_text)
+                    except Exception as e:
+                        log.error(f"Inbox ACK callback error: {e}")
+            return on_ack
+
+        for batch in batches:
+            text = INBOX_SEPARATOR.join(batch)
+            # Oversized single messages are split by send_dm and spooled per part as usual
+            spool = batch if len(batch) > 1 else None
+            self.send_dm(dest_id, text, ack_callback=make_ack(batch), priority=priority, spool=spool)
+        return len(pending)
+
+    def _batch_messages(self, messages):
+        """Greedily group messages so each group joined by INBOX_SEPARATOR fits one packet."""
+        sep = utf8_len(INBOX_SEPARATOR)
+        batches, current, size = [], [], 0
+        for msg in messages:
+            n = utf8_len(msg)
+            if current and size + sep + n <= self.max_packet_bytes:
+                current.append(msg)
+                size += sep + n
+                continue
+            if current:
+                batches.append(current)
+            current, size = [msg], n
+        if current:
+            batches.append(current)
+        return batches
+
+    def _load_node_locations(self):
+        try:
+            return self.storage.load("node_locations")
+        except Exception as e:
+            log.error(f"Error loading node locations: {e}")
         return {}
 
+    def _iface_identity(self, iface):
+        """(node_id, shortName) of the radio behind an interface, as far as it has told us."""
+        try:
+            user = (iface.getMyNodeInfo() or {}).get('user') or {}
+            return user.get('id'), user.get('shortName') or iface.getShortName()
+        except Exception:
+            return None, None
+
+    def _remember_location(self, ip):
+        """Record which radio answered at ip so the next discovery can try it first."""
+        node_id, short_name = self._iface_identity(self.interface)
+        self.my_node_id = node_id or self.my_node_id
+        key = node_id or (f"short:{short_name}" if short_name else None)
+        if not key:
+            return
+        # A radio has one address; drop stale entries that point other identities at this ip
+        for other in [k for k, v in self.node_locations.items() if v.get('ip') == ip and k != key]:
+            self.node_locations.pop(other, None)
+        self.node_locations[key] = {'ip': ip, 'shortName': short_name or '', 'seen': int(time.time())}
+        try:
+            self.storage.sync("node_locations", self.node_locations)
+        except Exception as e:
+            log.error(f"Error saving node locations: {e}")
+
+    def _cached_addresses(self, target_short_name, target_id=None):
+        """Remembered IPs for a node id or shortname, most recently seen first."""
+        hits = [v for k, v in self.node_locations.items()
+                if (target_id and k == target_id) or v.get('shortName') == target_short_name]
+        hits.sort(key=lambda v: v.get('seen', 0), reverse=True)
+        return list(dict.fromkeys(v['ip'] for v in hits if v.get('ip')))
+
+    def _load_node_cache(self):
+        try:
+            self.storage.migrate_json(NODE_CACHE_FILE, {"node_cache": None})
+            rows = self.storage.load("node_cache")
+            return OrderedDict(sorted(rows.items(), key=lambda kv: kv[1].get('lastHeard') or 0))
+        except Exception as e:
+            log.error(f"Error loading node cache: {e}")
+        return OrderedDict()
+
     def _save_node_cache(self):
+        """Persist only the records that changed (or were evicted) since the last save."""
+        with self._node_lock:
+            if not self._dirty_nodes and not self._evicted_nodes:
+                return 0
+            upserts = {nid: dict(self.node_cache[nid]) for nid in self._dirty_nodes if nid in self.node_cache}
+            deletes = list(self._evicted_nodes)
+            self._dirty_nodes.clear()
+            self._evicted_nodes.clear()
         try:
-            with open(NODE_CACHE_FILE, 'w') as f:
-                json.dump(self.node_cache, f, indent=2)
+            self.storage.apply("node_cache", upserts, deletes)
         except Exception as e:
-            logging.error(f"Error saving {NODE_CACHE_FILE}: {e}")
+            log.error(f"Error saving node cache: {e}")
+            with self._node_lock:
+                self._dirty_nodes.update(nid for nid in upserts if nid in self.node_cache)
+                self._evicted_nodes.update(deletes)
+            return 0
+        log.debug(f"Node cache saved: {len(upserts)} updated, {len(deletes)} evicted.")
+        return len(upserts) + len(deletes)
+
+    def _update_node(self, node_id, node_info=None, last_heard=None):
+        """Merge one node's info into the cache, marking it dirty only if something worth saving changed.
 
-    def refresh_node_cache(self):
-        """Snapshot current interface.nodes into a simplified cache dict."""
-        if not self.interface or not hasattr(self.interface, 'nodes'):
+        Every packet moves its sender's lastHeard; in memory that is kept exact, but on its own it
+        only dirties the record once per NODE_HEARD_RESOLUTION (enough for LRU order on reload).
+        """
+        if not node_id:
             return
-        cache = {}
-        for node_id, node_info in self.interface.nodes.items():
-            user = node_info.get('user', {})
-            cache[node_id] = {
-                'shortName': user.get('shortName', ''),
-                'longName': user.get('longName', ''),
-                'hwModel': user.get('hwModel', ''),
-                'lastHeard': node_info.get('lastHeard', 0)
-            }
-        self.node_cache = cache
+        with self._node_lock:
+            old = self.node_cache.get(node_id)
+            record = dict(old) if old else {'shortName': '', 'longName': '', 'hwModel': '', 'lastHeard': 0}
+            if node_info:
+                user = node_info.get('user') or {}
+                for field in ('shortName', 'longName', 'hwModel'):
+                    if user.get(field):
+                        record[field] = user[field]
+                last_heard = max(last_heard or 0, node_info.get('lastHeard') or 0)
+            if last_heard and last_heard > (record.get('lastHeard') or 0):
+                record['lastHeard'] = int(last_heard)
+            if record == old:
+                return
+            self.node_cache[node_id] = record
+            self.node_cache.move_to_end(node_id)
+            self._index_node(node_id, record)
+            slot = lambda r: (r.get('lastHeard') or 0) // NODE_HEARD_RESOLUTION
+            if (old is None or slot(record) != slot(old)
+                    or any(record[f] != old.get(f) for f in ('shortName', 'longName', 'hwModel'))):
+                self._dirty_nodes.add(node_id)
+                self._evicted_nodes.discard(node_id)
+            while len(self.node_cache) > self.max_cached_nodes:
+                evicted, _ = self.node_cache.popitem(last=False)
+                self.node_directory.remove(evicted)
+                self._dirty_nodes.discard(evicted)
+                self._evicted_nodes.add(evicted)
+
+    def _index_node(self, node_id, record):
+        self.node_directory.update(node_id, record.get('shortName'), record.get('longName'), record.get('lastHeard'))
+
+    def refresh_node_cache(self, interface=None):
+        """Merge everything in interface.nodes into the cache (used once per connect)."""
+        interface = interface or self.interface
+        if not interface or not hasattr(interface, 'nodes') or not interface.nodes:
+            return
+        nodes = sorted(interface.nodes.items(), key=lambda kv: kv[1].get('lastHeard') or 0)
+        for node_id, node_info in nodes:
+            self._update_node(node_id, node_info)
+        log.info(f"Node cache seeded from radio: {len(nodes)} nodes, {len(self._dirty_nodes)} changed.")
         self._save_node_cache()
-        logging.info(f"Node cache refreshed: {len(cache)} nodes saved.")
+
+    def _on_node_updated(self, node, interface=None):
+        if interface is None or self._radio_for(interface) is None:
+            return  # Temporary interface (discovery check, wrong node): its NodeDB is not ours
+        try:
+            node_id = node.get('user', {}).get('id') or node.get('id')
+            if not node_id and node.get('num') is not None:
+                node_id = f"!{node['num']:08x}"
+            self._update_node(node_id, node)
+        except Exception as e:
+            log.debug(f"Node update event ignored: {e}")
 
     def _node_cache_loop(self):
-        """Refresh node cache every 15 minutes."""
+        """Flush dirty node records to storage periodically."""
         while True:
-            time.sleep(10)  # Initial delay to let connection establish
-            if self.is_connected:
-                self.refresh_node_cache()
-            time.sleep(890)  # ~15 min total cycle
+            time.sleep(self.node_cache_flush_interval)
+            self._save_node_cache()
+
+    def _track_dm(self, pkt_id, entry):
+        """Register a wantAck DM and schedule its next retry."""
+        key = self.ack_tracker.add(pkt_id, entry)
+        self.retry_scheduler.schedule(key, entry['last_sent'] + self.retry_cooldown)
 
     def _retry_loop(self):
         while True:
-            time.sleep(1)
-            if not self.is_connected:
-                continue
-            
-            now = time.time()
-            for pkt_id, data in list(self.ack_tracker.items()):
-                if now - data['last_sent'] >= self.retry_cooldown:
-                    if data['retries'] < self.max_retries:
-                        logging.warning(f"No ACK for direct message to {data['dest_id']}. Retrying ({data['retries'] + 1}/{self.max_retries})...")
-                        # Update state immediately so we don't spam if an error occurs
-                        data['retries'] += 1
-                        data['last_sent'] = now
-                        
-                        try:
-                            # Explicitly wantAck=True is required for the recipient to reply with routing app ACK
-                            new_packet = self.interface.sendText(data['message'], destinationId=data['dest_id'], wantAck=True)
-                            
-                            if hasattr(new_packet, 'id'):
-                                new_id = new_packet.id
-                                logging.info(f"Retry {data['retries']} sent. New packet ID: {new_id}")
-                                self.ack_tracker[new_id] = {
-                                    'dest_id': data['dest_id'],
-                                    'message': data['message'],
-                                    'retries': data['retries'],
-                                    'last_sent': now,
-                                    'ack_callback': data.get('ack_callback'),
-                                    'fail_callback': data.get('fail_callback')
-                                }
-                                del self.ack_tracker[pkt_id]
-                            else:
-                                logging.warning(f"Retry returned object without 'id'. Keeping old ID {pkt_id}")
-                        except BaseException as e:
-                            logging.error(f"Retry failed (likely offline): {e}")
-                    else:
-                        logging.warning(f"Max retries reached for {data['dest_id']}. Spooling to Offline Inbox.")
-                        if data['dest_id'] not in self.offline_inbox:
-                            self.offline_inbox[data['dest_id']] = []
-                        self.offline_inbox[data['dest_id']].append(data['message'])
-                        self.save_inbox()
-                        # Fire fail callback if registered
-                        fail_cb = data.get('fail_callback')
-                        if fail_cb:
-                            try:
-                                fail_cb(data['dest_id'])
-                            except Exception as e:
-                                logging.error(f"Fail callback error: {e}")
-                        del self.ack_tracker[pkt_id]
+            # Sleeps until the earliest pending retry is due; held while disconnected
+            pkt_id = self.retry_scheduler.next_due(ready=lambda: self.is_connected)
+            data = self.ack_tracker.get(pkt_id)
+            if data is None:
+                continue  # ACKed while we were waiting
+            try:
+                self._process_retry(pkt_id, data)
+            except Exception as e:
+                log.error(f"Retry processing error: {e}")
+
+    def _process_retry(self, pkt_id, data):
+        if data['retries'] < self.max_retries:
+            log.warning(f"No ACK for direct message to {data['dest_id']}. Retrying ({data['retries'] + 1}/{self.max_retries})...")
+            # Update state immediately so we don't spam if an error occurs
+            data['retries'] += 1
+            DM_RETRIES.inc()
+
+            def on_sent(new_packet):
+                now = time.time()
+                data['last_sent'] = now
+                if hasattr(new_packet, 'id'):
+                    new_id = new_packet.id
+                    log.info(f"Retry {data['retries']} sent. New packet ID: {new_id}")
+                    entry = dict(data, last_sent=now)
+                    if self.ack_tracker.replace(pkt_id, new_id, entry):
+                        self.retry_scheduler.schedule(DeliveryTracker.normalize(new_id), now + self.retry_cooldown)
+                else:
+                    log.warning(f"Retry returned object without 'id'. Keeping old ID {pkt_id}")
+                    self.retry_scheduler.schedule(pkt_id, now + self.retry_cooldown)
+
+            def on_error(e):
+                log.error(f"Retry failed (likely offline): {e}")
+                self.retry_scheduler.schedule(pkt_id, time.time() + self.retry_cooldown)
+
+            # Explicitly wantAck=True is required for the recipient to reply with routing app ACK
+            self.outbound.enqueue(
+                data['message'], dest_id=data['dest_id'], want_ack=True,
+                priority=data.get('priority', PRIORITY_NOTIFY),
+                on_sent=on_sent, on_error=on_error,
+                guard=lambda: self.ack_tracker.get(pkt_id) is data,
+            )
+        else:
+            if self.ack_tracker.pop(pkt_id) is None:
+                return  # ACKed at the last moment
+            log.warning(f"Max retries reached for {data['dest_id']}. Spooling to Offline Inbox.")
+            # A coalesced inbox packet goes back as the individual messages it carried
+            spooled = data.get('spool') or [data['message']]
+            with self._inbox_lock:
+                self.offline_inbox.setdefault(data['dest_id'], []).extend(spooled)
+                self.save_inbox()
+            DM_SPOOLED.inc(len(spooled))
+            # Fire fail callback if registered
+            fail_cb = data.get('fail_callback')
+            if fail_cb:
+                try:
+                    fail_cb(data['dest_id'])
+                except Exception as e:
+                    log.error(f"Fail callback error: {e}")
+
+    @property
+    def interface(self):
+        return self.primary.interface
+
+    @interface.setter
+    def interface(self, iface):
+        self.primary.interface = iface
+
+    @property
+    def radios(self):
+        return [self.primary] + self.extra_radios
 
     @property
     def is_connected(self):
-        if not self.interface:
-            return False
-        # The library uses .noProto to indicate the protocol/reader is dead, 
+        # The library uses .noProto to indicate the protocol/reader is dead,
         # but the isConnected event is cleared immediately upon disconnect.
-        if hasattr(self.interface, 'isConnected') and not self.interface.isConnected.is_set():
-            return False
-        if hasattr(self.interface, 'noProto') and self.interface.noProto:
+        return self.primary.connected
+
+    def add_radio(self, conn_type, params=None, name=None):
+        """Attach an extra radio (TCP host or serial device). Connects in the background and is
+        reconnected automatically; inbound traffic is merged and outbound load shared."""
+        radio = Radio(name or f"{conn_type}:{params or 'auto'}", conn_type, params)
+        self.extra_radios.append(radio)
+        if not self._radio_watch_thread:
+            self._radio_watch_thread = threading.Thread(target=self._radio_watch_loop, daemon=True)
+            self._radio_watch_thread.start()
+        return radio
+
+    def add_radios(self, specs):
+        """Attach radios from the extra_radios setting: [{"type": "tcp", "host": ...}, {"type": "serial", "port": ...}]"""
+        for spec in specs or []:
+            conn_type = spec.get('type', 'tcp')
+            params = spec.get('host') if conn_type == 'tcp' else spec.get('port')
+            self.add_radio(conn_type, params, spec.get('name'))
+
+    def _connect_radio(self, radio):
+        try:
+            if radio.conn_type == 'tcp':
+                radio.interface = meshtastic.tcp_interface.TCPInterface(radio.params)
+            elif radio.conn_type == 'serial' and SERIAL_AVAILABLE:
+                radio.interface = meshtastic.serial_interface.SerialInterface(devPath=radio.params)
+            else:
+                return False
+            radio.stats['connects'] += 1
+            self._setup_listeners()
+            self.refresh_node_cache(radio.interface)
+            log.info(f"Radio {radio.name} connected.")
+            return True
+        except Exception as e:
+            log.debug(f"Radio {radio.name} connect failed: {e}")
             return False
-        return True
 
-    def connect_tcp(self, hostname):
+    def _radio_watch_loop(self):
+        """Keep extra radios connected, with the same backoff shape as recover_connection."""
+        delays = {}
+        next_try = {}
+        while True:
+            now = time.monotonic()
+            for radio in list(self.extra_radios):
+                if radio.connected:
+                    delays.pop(radio.name, None)
+                    continue
+                if now < next_try.get(radio.name, 0):
+                    continue
+                if radio.interface:
+                    try:
+                        radio.interface.close()
+                    except Exception:
+                        pass
+                    radio.interface = None
+                if not self._connect_radio(radio):
+                    delay = min(delays.get(radio.name, self.reconnect_initial_delay) * 2, 60)
+                    delays[radio.name] = delay
+                    next_try[radio.name] = now + random.uniform(delay / 2, delay)
+            time.sleep(1)
+
+    def _radio_for(self, interface):
+        for radio in self.radios:
+            if radio.interface is interface:
+                return radio
+        return None
+
+    def _pick_radio(self, job):
+        """Radio to transmit a job on. Channel broadcasts always go out on the primary radio, whose
+        channels are the configured ones (RULE #2). A DM goes to the radio that heard the destination
+        most recently, otherwise (and on ties) to the one with the most free airtime."""
+        if job['dest_id'] is None:
+            if not self.primary.connected:
+                raise ConnectionError("Primary radio not connected; broadcasts only go out on it")
+            return self.primary
+        live = [r for r in self.radios if r.connected]
+        if not live:
+            raise ConnectionError("No radio connected")
+        if len(live) == 1:
+            return live[0]
+        now = time.monotonic()
+        dest = job['dest_id']
+        heard = [(r.heard[dest], r) for r in live if dest in r.heard and now - r.heard[dest] < self.heard_ttl]
+        if heard:
+            return max(heard, key=lambda hr: (hr[0], hr[1].airtime.tokens))[1]
+        for r in live:
+            r.airtime._refill(now)
+        return max(live, key=lambda r: r.airtime.tokens)
+
+    def radio_stats(self):
+        """Per-radio health/traffic, the shared outbound queue depth per priority and dedup counters."""
+        return {
+            'radios': [r.snapshot() for r in self.radios],
+            'outbound_queue': self.outbound.depths(),
+            'dedup': dict(self.packet_dedup.stats, size=len(self.packet_dedup)),
+        }
+
+    def export_metrics(self):
+        """Publish this engine's queues, radios, dedup and reconnect timings on the metrics endpoint."""
+        radio_kinds = ('rx', 'rx_duplicate', 'tx', 'tx_errors', 'connects')
+        metrics.gauge("meshupgrade_outbound_queue_depth", "Packets waiting for airtime, by priority", ("priority",),
+                      fn=lambda: [({'priority': p}, n) for p, n in self.outbound.depths().items()])
+        metrics.gauge("meshupgrade_dm_pending_acks", "Direct message packets waiting for an ACK",
+                      fn=lambda: len(self.ack_tracker))
+        metrics.gauge("meshupgrade_offline_inbox_messages", "Messages spooled in the offline inbox",
+                      fn=lambda: sum(len(msgs) for msgs in list(self.offline_inbox.values())))
+        metrics.gauge("meshupgrade_nodes_cached", "Nodes in the node cache", fn=lambda: len(self.node_cache))
+        metrics.gauge("meshupgrade_radio_connected", "1 if the radio link is up", ("radio",),
+                      fn=lambda: [({'radio': r.name}, r.connected) for r in self.radios])
+        metrics.gauge("meshupgrade_radio_airtime_free_seconds", "Transmit airtime left in the radio's budget", ("radio",),
+                      fn=lambda: [({'radio': r.name}, r.airtime.tokens) for r in self.radios])
+        metrics.counter("meshupgrade_radio_packets_total", "Packets per radio (rx, rx_duplicate, tx, tx_errors, connects)",
+                        ("radio", "kind"),
+                        fn=lambda: [({'radio': r.name, 'kind': k}, r.stats[k]) for r in self.radios for k in radio_kinds])
+        metrics.counter("meshupgrade_dedup_total", "Packet dedup table activity", ("result",),
+                        fn=lambda: [({'result': k}, v) for k, v in self.packet_dedup.stats.items()])
+        metrics.counter("meshupgrade_recover_total", "Connection recoveries by how they ended", ("outcome",),
+                        fn=lambda: [({'outcome': k}, v) for k, v in list(self.reconnect_outcomes.items())])
+        metrics.histogram("meshupgrade_recover_seconds", "Time to re-establish a lost radio connection",
+                          buckets=self.reconnect_stats.buckets).attach(self.reconnect_stats)
+        metrics.histogram("meshupgrade_reboot_seconds", "Time for a rebooting node to answer again",
+                          buckets=self.reboot_stats.buckets).attach(self.reboot_stats)
+
+    def connect_tcp(self, hostname, expect=None):
+        """Connect the primary radio over TCP.
+
+        expect(node_id, short_name), if given, vets the node that answered before anything is
+        switched over to it; a node it rejects is closed again and leaves the engine untouched.
+        """
         try:
+            log.info(f"Connecting to TCP: {hostname}")
+            iface = meshtastic.tcp_interface.TCPInterface(hostname)
+            if expect:
+                node_id, short_name = self._iface_identity(iface)
+                if not expect(node_id, short_name):
+                    log.info(f"{hostname} answers as {node_id or short_name}, not the node we want. Skipping.")
+                    try:
+                        iface.close()
+                    except Exception:
+                        pass
+                    return False
             self.last_conn_type = 'tcp'
             self.last_conn_params = hostname
-            logging.info(f"Connecting to TCP: {hostname}")
-            self.interface = meshtastic.tcp_interface.TCPInterface(hostname)
+            self.interface = iface
+            self.primary.conn_type, self.primary.params = 'tcp', hostname
+            self.primary.stats['connects'] += 1
             self._setup_listeners()
+            self._remember_location(hostname)
+            self.refresh_node_cache()
             return True
         except Exception as e:
-            logging.error(f"TCP Connection failed: {e}")
+            log.error(f"TCP Connection failed: {e}")
             return False
 
     def connect_serial(self, dev_path=None):
         if not SERIAL_AVAILABLE:
-            logging.error("Serial Connection is not supported on this device.")
+            log.error("Serial Connection is not supported on this device.")
             return False
             
         try:
             self.last_conn_type = 'serial'
             self.last_conn_params = dev_path
-            logging.info(f"Connecting to Serial: {dev_path if dev_path else 'Auto'}")
+            log.info(f"Connecting to Serial: {dev_path if dev_path else 'Auto'}")
             self.interface = meshtastic.serial_interface.SerialInterface(devPath=dev_path)
+            self.primary.conn_type, self.primary.params = 'serial', dev_path
+            self.primary.stats['connects'] += 1
             self._setup_listeners()
+            self.my_node_id = self._iface_identity(self.interface)[0] or self.my_node_id
+            self.refresh_node_cache()
             return True
         except Exception as e:
-            logging.error(f"Serial Connection failed: {e}")
+            log.error(f"Serial Connection failed: {e}")
             return False
 
     def reconnect(self):
@@ -257,63 +1185,258 @@ class MeshEngine:
             return self.connect_serial(self.last_conn_params)
         return False
 
-    def discover_node(self, target_short_name):
-        """Attempts to find the node on the local subnet using mDNS."""
+    def wait_for_reboot(self, timeout=None, down_timeout=15):
+        """Block until a rebooting radio is ready to be reconnected, instead of a fixed sleep.
+
+        Waits for the link to drop (the reboot has started), then polls the TCP port or serial
+        device and confirms with a heartbeat frame. Returns seconds until ready, or None on timeout.
+        """
+        start = time.monotonic()
+        deadline = start + (timeout or self.reboot_ready_timeout)
+        while self.is_connected and time.monotonic() < min(deadline, start + down_timeout):
+            time.sleep(0.25)
+        went_down = time.monotonic() - start
+        if self.is_connected:
+            log.info(f"Link still up {went_down:.0f}s after the change; checking readiness anyway.")
+
+        while time.monotonic() < deadline:
+            if self._radio_ready():
+                elapsed = time.monotonic() - start
+                self.reboot_stats.observe(elapsed)
+                log.info(f"Radio ready {elapsed:.1f}s after the change (link dropped at {went_down:.1f}s). "
+                             f"Reboot times: {self.reboot_stats.summary()}")
+                return elapsed
+            time.sleep(0.5)
+        log.warning(f"Radio not ready after {time.monotonic() - start:.0f}s, reconnecting anyway.")
+        return None
+
+    def _radio_ready(self):
+        if self.last_conn_type == 'tcp':
+            return self._tcp_ready(self.last_conn_params)
+        if self.last_conn_type == 'serial':
+            return self._serial_ready(self.last_conn_params)
+        return False
+
+    def _tcp_ready(self, host, timeout=1.0):
+        """Port open and the API accepts a heartbeat without dropping us (it is closed while booting)."""
+        try:
+            with socket.create_connection((host, MESHTASTIC_PORT), timeout=timeout) as s:
+                s.sendall(HEARTBEAT_FRAME)
+                try:
+                    return bool(s.recv(64))
+                except socket.timeout:
+                    return True  # Still open; firmware doesn't have to answer a heartbeat
+        except OSError:
+            return False
+
+    def _serial_ready(self, dev):
+        if not dev:
+            return True  # Auto-detect: nothing to poll, let the reconnect loop find it
+        if not os.path.exists(dev):
+            return False
+        pyserial = sys.modules.get('serial')
+        if not hasattr(pyserial, 'Serial'):
+            return True  # pyserial unavailable (Termux); device presence is all we can check
+        try:
+            with pyserial.Serial(dev, 115200, timeout=0.5, write_timeout=0.5) as port:
+                port.write(HEARTBEAT_FRAME)
+            return True
+        except Exception:
+            return False
+
+    @property
+    def recovering(self):
+        return self._recover_lock.locked()
+
+    def recover_connection(self, short_name=None, timeout=None, on_attempt=None):
+        """Reconnect after a drop or reboot as soon as the radio answers again.
+
+        Probes the last address (plus, for TCP, remembered addresses and matching mDNS
+        announcements) with exponential backoff and jitter, connects to whichever answers
+        first, and falls back to discover_node() once the deadline passes. on_attempt(n, wait)
+        is called before each wait. Only one recovery runs at a time; returns True if connected.
+        """
+        if not self._recover_lock.acquire(blocking=False):
+            log.info("Reconnect already in progress, not starting another.")
+            return False
+        start = time.monotonic()
+        try:
+            how = self._fast_reconnect(short_name, timeout or self.reconnect_timeout, on_attempt)
+            if not how and self.last_conn_type == 'tcp' and short_name:
+                log.warning(f"Node did not come back at a known address. Searching network for '{short_name}'...")
+                how = 'discovery' if self.discover_node(short_name) else None
+            elapsed = time.monotonic() - start
+            outcome = how or 'failed'
+            self.reconnect_outcomes[outcome] = self.reconnect_outcomes.get(outcome, 0) + 1
+            if how:
+                self.reconnect_stats.observe(elapsed)
+                log.info(f"Reconnected via {how} after {elapsed:.1f}s. Reconnect times: {self.reconnect_stats.summary()}")
+            else:
+                log.error(f"Reconnect failed after {elapsed:.1f}s.")
+            return bool(how)
+        finally:
+            self._recover_lock.release()
+
+    def _fast_reconnect(self, short_name, timeout, on_attempt=None):
+        """Backoff loop behind recover_connection. Returns how we got back in, or None."""
+        deadline = time.monotonic() + timeout
+        delay = self.reconnect_initial_delay
+        target_id = self.my_node_id
+        last_ip = self.last_conn_params if self.last_conn_type == 'tcp' else None
+        mdns_hits = []
+
+        def on_info(ip, txt):
+            txt_id, txt_short = txt.get('id'), txt.get('shortname')
+            if (target_id and txt_id == target_id) or (not target_id and short_name and txt_short == short_name):
+                mdns_hits.append(ip)
+
+        watching = self.last_conn_type == 'tcp' and self.start_mdns_discovery(None, on_info=on_info)
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                how = self._reconnect_once(last_ip, short_name, target_id, mdns_hits)
+                if how:
+                    return how
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                # Full jitter keeps several gateways on one AP from probing in lockstep
+                wait = min(random.uniform(delay / 2, delay), remaining)
+                if on_attempt:
+                    on_attempt(attempt, wait)
+                log.debug(f"Reconnect attempt {attempt} failed, next in {wait:.1f}s.")
+                time.sleep(wait)
+                delay = min(delay * 2, self.reconnect_max_delay)
+        finally:
+            if watching:
+                self.stop_mdns_discovery()
+
+    def _reconnect_once(self, last_ip, short_name, target_id, mdns_hits):
+        if self.last_conn_type == 'serial':
+            dev = self.last_conn_params
+            if dev and not os.path.exists(dev):
+                return None  # USB device not re-enumerated yet
+            return 'serial' if self.connect_serial(dev) else None
+        if self.last_conn_type != 'tcp':
+            return None
+
+        candidates = list(dict.fromkeys(
+            [ip for ip in [last_ip] if ip] + self._cached_addresses(short_name, target_id) + list(mdns_hits)
+        ))
+        if not candidates:
+            return None
+        # Race every candidate's port at once (hostnames too); first to answer is tried first
+        with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+            probes = {pool.submit(port_open, ip, MESHTASTIC_PORT, 0.5): ip for ip in candidates}
+            answering = [probes[f] for f in as_completed(probes) if f.result()]
+        is_target = lambda node_id, _: not (target_id and node_id and node_id != target_id)
+        for ip in answering:
+            if not self.connect_tcp(ip, expect=is_target):
+                continue
+            if ip == last_ip:
+                return 'last_ip'
+            return 'mdns' if ip in mdns_hits else 'remembered'
+        return None
+
+    def discover_node(self, target_short_name, target_id=None):
+        """Attempts to find the node on the local subnet: remembered addresses first, then mDNS."""
         if self.last_conn_type != 'tcp':
             return False
-            
+        target_id = target_id or self.my_node_id
+
+        def matches(node_id, short_name):
+            if target_id and node_id:
+                return node_id == target_id
+            return bool(short_name) and short_name == target_short_name
+
+        # 1. Where was it last time? One probe + one connect when the node kept its address.
+        for ip in self._cached_addresses(target_short_name, target_id):
+            if port_open(ip) and self.connect_tcp(ip, expect=matches):
+                log.info(f"Found node '{target_short_name}' at remembered IP: {ip}")
+                return True
+
+        # 2. mDNS: trust the TXT record when it carries shortname/id, handshake only when it doesn't
         found_ip = None
-        
-        def on_node(name, ip):
+        found = threading.Event()
+        seen = set()
+        lock = threading.Lock()
+        verifier = ThreadPoolExecutor(max_workers=self.verify_workers)
+
+        def settle(ip):
             nonlocal found_ip
-            if found_ip: return
-            
-            logging.debug(f"mDNS discovered potential node at {ip}")
+            with lock:
+                if not found_ip:
+                    found_ip = ip
+                    found.set()
+
+        def verify(ip):
+            if found.is_set():
+                return
+            temp_iface = None
             try:
-                # Need to verify the short name matches our target
+                # Full protobuf handshake: heavy on the node, so only a few run at once
                 temp_iface = meshtastic.tcp_interface.TCPInterface(ip)
-                time.sleep(1) # Let info sync
-                if temp_iface.getShortName() == target_short_name:
-                    found_ip = ip
-                temp_iface.close()
-            except:
-                pass
+                if matches(*self._iface_identity(temp_iface)):
+                    settle(ip)
+            except Exception as e:
+                log.debug(f"Handshake verification of {ip} failed: {e}")
+            finally:
+                if temp_iface:
+                    try:
+                        temp_iface.close()
+                    except Exception:
+                        pass
 
-        logging.info(f"Scanning via mDNS for node '{target_short_name}'...")
-        if not self.start_mdns_discovery(on_node):
+        def on_info(ip, txt):
+            with lock:
+                if found_ip or ip in seen:
+                    return
+                seen.add(ip)
+            txt_id, txt_short = txt.get('id'), txt.get('shortname')
+            if txt_id or txt_short:
+                log.debug(f"mDNS node at {ip}: id={txt_id} shortname={txt_short}")
+                if matches(txt_id, txt_short):
+                    settle(ip)
+                return
+            log.debug(f"mDNS discovered potential node at {ip} (no TXT identity), verifying...")
+            try:
+                verifier.submit(verify, ip)
+            except RuntimeError:
+                pass  # Discovery already finished
+
+        log.info(f"Scanning via mDNS for node '{target_short_name}'...")
+        if not self.start_mdns_discovery(None, on_info=on_info):
+            verifier.shutdown(wait=False)
             return False
             
         # Wait up to 15 seconds for mDNS discovery and verification
-        for _ in range(15):
-            if found_ip:
-                break
-            time.sleep(1)
-            
+        found.wait(15)
         self.stop_mdns_discovery()
+        verifier.shutdown(wait=False, cancel_futures=True)
         
         if found_ip:
-            logging.info(f"Found node '{target_short_name}' at new IP: {found_ip}")
-            self.last_conn_params = found_ip
-            return self.connect_tcp(found_ip)
+            log.info(f"Found node '{target_short_name}' at new IP: {found_ip}")
+            return self.connect_tcp(found_ip)  # Already vetted by its TXT record or a handshake
             
-        logging.error(f"Discovery failed. Node '{target_short_name}' not found.")
+        log.error(f"Discovery failed. Node '{target_short_name}' not found.")
         return False
 
-    def start_mdns_discovery(self, on_node_found):
+    def start_mdns_discovery(self, on_node_found, on_info=None):
         """Starts mDNS zeroconf listener to instantly find nodes."""
         if not Zeroconf:
-            logging.error("Zeroconf not installed. Cannot run mDNS discovery.")
+            log.error("Zeroconf not installed. Cannot run mDNS discovery.")
             return False
             
         try:
             self.stop_mdns_discovery()
             self.mdns_zeroconf = Zeroconf()
-            self.mdns_listener = MeshtasticListener(on_node_found)
+            self.mdns_listener = MeshtasticListener(on_node_found, on_info)
             self.mdns_browser = ServiceBrowser(self.mdns_zeroconf, "_meshtastic._tcp.local.", self.mdns_listener)
-            logging.info("Started mDNS discovery for _meshtastic._tcp.local.")
+            log.info("Started mDNS discovery for _meshtastic._tcp.local.")
             return True
         except Exception as e:
-            logging.error(f"mDNS start failed: {e}")
+            log.error(f"mDNS start failed: {e}")
             return False
 
     def stop_mdns_discovery(self):
@@ -322,100 +1445,84 @@ class MeshEngine:
             if hasattr(self, 'mdns_zeroconf') and self.mdns_zeroconf:
                 self.mdns_zeroconf.close()
                 self.mdns_zeroconf = None
-                logging.info("Stopped mDNS discovery.")
+                log.info("Stopped mDNS discovery.")
         except Exception as e:
-            logging.error(f"mDNS stop failed: {e}")
+            log.error(f"mDNS stop failed: {e}")
 
     def start_hybrid_discovery(self, on_node_found_callback):
         """Starts mDNS and immediately follows it up with a rapid subnet port scan."""
         # 1. Start mDNS
         self.start_mdns_discovery(on_node_found_callback)
         
-        # 2. Start rapid port sweep in background
+        # 2. Start rapid port sweep in background (asyncio, every local interface or the configured CIDRs)
         def sweep_task():
             try:
-                # find local ip
-                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                try:
-                    s.connect(('10.255.255.255', 1))
-                    local_ip = s.getsockname()[0]
-                except:
-                    local_ip = '127.0.0.1'
-                finally:
-                    s.close()
-    
-                if local_ip == '127.0.0.1':
+                networks = self.sweep_networks or local_networks()
+                if not networks:
                     return
-    
-                network = ipaddress.ip_network(f"{local_ip}/24", strict=False)
-                logging.info(f"Hybrid: Sweeping local subnet {network} for port 4403...")
-                
-                def check_ip(ip):
-                    ip_str = str(ip)
-                    if ip_str == local_ip: return None
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                        s.settimeout(0.75) # Allow 750ms for slow ESP32 handshakes
-                        if s.connect_ex((ip_str, 4403)) == 0:
-                            return ip_str
-                    return None
-    
-                import threading
-                with ThreadPoolExecutor(max_workers=75) as executor:
-                    futures = [executor.submit(check_ip, ip) for ip in network.hosts()]
-                    for future in as_completed(futures):
-                        res = future.result()
-                        if res:
-                            # We found an open port 4403! 
-                            # Do NOT try to connect with TCPInterface here to get the shortname.
-                            # It is a heavy protobuf handshake and will crash the node.
-                            # Just return the IP address.
-                            node_name = f"Swept Node ({res.split('.')[-1]})"
-                                
-                            on_node_found_callback(node_name, res)
+                log.info(f"Hybrid: Sweeping {', '.join(str(n) for n in networks)} for port {MESHTASTIC_PORT}...")
+
+                # Do NOT try to connect with TCPInterface here to get the shortname.
+                # It is a heavy protobuf handshake and will crash the node.
+                # Just report the IP address as soon as the port answers.
+                def on_found(ip):
+                    on_node_found_callback(f"Swept Node ({ip.split('.')[-1]})", ip)
+
+                sweeper = SubnetSweeper(concurrency=self.sweep_concurrency, rate=self.sweep_rate)
+                sweeper.sweep(networks, on_found=on_found)
+                log.info(f"Hybrid: Sweep done in {sweeper.stats['elapsed']:.2f}s "
+                             f"({sweeper.stats['probed']} hosts, {sweeper.stats['found']} found).")
             except Exception as e:
-                logging.debug(f"Hybrid sweep error: {e}")
-                
-        import threading
+                log.debug(f"Hybrid sweep error: {e}")
+
         threading.Thread(target=sweep_task, daemon=True).start()
 
     def _setup_listeners(self):
         pub.subscribe(self._on_receive, "meshtastic.receive")
+        pub.subscribe(self._on_node_updated, "meshtastic.node.updated")
 
     def _on_receive(self, packet, interface):
-        # Auto-flush Offline Inbox if we see activity from a node
+        radio = self._radio_for(interface)
+        if radio is None:
+            return  # Temporary interface (e.g. a discovery handshake), not one of ours
+        capture = self.capture
+        if capture:
+            # Recorded before dedup so a replay exercises the same duplicates
+            capture.packet(radio.name, packet)
         sender = packet.get('fromId')
+        radio.stats['rx'] += 1
+        radio.last_rx = time.time()
+        if sender:
+            radio.mark_heard(sender)
+        pkt_id = packet.get('id')
+        if pkt_id and self.packet_dedup.seen(packet.get('from', sender), pkt_id):
+            radio.stats['rx_duplicate'] += 1
+            log.debug("Duplicate packet %s from %s suppressed.", pkt_id, sender)
+            return
+
+        # Auto-flush Offline Inbox if we see activity from a node
+        if sender:
+            self._update_node(sender, last_heard=packet.get('rxTime') or time.time())
         if sender and sender in self.offline_inbox:
-            # Check if there are messages waiting
-            pending = self.check_inbox(sender)
-            if pending:
-                logging.info(f"Node {sender} is active! Auto-flushing {len(pending)} offline messages.")
-                # We spin up a thread so we don't block the packet reception thread
-                def flush_msgs(dest, msgs):
-                    for m in msgs:
-                        def make_ack(msg_text):
-                            def on_ack(acked_dest):
-                                if hasattr(self, 'global_ack_callback') and self.global_ack_callback:
-                                    self.global_ack_callback(acked_dest, msg_text)
-                            return on_ack
-                            
-                        self.send_dm(dest, m, ack_callback=make_ack(m))
-                        time.sleep(5) # Space out bursting
-                threading.Thread(target=flush_msgs, args=(sender, pending), daemon=True).start()
+            count = self.flush_inbox(sender)
+            if count:
+                log.info(f"Node {sender} is active! Auto-flushed {count} offline messages.")
 
         # ACK Tracking interception
         decoded = packet.get('decoded', {})
         port = decoded.get('portnum')
+        PACKETS_RECEIVED.inc(portnum=port if port is not None else 'ENCRYPTED')
         
-        # Log every packet type when we have pending messages to track
-        if self.ack_tracker:
-            logging.info(f"PKT RX: portnum={port}, from={packet.get('fromId')}, tracked={list(self.ack_tracker.keys())}")
+        # Trace every packet type while DMs are pending (the id list is only built when DEBUG is on)
+        if self.ack_tracker and log.isEnabledFor(logging.DEBUG):
+            log.debug("PKT RX: portnum=%s, from=%s, tracked=%s", port, sender, self.ack_tracker.ids())
         
         # Check for routing/ACK packets — portnum can be 'ROUTING_APP' or 4
         is_routing = (port == 'ROUTING_APP' or port == 4 or str(port) == '4')
         if is_routing:
             routing = decoded.get('routing', {})
             error_reason = routing.get('errorReason', '')
-            logging.info(f"ROUTING PKT: errorReason={error_reason}, routing={routing}")
+            log.debug("ROUTING PKT: errorReason=%s, routing=%s", error_reason, routing)
             
             if error_reason == 'NONE' or error_reason == 0:
                 # Try multiple places where the requestId can live
@@ -423,70 +1530,113 @@ class MeshEngine:
                           or decoded.get('requestId')
                           or packet.get('requestId'))
                 
-                logging.info(f"ACK received: requestId={req_id} (type={type(req_id).__name__}), tracked IDs={list(self.ack_tracker.keys())}")
+                log.debug("ACK received: requestId=%r, pending=%d", req_id, len(self.ack_tracker))
                 
-                # Match by value — handle int/string mismatches
-                matched_id = None
-                if req_id in self.ack_tracker:
-                    matched_id = req_id
-                else:
-                    for tracked_id in self.ack_tracker:
-                        if str(tracked_id) == str(req_id):
-                            matched_id = tracked_id
-                            break
+                # Tracker keys are normalized, so int/string requestIds match directly
+                matched = self.ack_tracker.get(req_id) if req_id is not None else None
                 
-                if matched_id is not None:
-                    acked_dest = self.ack_tracker[matched_id]['dest_id']
+                if matched is not None:
+                    acked_dest = matched['dest_id']
                     ack_from = packet.get('fromId')
                     
                     if ack_from and ack_from != acked_dest:
-                        logging.info(f"Ignoring intermediate hop ACK from {ack_from} (waiting for final ACK from {acked_dest})")
+                        log.info("Ignoring intermediate hop ACK from %s (waiting for final ACK from %s)", ack_from, acked_dest)
                         return
 
-                    ack_callback = self.ack_tracker[matched_id].get('ack_callback')
-                    logging.info(f"ACK MATCHED for msg {matched_id} to {acked_dest}. Firing callback and clearing retries.")
-                    to_remove = [pid for pid, d in self.ack_tracker.items() if d['dest_id'] == acked_dest]
-                    for pid in to_remove:
-                        del self.ack_tracker[pid]
+                    # Only this packet is delivered: other DMs and parts to the node keep their own retries
+                    if self.ack_tracker.pop(req_id) is None:
+                        return  # A duplicate ACK raced us to it
+                    self.retry_scheduler.cancel(DeliveryTracker.normalize(req_id))
+                    ACK_RTT.observe(time.time() - matched['last_sent'])
+                    log.info("ACK MATCHED for msg %s to %s. Firing callback and clearing retries.", req_id, acked_dest)
+                    # For a multi-part message this is PartGroup.part_acked, which resolves on the last part
+                    ack_callback = matched.get('ack_callback')
                     if ack_callback:
                         try:
                             ack_callback(acked_dest)
                         except Exception as e:
-                            logging.error(f"ACK callback error: {e}")
+                            log.error(f"ACK callback error: {e}")
                 else:
-                    logging.warning(f"ACK requestId={req_id} did NOT match any tracked message.")
+                    log.warning("ACK requestId=%s did NOT match any tracked message.", req_id)
 
         if self.callback_on_message:
             self.callback_on_message(packet)
 
-    def send_dm(self, dest_id, message, ack_callback=None, fail_callback=None):
-        if not self.interface:
-            return False
-        
-        # RULE #1: ENFORCE 200 CHAR LIMIT
-        if len(message) > 200:
-            logging.warning("Message too long, truncating to 200 chars.")
-            message = message[:197] + "..."
-            
+    def _transmit(self, job):
+        """Called by the outbound scheduler thread to put one packet on the air."""
+        radio = self._pick_radio(job)
+        radio.airtime.consume(job['airtime'], time.monotonic())
+        job['radio'] = radio.name
         try:
-            packet = self.interface.sendText(message, destinationId=dest_id, wantAck=True)
-            if hasattr(packet, 'id'):
-                pkt_id = packet.id
-                logging.info(f"sendText returned MeshPacket with id={pkt_id} (type={type(pkt_id).__name__})")
-                self.ack_tracker[pkt_id] = {
-                    'dest_id': dest_id,
-                    'message': message,
-                    'retries': 0,
-                    'last_sent': time.time(),
-                    'ack_callback': ack_callback,
-                    'fail_callback': fail_callback
-                }
+            if job['dest_id'] is not None:
+                packet = radio.interface.sendText(job['text'], destinationId=job['dest_id'], wantAck=job['want_ack'])
             else:
-                logging.warning(f"sendText returned object without 'id' attribute: {packet}")
-            return True
-        except Exception as e:
-            logging.error(f"Failed to send DM: {e}")
+                # sendText normally broadcasts if no destinationId is provided
+                # channelIndex specifies which channel to use
+                packet = radio.interface.sendText(job['text'], channelIndex=job['channel_index'])
+        except BaseException:
+            radio.stats['tx_errors'] += 1
+            raise
+        radio.stats['tx'] += 1
+        radio.last_tx = time.time()
+        return packet
+
+    def send_dm(self, dest_id, message, ack_callback=None, fail_callback=None, priority=PRIORITY_INTERACTIVE, spool=None):
+        """Queue a DM with ACK tracking. Returns immediately; False only if there is no radio.
+
+        spool: messages to put in the offline inbox if this DM is never ACKed (default: the text itself).
+        """
+        if not any(r.interface for r in self.radios):
             return False
+        
+        # RULE #1: every packet fits the byte budget; longer text goes out in parts
+        parts = self._pack(message)
+        if len(parts) > 1:
+            group = PartGroup(len(parts), ack_callback, fail_callback)
+            ack_callback, fail_callback = group.part_acked, group.part_failed
+
+        def make_entry(part):
+            return {
+                'dest_id': dest_id,
+                'message': part,
+                'retries': 0,
+                'last_sent': time.time(),
+                'priority': priority,
+                'ack_callback': ack_callback,
+                'fail_callback': fail_callback,
+                'spool': spool,
+            }
+
+        def make_on_sent(part):
+            def on_sent(packet):
+                if hasattr(packet, 'id'):
+                    pkt_id = packet.id
+                    log.debug("sendText returned MeshPacket with id=%s", pkt_id)
+                    self._track_dm(pkt_id, make_entry(part))
+                else:
+                    log.warning("sendText returned object without 'id' attribute: %r", packet)
+            return on_sent
+
+        def make_on_error(part):
+            def on_error(e):
+                # Never transmitted: track it under a local id so it goes through the normal
+                # retries, then the offline inbox and fail_callback once they run out
+                log.warning(f"DM to {dest_id} could not be sent ({e}); retrying in {self.retry_cooldown}s.")
+                SEND_FAILED.inc(kind="dm")
+                self._track_dm(f"unsent-{next(self._unsent_ids)}", make_entry(part))
+            return on_error
+
+        for part in parts:
+            self.outbound.enqueue(part, dest_id=dest_id, want_ack=True, priority=priority,
+                                  on_sent=make_on_sent(part), on_error=make_on_error(part))
+        return True
+
+    def _pack(self, message):
+        parts, truncated = pack(message, self.max_packet_bytes, self.max_message_parts)
+        if truncated:
+            log.warning(f"Message needs more than {self.max_message_parts} packets; sending the first "
+                            f"{self.max_message_parts} and marking the cut.")
+        return parts
 
     def get_channels(self):
         if not self.interface or not self.interface.localNode:
@@ -503,41 +1653,30 @@ class MeshEngine:
             channels.append({"index": i, "name": chan_name})
         return channels
 
-    def send_broadcast(self, message, channel_index=0):
-        if not self.interface:
-            return False
-            
-        # Broadcast guard: wait 5s after info ping
-        time_since_ping = time.time() - self.last_info_broadcast_time
-        if time_since_ping < 5:
-            wait_time = 5 - time_since_ping
-            logging.info(f"Broadcast guard: waiting {wait_time:.1f}s for mesh to clear...")
-            time.sleep(wait_time)
-
-        # RULE #1: ENFORCE 200 CHAR LIMIT
-        if len(message) > 200:
-            logging.warning("Broadcast too long, truncating.")
-            message = message[:197] + "..."
-            
-        try:
-            # sendText normally broadcasts if no destinationId is provided
-            # channelIndex specifies which channel to use
-            self.interface.sendText(message, channelIndex=channel_index)
-            return True
-        except Exception as e:
-            logging.error(f"Failed to send broadcast: {e}")
+    def send_broadcast(self, message, channel_index=0, priority=PRIORITY_INTERACTIVE):
+        """Queue a channel broadcast. Held by the scheduler for 5s after an info ping."""
+        if not any(r.interface for r in self.radios):
             return False
 
+        def on_error(e):
+            log.error(f"Broadcast on channel {channel_index} not sent: {e}")
+            SEND_FAILED.inc(kind="broadcast")
+
+        # RULE #1: every packet fits the byte budget; longer text goes out in parts
+        for part in self._pack(message):
+            self.outbound.enqueue(part, channel_index=channel_index, priority=priority, on_error=on_error)
+        return True
+
     def set_short_name(self, short_name):
         if not self.interface or not self.interface.localNode:
             return False
         try:
-            logging.info(f"Setting node short name to: {short_name}")
+            log.info(f"Setting node short name to: {short_name}")
             self.last_short_name = short_name
             self.interface.localNode.setOwner(short_name=short_name)
             return True
         except Exception as e:
-            logging.error(f"Failed to set short name: {e}")
+            log.error(f"Failed to set short name: {e}")
             return False
 
     def send_node_info(self, short_name=None, long_name=None):
@@ -550,24 +1689,42 @@ class MeshEngine:
             
             # Avoid redundant flash writes and reboot loops
             if sn == curr_sn:
-                logging.info(f"Node shortname is already '{sn}'. Skipping redundant flash write to prevent crash.")
+                log.info(f"Node shortname is already '{sn}'. Skipping redundant flash write to prevent crash.")
                 self.last_info_broadcast_time = time.time()
                 return True
                 
-            logging.info(f"Re-broadcasting node info to mesh (Short: {sn})...")
+            log.info(f"Re-broadcasting node info to mesh (Short: {sn})...")
             self.interface.localNode.setOwner(long_name=ln, short_name=sn)
             self.last_info_broadcast_time = time.time()
             return True
         except (OSError, Exception) as e:
             if "Broken pipe" in str(e) or "[Errno 32]" in str(e):
-                logging.debug(f"Info broadcast skipped: Connection closed ({e})")
+                log.debug(f"Info broadcast skipped: Connection closed ({e})")
             else:
-                logging.error(f"Failed to send node info: {e}")
+                log.error(f"Failed to send node info: {e}")
             return False
 
-    def close(self):
-        if self.interface:
-            try:
-                self.interface.close()
-            except Exception:
-                pass # Suppress noisy shutdown errors
+    def start_capture(self, path):
+        """Record every inbound packet to path (appending) until stop_capture()."""
+        self.stop_capture()
+        self.capture = CaptureWriter(path)
+        log.info(f"Capturing inbound packets to {path}")
+        return self.capture
+
+    def stop_capture(self):
+        capture, self.capture = self.capture, None
+        if capture:
+            capture.close()
+            log.info(f"Capture stopped after {capture.records} records ({capture.path})")
+
+    def close(self, extras=True):
+        """Close the radios. extras=False (a reconnect of the primary) keeps the rest running, capture included."""
+        if extras:
+            self.stop_capture()
+        self._save_node_cache()  # Changes since the last periodic flush
+        for radio in (self.radios if extras else [self.primary]):
+            if radio.interface:
+                try:
+                    radio.interface.close()
+                except Exception:
+                    pass # Suppress noisy shutdown errors
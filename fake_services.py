@@ -0,0 +1,442 @@
+"""
+fake_services.py — MeshUpGrade Offline Stand-in Services
+Local fakes of every upstream the gateway talks to, for load and latency
+testing on an air-gapped machine:
+
+    APRS-IS (TCP)          login/logresp, keepalives, ACKs for messages we send,
+                           optional replay of a file of APRS lines as live traffic
+    HTTP (one port)        /v1/forecast (Open-Meteo), /alerts/active (NWS),
+                           /api/get (aprs.fi), /v1/satellites/25544 (wheretheiss),
+                           /peopleinspaceapi.php, POST / (APRS-IS HTTP inject)
+
+Each service has a scriptable behaviour: latency (+ random jitter), error rate,
+a request-rate limit and a bandwidth limit for what it sends back. Set them
+with flags for every service at once, per service with --config behaviours.json:
+
+    {"open_meteo": {"latency": 2.5, "jitter": 1.0}, "aprs_is": {"bandwidth": 2000}}
+
+or while a test runs: POST /_behavior with the same JSON. GET /_stats returns
+per-service request/error/throttle counts.
+
+    python fake_services.py --latency 0.3 --error-rate 0.02
+then paste the printed "endpoints" block into settings.json.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import math
+import random
+import re
+import select
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+log = logging.getLogger("fake_services")
+
+APRS_IS_KEEPALIVE = 20  # Seconds of client silence before the fake APRS-IS server sends a "# aprsc" line
+
+SERVICES = ('aprs_is', 'aprs_http', 'open_meteo', 'nws', 'aprs_fi', 'wheretheiss', 'people_in_space')
+
+ROUTES = {  # HTTP path -> service name
+    '/v1/forecast': 'open_meteo',
+    '/alerts/active': 'nws',
+    '/api/get': 'aprs_fi',
+    '/v1/satellites/25544': 'wheretheiss',
+    '/peopleinspaceapi.php': 'people_in_space',
+}
+
+
+class Behavior:
+    """How one fake service misbehaves. All limits are off at 0."""
+    FIELDS = ('latency', 'jitter', 'error_rate', 'error_status', 'rate', 'bandwidth')
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, rate=0.0, bandwidth=0):
+        self.latency = latency            # Seconds before every response
+        self.jitter = jitter              # Extra uniform random 0..jitter seconds
+        self.error_rate = error_rate      # Fraction of requests that fail (HTTP error / dropped APRS-IS link)
+        self.error_status = error_status
+        self.rate = rate                  # Requests (or APRS-IS lines) accepted per second; excess gets 429 / dropped
+        self.bandwidth = bandwidth        # Bytes per second for what the service sends back
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'throttled': 0, 'bytes_out': 0}
+
+    def update(self, **changes):
+        for key, value in changes.items():
+            if key not in self.FIELDS:
+                raise ValueError(f"Unknown behaviour {key!r}")
+            setattr(self, key, type(getattr(self, key))(value))
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def admit(self):
+        """Count a request; False if it is over the rate limit."""
+        with self._lock:
+            self.stats['requests'] += 1
+            if not self.rate:
+                return True
+            now = time.monotonic()
+            # Room for at least one request, so a rate below 1/s still lets one through every 1/rate seconds
+            self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.stats['throttled'] += 1
+            return False
+
+    def fails(self):
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.stats['errors'] += 1
+            return True
+        return False
+
+    def delay(self):
+        wait = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if wait > 0:
+            time.sleep(wait)
+
+    def write(self, write, data):
+        """Send data through write(), paced to the bandwidth limit."""
+        with self._lock:
+            self.stats['bytes_out'] += len(data)
+        if not self.bandwidth:
+            write(data)
+            return
+        chunk = max(1, self.bandwidth // 20)  # ~50ms slices
+        for i in range(0, len(data), chunk):
+            piece = data[i:i + chunk]
+            write(piece)
+            time.sleep(len(piece) / self.bandwidth)
+
+
+# --- Canned answers -------------------------------------------------------
+
+def forecast(query):
+    hour = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    today = datetime.date.today()
+    return {
+        'latitude': float(query.get('latitude', ['0'])[0]), 'longitude': float(query.get('longitude', ['0'])[0]),
+        'current_weather': {'temperature': 63.2, 'windspeed': 8.1, 'winddirection': 220, 'weathercode': 2},
+        'hourly': {
+            'time': [(hour + datetime.timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(-6, 66)],
+            'temperature_2m': [55.0 + (i % 24) * 0.8 for i in range(72)],
+            'weathercode': [(0, 2, 3, 61, 80, 95)[i % 6] for i in range(72)],
+        },
+        'daily': {
+            'time': [(today + datetime.timedelta(days=i)).isoformat() for i in range(7)],
+            'temperature_2m_max': [71.4, 68.2, 75.9, 80.1, 77.3, 69.0, 66.6],
+            'temperature_2m_min': [52.1, 50.0, 55.5, 60.2, 58.8, 49.9, 47.3],
+            'weathercode': [0, 3, 61, 95, 2, 45, 71],
+        },
+    }
+
+
+def alerts(query):
+    return {'features': [{'properties': {
+        'id': "urn:oid:fake.alert.1", 'event': "Severe Thunderstorm Warning", 'severity': "Severe",
+        'headline': "Severe Thunderstorm Warning issued for the test area until 9:00PM",
+    }}]}
+
+
+def aprs_fi(query):
+    name = query.get('name', ['N0CALL'])[0].upper()
+    return {'result': "ok", 'found': 1, 'entries': [{
+        'name': f"{name}-9", 'lat': "40.7128", 'lng': "-74.0060", 'course': "90", 'speed': "42",
+        'altitude': "12", 'comment': "Fake mobile", 'lasttime': str(int(time.time()) - 120),
+    }]}
+
+
+def iss(query):
+    phase = time.time() / (92.68 * 60) * 360
+    return {'name': "iss", 'id': 25544, 'latitude': 51.6 * math.sin(math.radians(phase)),
+            'longitude': (phase * 3 % 360) - 180, 'altitude': 421.9, 'velocity': 27580.0, 'visibility': "daylight"}
+
+
+def people(query):
+    return {'number': 3, 'people': [{'name': n, 'craft': "ISS"} for n in ("Test Astronaut", "Fake Cosmonaut", "Mock Engineer")]}
+
+
+ANSWERS = {'open_meteo': forecast, 'nws': alerts, 'aprs_fi': aprs_fi, 'wheretheiss': iss, 'people_in_space': people}
+
+
+# --- HTTP -----------------------------------------------------------------
+
+class FakeHttpHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    services = None  # Set by FakeServices
+
+    def _send(self, behavior, status, body, content_type="application/json"):
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if behavior:
+            behavior.write(self.wfile.write, data)
+        else:
+            self.wfile.write(data)
+
+    def _serve(self, service, answer):
+        behavior = self.services.behaviors[service]
+        if not behavior.admit():
+            self._send(behavior, 429, '{"error": "rate limited"}')
+            return
+        behavior.delay()
+        if behavior.fails():
+            self._send(behavior, behavior.error_status, '{"error": "injected failure"}')
+            return
+        status, body = answer()
+        self._send(behavior, status, body if isinstance(body, str) else json.dumps(body))
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == "/_stats":
+            self._send(None, 200, json.dumps(self.services.stats(), indent=2))
+            return
+        service = ROUTES.get(parts.path)
+        if not service:
+            self._send(None, 404, '{"error": "unknown path"}')
+            return
+        query = parse_qs(parts.query)
+        self._serve(service, lambda: (200, ANSWERS[service](query)))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8', errors='replace')
+        if self.path == "/_behavior":
+            try:
+                self.services.set_behaviors(json.loads(body))
+                self._send(None, 200, json.dumps({k: b.to_dict() for k, b in self.services.behaviors.items()}))
+            except (ValueError, TypeError) as e:
+                self._send(None, 400, json.dumps({'error': str(e)}))
+            return
+
+        def inject():
+            login, _, packets = body.partition("\r\n")
+            if not re.match(r"^user \S+ pass -?\d+", login):
+                return 403, "bad login"
+            for line in packets.splitlines():
+                if line.strip():
+                    self.services.aprs_sent.append(line.strip())
+                    ack = self.services.ack_for(line.strip())
+                    if ack:
+                        # Injected packets reach the network; the ack comes back on the APRS-IS feed
+                        threading.Thread(target=self.services.broadcast, args=(ack,), daemon=True).start()
+            return 200, "ok"
+        self._serve('aprs_http', inject)
+
+    def log_message(self, fmt, *args):
+        log.debug("HTTP %s", fmt % args)
+
+
+# --- APRS-IS --------------------------------------------------------------
+
+MESSAGE_RE = re.compile(r"^(?P<src>[^>]+)>[^:]*::(?P<dest>.{9}):(?P<body>.*?)(?:\{(?P<id>[^}]{1,5}))?$")
+
+
+class FakeAprsIsHandler(socketserver.StreamRequestHandler):
+    services = None  # Set by FakeServices
+
+    def send_line(self, line):
+        behavior = self.services.behaviors['aprs_is']
+        with self.write_lock:
+            behavior.write(self.wfile.write, (line + "\r\n").encode('utf-8'))
+
+    def handle(self):
+        behavior = self.services.behaviors['aprs_is']
+        self.write_lock = threading.Lock()
+        self.callsign = None
+        self.send_line("# aprsc 2.1.19-fake MeshUpGrade test server")
+        self.services.add_client(self)
+        try:
+            # Raw recv behind select: a timed-out buffered readline() leaves the file object unusable
+            pending = b""
+            while True:
+                readable, _, _ = select.select([self.request], [], [], APRS_IS_KEEPALIVE)
+                if not readable:
+                    self.send_line(f"# aprsc 2.1.19-fake {datetime.datetime.utcnow():%d %b %Y %H:%M:%S} GMT FAKE")
+                    continue
+                data = self.request.recv(4096)
+                if not data:
+                    return
+                *lines, pending = (pending + data).split(b"\n")
+                for raw in lines:
+                    line = raw.decode('utf-8', errors='replace').strip()
+                    if not line:
+                        continue
+                    if not behavior.admit():
+                        continue  # Over the rate limit: silently dropped, like a real server
+                    if behavior.fails():
+                        log.info(f"Injected APRS-IS disconnect for {self.callsign}")
+                        return
+                    self.on_line(line, behavior)
+        except OSError:
+            pass
+        finally:
+            self.services.remove_client(self)
+
+    def on_line(self, line, behavior):
+        if line.startswith("user "):
+            fields = line.split()
+            self.callsign = fields[1].upper()
+            behavior.delay()
+            self.send_line(f"# logresp {self.callsign} verified, server FAKE")
+            if "filter" in fields:
+                self.send_line(f"# filter {' '.join(fields[fields.index('filter') + 1:])} active")
+            return
+        if line.startswith("#"):
+            if line.startswith("#filter"):
+                self.send_line(f"# filter {line[len('#filter'):].strip()} active")
+            return
+        self.services.aprs_sent.append(line)
+        ack = self.services.ack_for(line)
+        if ack:
+            behavior.delay()
+            self.send_line(ack)
+
+
+class _TcpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeServices:
+    def __init__(self, host="127.0.0.1", http_port=8080, aprs_port=14580, acks=True, **defaults):
+        self.host = host
+        self.acks = acks  # Answer messages with an ack (off: exercise retries and timeouts)
+        self.behaviors = {name: Behavior(**defaults) for name in SERVICES}
+        self.aprs_sent = []  # Every packet the gateway sent to APRS-IS (TCP or HTTP inject)
+        self._clients = set()
+        self._clients_lock = threading.Lock()
+
+        handler = type('Handler', (FakeHttpHandler,), {'services': self})
+        self.http = ThreadingHTTPServer((host, http_port), handler)
+        self.http.daemon_threads = True
+        aprs_handler = type('AprsHandler', (FakeAprsIsHandler,), {'services': self})
+        self.aprs = _TcpServer((host, aprs_port), aprs_handler)
+
+    @property
+    def http_port(self):
+        return self.http.server_address[1]
+
+    @property
+    def aprs_port(self):
+        return self.aprs.server_address[1]
+
+    def set_behaviors(self, config):
+        """{"service" or "*": {"latency": .., ...}}"""
+        for name, changes in config.items():
+            targets = self.behaviors.values() if name == "*" else [self.behaviors[name]]
+            for behavior in targets:
+                behavior.update(**changes)
+
+    def stats(self):
+        return {name: dict(b.stats, **b.to_dict()) for name, b in self.behaviors.items()}
+
+    def ack_for(self, line):
+        """The ack the addressee (SMSGTE, a ham) would send for a message line, or None."""
+        match = MESSAGE_RE.match(line)
+        if not self.acks or not match or not match.group('id') or match.group('body').startswith(("ack", "rej")):
+            return None
+        dest = match.group('dest').strip()
+        sender = "SMSGTE" if dest == "SMS" else dest
+        return f"{sender}>APSMS1,TCPIP*,qAS,FAKE::{match.group('src').ljust(9)}:ack{match.group('id')}"
+
+    def add_client(self, client):
+        with self._clients_lock:
+            self._clients.add(client)
+
+    def remove_client(self, client):
+        with self._clients_lock:
+            self._clients.discard(client)
+
+    def broadcast(self, line):
+        """Deliver an APRS-IS line to every connected client (the gateway's filters are not applied)."""
+        with self._clients_lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.send_line(line)
+            except OSError:
+                self.remove_client(client)
+
+    def feed(self, lines, rate):
+        """Replay lines as live APRS-IS traffic at rate lines/s, looping forever."""
+        interval = 1.0 / rate if rate else 0
+        while True:
+            for line in lines:
+                self.broadcast(line)
+                if interval:
+                    time.sleep(interval)
+
+    def endpoints(self):
+        base = f"http://{self.host}:{self.http_port}"
+        return {
+            'aprs_is': f"{self.host}:{self.aprs_port}", 'aprs_http': f"{base}/",
+            'open_meteo': f"{base}/v1/forecast", 'nws': base, 'aprs_fi': base,
+            'wheretheiss': base, 'people_in_space': base,
+        }
+
+    def start(self):
+        for server in (self.http, self.aprs):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in (self.http, self.aprs):
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-ins for APRS-IS, Open-Meteo, NWS, aprs.fi and the ISS APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--aprs-port", type=int, default=14580)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random 0..N seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests per second per service (0 = unlimited)")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes per second per response (0 = unlimited)")
+    parser.add_argument("--config", help="JSON file of per-service behaviours")
+    parser.add_argument("--feed", help="file of APRS-IS lines to send to connected clients as live traffic")
+    parser.add_argument("--no-acks", action="store_true", help="never ack APRS messages")
+    parser.add_argument("--feed-rate", type=float, default=10.0, help="lines per second for --feed (0 = flat out)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    services = FakeServices(args.host, args.http_port, args.aprs_port, acks=not args.no_acks, latency=args.latency, jitter=args.jitter,
+                            error_rate=args.error_rate, rate=args.rate, bandwidth=args.bandwidth)
+    if args.config:
+        with open(args.config) as f:
+            services.set_behaviors(json.load(f))
+    services.start()
+    if args.feed:
+        with open(args.feed) as f:
+            lines = [line.strip() for line in f if line.strip()]
+        threading.Thread(target=services.feed, args=(lines, args.feed_rate), daemon=True).start()
+
+    print(json.dumps({'endpoints': services.endpoints()}, indent=4))
+    log.info(f"Fake services up: HTTP on {args.host}:{services.http_port}, APRS-IS on {args.host}:{services.aprs_port}. "
+             "Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(json.dumps(services.stats(), indent=2))
+        services.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
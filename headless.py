@@ -7,7 +7,7 @@ import json
 import re
 from datetime import datetime
 
-from engine import MeshEngine
+from engine import MeshEngine, PRIORITY_ALERT, PRIORITY_INTERACTIVE
 from weather import WeatherPlugin
 from sms_gateway import AprsIsGateway
 from reminders import ReminderManager
@@ -15,37 +15,56 @@ from bbs_manager import BbsManager
 from sms_contacts import SmsContactsManager
 from ai_chat import AiChatManager
 from aprs_manager import AprsManager
+from aprs_uplink import get_uplink
+from dispatcher import CommandDispatcher
 from satellite import handle_sat_command
+from logsetup import setup_logging, apply_settings as apply_log_settings
+import endpoints
+import metrics
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log = logging.getLogger("headless")
+
+# Setup logging (queued; per-subsystem levels are applied once settings are loaded)
+setup_logging()
 
 SETTINGS_FILE = "settings.json"
 
-def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, "r") as f:
+COMMAND_SECONDS = metrics.histogram("meshupgrade_command_seconds", "Command handling time by command", ("command",))
+COMMAND_TYPES = {"HELP", "APRS", "INBOX", "STATUS", "UPTIME", "RMD", "BBS", "AI", "WX", "SMS", "SAT"}
+COMMAND_ALIASES = {"REMIND": "RMD", "WEATHER": "WX", "WXA": "WX"}
+
+def command_type(msg):
+    """Metrics label for a command: its keyword (WX4 -> WX), SMS for ?number, otherwise OTHER."""
+    text = msg.lstrip("/").strip()
+    if text.startswith("?"):
+        return "SMS"
+    word = text.split(maxsplit=1)[0].upper() if text else ""
+    word = COMMAND_ALIASES.get(word, word.rstrip("0123456789"))
+    return word if word in COMMAND_TYPES else "OTHER"
+
+def load_settings(path=SETTINGS_FILE):
+    if os.path.exists(path):
+        with open(path, "r") as f:
             content = f.read()
             cleaned = re.sub(r'^\s*#.*$', '', content, flags=re.MULTILINE)
             try:
                 return json.loads(cleaned)
             except json.JSONDecodeError as e:
-                logging.error(f"Error parsing settings.json: {e}")
+                log.error(f"Error parsing settings.json: {e}")
                 return {}
     return {}
 
-def main():
-    settings = load_settings()
-    if not settings:
-        logging.error("No valid settings.json found! Please configure the app on your computer first.")
-        sys.exit(1)
-
-    engine = MeshEngine()
+def build(settings, engine=None, sms_gateway=None):
+    """Wire the managers, command handlers and callbacks around an engine without connecting
+    anything. main() runs the result against real radios, replay.py against a capture file."""
+    endpoints.configure(settings.get("endpoints"))
+    engine = engine or MeshEngine()
     
-    sms_gateway = AprsIsGateway()
+    sms_gateway = sms_gateway or AprsIsGateway()
     sms_quick_cache = {}
     sms_sessions = {}  # {phone: {'node_id': ..., 'last_active': timestamp}}
     sms_pending_confirm = {}  # {phone: {'node_id': ..., 'message': ..., 'short': ...}}
+    sms_lock = threading.Lock()  # The SMS dicts above: APRS-IS receive thread and command workers
     SMS_SESSION_TTL = 1800  # 30 minutes
 
     MESH_MENU = (
@@ -54,11 +73,7 @@ def main():
     
     def _get_node_shortname(node_id):
         """Look up a human-readable shortname for a node ID."""
-        if engine.interface and hasattr(engine.interface, 'nodes'):
-            node = engine.interface.nodes.get(node_id)
-            if node:
-                return node.get('user', {}).get('shortName', node_id)
-        return node_id
+        return engine.node_directory.shortname(node_id) or node_id
 
     def on_offline_message_acked(dest_id, message_text):
         if message_text.startswith("SMS from "):
@@ -67,50 +82,27 @@ def main():
                 short = _get_node_shortname(dest_id) or dest_id
                 sms_gateway.send_sms(phone, f"Prior message finally delivered to {short}!", "SYSTEM", update_route=False)
             except Exception as e:
-                logging.error(f"Error in offline ACK parsing: {e}")
+                log.error(f"Error in offline ACK parsing: {e}")
 
     engine.global_ack_callback = on_offline_message_acked
 
     def _find_node_by_shortname(name):
         """Find a node ID by shortname. Returns (node_id, actual_shortname, exact_match)."""
-        exact = None
-        fuzzy = None
-        fuzzy_short = None
-        # Check live nodes first
-        if engine.interface and hasattr(engine.interface, 'nodes'):
-            for node_id, node_info in engine.interface.nodes.items():
-                sn = node_info.get('user', {}).get('shortName', '')
-                if sn == name:
-                    return node_id, sn, True
-                if sn.lower() == name.lower() and not fuzzy:
-                    fuzzy = node_id
-                    fuzzy_short = sn
-        # Fallback to cached nodes
-        if not exact and not fuzzy:
-            for node_id, info in engine.node_cache.items():
-                sn = info.get('shortName', '')
-                if sn == name:
-                    return node_id, sn, True
-                if sn.lower() == name.lower() and not fuzzy:
-                    fuzzy = node_id
-                    fuzzy_short = sn
-        if fuzzy:
-            return fuzzy, fuzzy_short, False
-        return None, None, False
+        return engine.node_directory.find_shortname(name)
 
     def _send_to_node(phone, node_id, message):
         """Send a message to a mesh node on behalf of an SMS user, with delivery/fail notifications."""
         def on_ack(dest):
-            logging.info(f"ACK CALLBACK FIRED for {phone} to node {node_id}")
+            log.info(f"ACK CALLBACK FIRED for {phone} to node {node_id}")
             short = _get_node_shortname(node_id) or node_id
             sms_gateway.send_sms(phone, f"Delivered to {short}!", "SYSTEM", update_route=False)
 
         def on_fail(dest):
-            logging.info(f"FAIL CALLBACK FIRED for {phone} to node {node_id}")
+            log.info(f"FAIL CALLBACK FIRED for {phone} to node {node_id}")
             short = _get_node_shortname(node_id) or node_id
             sms_gateway.send_sms(phone, f"Not delivered yet. We'll text you 'Delivered to {short}!' once they receive it.", "SYSTEM", update_route=False)
 
-        logging.info(f"Sending SMS via mesh to {node_id}: {message}")
+        log.info(f"Sending SMS via mesh to {node_id}: {message}")
         engine.send_dm(node_id, f"SMS from {phone}:\n{message}", ack_callback=on_ack, fail_callback=on_fail)
 
     def handle_sms_reply(phone, txt, target):
@@ -119,14 +111,15 @@ def main():
         txt_cmd = txt_stripped.upper()
 
         # ── Check for pending yes/no confirmation ──
-        if phone in sms_pending_confirm:
-            pending = sms_pending_confirm.pop(phone)
+        with sms_lock:
+            pending = sms_pending_confirm.pop(phone, None)
+        if pending is not None:
             if txt_cmd in ("YES", "Y"):
                 node_id = pending['node_id']
-                sms_gateway.routing_table[phone] = node_id
-                sms_gateway.save_routes()
-                sms_quick_cache[node_id] = {'phone': phone, 'time': now}
-                sms_sessions[phone] = {'node_id': node_id, 'last_active': now}
+                sms_gateway.set_route(phone, node_id)
+                with sms_lock:
+                    sms_quick_cache[node_id] = {'phone': phone, 'time': now}
+                    sms_sessions[phone] = {'node_id': node_id, 'last_active': now}
                 
                 if pending.get('connect_only'):
                     sms_gateway.send_sms(phone, f"Connected to {pending['short']}! Just type your message and it will be sent to them. Reply END when done.", "SYSTEM", update_route=False)
@@ -140,9 +133,9 @@ def main():
 
         # ── Processing commands & Active route ──
         if txt_cmd == "ENDCONVO":
-            sms_gateway.routing_table.pop(phone, None)
-            sms_gateway.save_routes()
-            sms_sessions.pop(phone, None)
+            sms_gateway.set_route(phone, None)
+            with sms_lock:
+                sms_sessions.pop(phone, None)
             sms_gateway.send_sms(phone, "Chat ended. Text a radio name anytime to start a new one.", "SYSTEM", update_route=False)
             return
             
@@ -152,8 +145,9 @@ def main():
 
         if target:
             # Active route exists, forward the message
-            sms_quick_cache[target] = {'phone': phone, 'time': now}
-            sms_sessions[phone] = {'node_id': target, 'last_active': now}
+            with sms_lock:
+                sms_quick_cache[target] = {'phone': phone, 'time': now}
+                sms_sessions[phone] = {'node_id': target, 'last_active': now}
             _send_to_node(phone, target, txt_stripped)
             return
 
@@ -161,20 +155,21 @@ def main():
         if len(txt_stripped) <= 4 and txt_stripped.isalnum():
             found_id, actual_short, exact = _find_node_by_shortname(txt_stripped)
             if found_id and exact:
-                sms_gateway.routing_table[phone] = found_id
-                sms_gateway.save_routes()
-                sms_quick_cache[found_id] = {'phone': phone, 'time': now}
-                sms_sessions[phone] = {'node_id': found_id, 'last_active': now}
+                sms_gateway.set_route(phone, found_id)
+                with sms_lock:
+                    sms_quick_cache[found_id] = {'phone': phone, 'time': now}
+                    sms_sessions[phone] = {'node_id': found_id, 'last_active': now}
                 sms_gateway.send_sms(phone, f"Connected to {actual_short}! Just type your message and it will be sent to them. Reply ENDCONVO when done.", "SYSTEM", update_route=False)
                 return
             elif found_id and not exact:
                 # Fuzzy match — ask for confirmation
-                sms_pending_confirm[phone] = {
-                    'node_id': found_id,
-                    'message': None,  # connect only
-                    'short': actual_short,
-                    'connect_only': True
-                }
+                with sms_lock:
+                    sms_pending_confirm[phone] = {
+                        'node_id': found_id,
+                        'message': None,  # connect only
+                        'short': actual_short,
+                        'connect_only': True
+                    }
                 sms_gateway.send_sms(phone, f"Did you mean {actual_short}? Reply YES or NO.", "SYSTEM", update_route=False)
                 return
             else:
@@ -182,17 +177,18 @@ def main():
                 return
 
         # ── Smart guess: Returning user ──
-        if phone in sms_sessions:
-            last_node = sms_sessions[phone].get('node_id')
-            if last_node:
-                short = _get_node_shortname(last_node)
+        with sms_lock:
+            last_node = sms_sessions.get(phone, {}).get('node_id')
+        if last_node:
+            short = _get_node_shortname(last_node)
+            with sms_lock:
                 sms_pending_confirm[phone] = {
                     'node_id': last_node,
                     'message': txt_stripped,
                     'short': short
                 }
-                sms_gateway.send_sms(phone, f"Would you like to send that to {short}? Reply YES or NO.", "SYSTEM", update_route=False)
-                return
+            sms_gateway.send_sms(phone, f"Would you like to send that to {short}? Reply YES or NO.", "SYSTEM", update_route=False)
+            return
 
         # ── Truly new user ──
         sms_gateway.send_sms(phone, MESH_MENU, "SYSTEM", update_route=False)
@@ -211,24 +207,29 @@ def main():
             if node and 'position' in node:
                 pos = node['position']
                 if 'latitude' in pos and 'longitude' in pos:
-                    logging.info(f"Using GPS from node {sender_id}: {pos['latitude']}, {pos['longitude']}")
+                    log.info(f"Using GPS from node {sender_id}: {pos['latitude']}, {pos['longitude']}")
                     return pos['latitude'], pos['longitude']
-        logging.info(f"Using backup location: {lat_backup}, {lon_backup}")
+        log.info(f"Using backup location: {lat_backup}, {lon_backup}")
         return float(lat_backup), float(lon_backup)
 
-    def send_reply(sender, text, channel_index=None):
+    def send_reply(sender, text, channel_index=None, priority=PRIORITY_INTERACTIVE):
         if channel_index is not None:
-            engine.send_broadcast(text, channel_index=channel_index)
+            engine.send_broadcast(text, channel_index=channel_index, priority=priority)
         else:
-            engine.send_dm(sender, text)
+            engine.send_dm(sender, text, priority=priority)
 
     reminder_mgr = ReminderManager(send_reply)
     bbs_mgr = BbsManager(engine, send_reply, settings)
     sms_contacts_mgr = SmsContactsManager()
     ai_mgr = AiChatManager(settings)
     aprs_mgr = AprsManager(engine, send_reply)
-    # Disabled generic APRS RX loop to prevent duplicate-login conflicts with SMS Gateway priority
-    # aprs_mgr.start_rx_daemon(settings.get("callsign", "NOCALL"), settings.get("passcode", "-1"))
+    # APRS messages for bridged users arrive on the SMS gateway's APRS-IS login (one session, merged filter)
+    aprs_mgr.start_rx(sms_gateway.session)
+    # Commands run off the meshtastic reader thread; per-sender order is preserved
+    dispatcher = CommandDispatcher(
+        workers=int(settings.get("dispatch_workers", 4)),
+        max_queue=int(settings.get("dispatch_queue_depth", 100)),
+    )
 
     START_TIME = time.time()
     
@@ -246,14 +247,12 @@ def main():
             return
 
         if msg == "INBOX":
-            pending = engine.check_inbox(sender)
-            if not pending:
+            # Spooled messages are private: always delivered by DM, packed into as few packets as possible
+            count = engine.flush_inbox(sender)
+            if not count:
                 send_reply(sender, "Inbox empty.", channel_index)
             else:
-                send_reply(sender, f"Flushing {len(pending)} messages from Offline Inbox...", channel_index)
-                for i, txt in enumerate(pending):
-                    time.sleep(1) # small delay if multiple
-                    send_reply(sender, txt, channel_index)
+                send_reply(sender, f"Flushing {count} messages from Offline Inbox...", channel_index)
             return
 
         if msg == "STATUS":
@@ -302,13 +301,8 @@ def main():
                 send_reply(sender, "AI chat history cleared!", channel_index)
                 return
             response = ai_mgr.chat(sender, ai_body)
-            # Send up to 2 chunks of 190 chars each (190 not 200 for safety margin)
-            chunk1 = response[:190]
-            send_reply(sender, chunk1, channel_index)
-            if len(response) > 190:
-                time.sleep(4)
-                chunk2 = response[190:380]
-                send_reply(sender, chunk2, channel_index)
+            # The engine splits long replies into numbered packets; the scheduler paces them
+            send_reply(sender, response, channel_index)
             return
 
         # Weather handling
@@ -343,7 +337,7 @@ def main():
                 if response:
                     send_reply(sender, response, channel_index)
             except Exception as e:
-                logging.error(f"Error processing WX command: {e}")
+                log.error(f"Error processing WX command: {e}")
                 send_reply(sender, "Error processing weather request.", channel_index)
             return
 
@@ -402,7 +396,8 @@ def main():
                 clean_phone = ""
                 
                 if phone_raw.upper() == "L":
-                    cached = sms_quick_cache.get(sender)
+                    with sms_lock:
+                        cached = sms_quick_cache.get(sender)
                     if cached and (time.time() - cached['time']) < 1800:
                         clean_phone = cached['phone']
                     else:
@@ -416,7 +411,8 @@ def main():
                         clean_phone = re.sub(r'[^\d]', '', phone_raw)
                 
                 if len(clean_phone) >= 7:
-                    sms_quick_cache[sender] = {'phone': clean_phone, 'time': time.time()}
+                    with sms_lock:
+                        sms_quick_cache[sender] = {'phone': clean_phone, 'time': time.time()}
                     if sms_gateway.connected:
                         send_reply(sender, f"Relaying SMS to {clean_phone} via APRS...", channel_index)
                         if not sms_gateway.send_sms(clean_phone, body, sender):
@@ -437,6 +433,10 @@ def main():
         else:
             send_reply(sender, "Unknown command. DM 'help' for options.", channel_index)
 
+    def run_command(msg, sender, packet, channel_index=None):
+        with COMMAND_SECONDS.time(command=command_type(msg)):
+            process_command(msg, sender, packet, channel_index)
+
     def on_message_received(packet):
         if 'decoded' in packet:
             portnum = packet['decoded'].get('portnum')
@@ -449,19 +449,19 @@ def main():
                 try:
                     msg = packet['decoded']['payload'].decode('utf-8').strip()
                 except (UnicodeDecodeError, AttributeError) as e:
-                    logging.warning(f"Could not decode message payload from {sender}: {e}")
+                    log.warning(f"Could not decode message payload from {sender}: {e}")
                     return
                 if packet.get('toId') != '^all':
-                    logging.info(f"DM from {sender}: {msg}")
-                    process_command(msg, sender, packet)
+                    log.info("DM from %s: %s", sender, msg)
+                    dispatcher.submit(sender, run_command, msg, sender, packet)
                 else:
                     # Handle Broadcasts on the Command Channel
                     cmd_chan_idx = int(settings.get("cmd_channel", -1))
                     if packet.get('channel') == cmd_chan_idx and cmd_chan_idx != -1:
-                        logging.info(f"Command Channel broadcast from {sender}: {msg}")
-                        process_command(msg, sender, packet, channel_index=cmd_chan_idx)
+                        log.info("Command Channel broadcast from %s: %s", sender, msg)
+                        dispatcher.submit(sender, run_command, msg, sender, packet, channel_index=cmd_chan_idx)
                     else:
-                        logging.info(f"Ignored broadcast from {sender}")
+                        log.debug("Ignored broadcast from %s", sender)
 
     engine.callback_on_message = on_message_received
 
@@ -475,7 +475,7 @@ def main():
             threading.Timer(600, check_alerts).start()
             return
             
-        logging.info("Checking for weather alerts...")
+        log.info("Checking for weather alerts...")
         wx = WeatherPlugin(float(lat_backup), float(lon_backup), unit=unit)
         alerts = wx.get_alerts()
         
@@ -485,18 +485,14 @@ def main():
                 last_alert_ids.add(aid)
                 event   = (alert['event'] or 'Alert')[:35]
                 sev     = (alert['severity'] or '')[:12]
-                headline = (alert['headline'] or '')[:80]
+                headline = alert['headline'] or ''
                 # \a = Meshtastic alert bell
                 msg = f"\a WX ALERT: {event} ({sev})\n{headline}"
-                if len(msg) > 190:
-                    msg = msg[:187] + "..."
-                logging.info(f"Broadcasting Alert: {alert['event']}")
-                engine.send_broadcast(msg, channel_index=alert_channel)
-                time.sleep(7)
+                log.info(f"Broadcasting Alert: {alert['event']}")
+                engine.send_broadcast(msg, channel_index=alert_channel, priority=PRIORITY_ALERT)
         
         threading.Timer(600, check_alerts).start()
 
-    threading.Timer(10, check_alerts).start()
 
     def reboot_recovery_task(short_name, was_planned=True):
         engine.last_short_name = short_name
@@ -505,41 +501,27 @@ def main():
             try:
                 current_name = engine.interface.getShortName()
                 if current_name == short_name:
-                    logging.info(f"Node already named {short_name}. Skipping reboot.")
+                    log.info(f"Node already named {short_name}. Skipping reboot.")
                     return
             except:
                 pass
 
-            logging.info(f"Interface settle window (1s) before {short_name} command...")
+            log.info(f"Interface settle window (1s) before {short_name} command...")
             time.sleep(1)
             
             if not engine.set_short_name(short_name):
-                logging.error(f"Failed to set short name to {short_name}")
+                log.error(f"Failed to set short name to {short_name}")
                 return
 
-            logging.info(f"Node rebooting for name change to {short_name}. Waiting 40s...")
-            time.sleep(40)
+            log.info(f"Node rebooting for name change to {short_name}. Waiting for it to come back...")
+            engine.wait_for_reboot()
         
-        logging.info("Attempting to reconnect...")
-        
-        reconnected = False
-        for attempt in range(5):
-            if engine.reconnect():
-                logging.info(f"Reconnected successfully on attempt {attempt + 1}. Sending node info broadcast.")
-                engine.send_node_info(short_name=short_name)
-                reconnected = True
-                break
-            
-            logging.info(f"Reconnect attempt {attempt + 1}/5 failed. Waiting 30s...")
-            time.sleep(30)
-            
-        if not reconnected:
-            logging.warning(f"All 5 reconnect attempts failed. Searching network for '{short_name}'...")
-            if engine.discover_node(short_name):
-                logging.info(f"Node found and reconnected via Discovery! Sending info broadcast.")
-                engine.send_node_info(short_name=short_name)
-            else:
-                logging.error("Discovery failed. Node not found on subnet.")
+        log.info("Attempting to reconnect...")
+        if engine.recover_connection(short_name):
+            log.info("Reconnected. Sending node info broadcast.")
+            engine.send_node_info(short_name=short_name)
+        elif not engine.recovering:
+            log.error("Reconnect failed. Node not found on subnet.")
 
     def connection_watchdog():
         """Monitors connection and auto-reconnects if peer resets."""
@@ -551,44 +533,96 @@ def main():
                 try:
                     engine.interface.sendHeartbeat()
                 except BaseException as e:
-                    logging.debug(f"Watchdog keepalive failed (expected if node offline): {e}")
+                    log.debug(f"Watchdog keepalive failed (expected if node offline): {e}")
                     
             # SMS Gateway Auto-Reconnect
             if getattr(sms_gateway, 'callsign', None) and getattr(sms_gateway, 'passcode', None):
                 if not sms_gateway.connected:
-                    logging.warning("APRS-IS Connection dropped. Auto-reconnecting in background...")
+                    log.warning("APRS-IS Connection dropped. Auto-reconnecting in background...")
                     sms_gateway.connect()
                     
             # Only trigger if we WERE connected before (params exist) but aren't now
-            if engine.last_conn_params and not engine.is_connected:
-                logging.warning("Connection watchdog detected unexpected drop. Triggering recovery...")
+            if engine.last_conn_params and not engine.is_connected and not engine.recovering:
+                log.warning("Connection watchdog detected unexpected drop. Triggering recovery...")
                 target_name = engine.last_short_name if engine.last_short_name else "ON"
                 threading.Thread(target=reboot_recovery_task, args=(target_name, False), daemon=True).start()
 
     engine.max_retries = int(settings.get("sms_retries", 3))
     engine.retry_cooldown = int(settings.get("sms_cooldown", 15))
+    engine.max_cached_nodes = int(settings.get("node_cache_max", 5000))
+    engine.reconnect_timeout = int(settings.get("reconnect_timeout", 150))
+    engine.reboot_ready_timeout = int(settings.get("reboot_ready_timeout", 60))
+    engine.packet_dedup.ttl = int(settings.get("dedup_window", 600))
+    engine.sweep_networks = settings.get("sweep_networks", [])
+    engine.sweep_concurrency = int(settings.get("sweep_concurrency", 256))
+    engine.sweep_rate = int(settings.get("sweep_rate", 2000))
+
+    return {
+        'engine': engine,
+        'sms_gateway': sms_gateway,
+        'aprs_mgr': aprs_mgr,
+        'dispatcher': dispatcher,
+        'process_command': process_command,
+        'check_alerts': check_alerts,
+        'connection_watchdog': connection_watchdog,
+    }
+
+def main():
+    settings = load_settings()
+    apply_log_settings(settings)
+    if not settings:
+        log.error("No valid settings.json found! Please configure the app on your computer first.")
+        sys.exit(1)
+
+    app = build(settings)
+    engine, sms_gateway, dispatcher = app['engine'], app['sms_gateway'], app['dispatcher']
+
+    # Record everything received (mesh packets and APRS-IS lines) for replay.py
+    if settings.get("capture_file"):
+        engine.start_capture(settings["capture_file"])
+        sms_gateway.session.capture = engine.capture
+
+    threading.Timer(10, app['check_alerts']).start()
+
+    metrics_port = settings.get("metrics_port")
+    if metrics_port:
+        engine.export_metrics()
+        metrics.gauge("meshupgrade_dispatch_queue_depth", "Commands waiting for a worker",
+                      fn=lambda: dispatcher.stats()['queue_depth'])
+        metrics.gauge("meshupgrade_aprs_is_connected", "1 while the SMS gateway is logged in to APRS-IS",
+                      fn=lambda: sms_gateway.connected)
+        metrics.gauge("meshupgrade_aprs_uplink_queue_depth", "APRS packets waiting for the HTTP uplink",
+                      fn=lambda: get_uplink().stats()['queue_depth'])
+        metrics.gauge("meshupgrade_aprs_messages_in_flight", "APRS messages waiting for an ack",
+                      fn=lambda: len(app['aprs_mgr'].tracker))
+        try:
+            metrics.start_server(int(metrics_port), settings.get("metrics_host", "127.0.0.1"))
+        except (OSError, ValueError) as e:
+            log.error(f"Could not start metrics endpoint on port {metrics_port}: {e}")
+
     if settings.get("callsign") and settings.get("passcode"):
         sms_gateway.configure(settings["callsign"], settings["passcode"])
         sms_gateway.connect()
 
     ip_address = settings.get("ip")
     if ip_address:
-        logging.info(f"Attempting TCP Connection to {ip_address}...")
+        log.info(f"Attempting TCP Connection to {ip_address}...")
         engine.connect_tcp(ip_address)
     elif settings.get("serial_port"):
-        logging.info(f"Attempting Serial Connection to {settings.get('serial_port')}...")
+        log.info(f"Attempting Serial Connection to {settings.get('serial_port')}...")
         engine.connect_serial(settings.get("serial_port"))
     else:
-        logging.warning("No connection targets configured! Please set ip or serial_port in settings.json.")
+        log.warning("No connection targets configured! Please set ip or serial_port in settings.json.")
+    engine.add_radios(settings.get("extra_radios", []))
 
-    threading.Thread(target=connection_watchdog, daemon=True).start()
+    threading.Thread(target=app['connection_watchdog'], daemon=True).start()
 
-    logging.info("MeshUpGrade Headless Server is running. Press Ctrl+C to stop.")
+    log.info("MeshUpGrade Headless Server is running. Press Ctrl+C to stop.")
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        logging.info("Shutting down headless server...")
+        log.info("Shutting down headless server...")
         engine.close()
         sys.exit(0)
 
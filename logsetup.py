@@ -0,0 +1,87 @@
+"""
+logsetup.py — MeshUpGrade Logging
+Every module logs to its own named logger (engine, sms_gateway, aprs_manager,
+headless, gui, ...). The root logger has a single QueueHandler, and one
+QueueListener thread does the formatting and writing to the console, an
+optional log file and the GUI terminal. A slow handler therefore never stalls
+the meshtastic reader thread or a command worker.
+
+settings.json can tune verbosity:
+    "log_level": "INFO",                                    (everything else)
+    "log_levels": {"engine": "DEBUG", "sms_gateway": "WARNING"},
+    "log_file": "meshupgrade.log"                           (optional, rotated)
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+
+FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+_listener = None
+_handlers = []
+_file_handler = None
+
+
+def setup_logging(level=logging.INFO):
+    """Route all logging through the queue. Safe to call more than once."""
+    global _listener
+    if _listener:
+        return
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(FORMAT))
+    _handlers.append(console)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *_handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def add_handler(handler):
+    """Attach another output (e.g. the GUI terminal); it runs on the listener thread."""
+    _handlers.append(handler)
+    if _listener:
+        _listener.handlers = tuple(_handlers)
+
+
+def apply_settings(settings):
+    """Apply log_level, log_levels and log_file from settings.json."""
+    global _file_handler
+    level = _level(settings.get("log_level"))
+    if level is not None:
+        logging.getLogger().setLevel(level)
+    for name, value in (settings.get("log_levels") or {}).items():
+        level = _level(value)
+        if level is None:
+            logging.getLogger(__name__).warning(f"Ignoring unknown log level {value!r} for {name}.")
+            continue
+        logging.getLogger(name).setLevel(level)
+    log_file = settings.get("log_file")
+    if log_file and not _file_handler:
+        _file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=1_000_000, backupCount=3)
+        _file_handler.setFormatter(logging.Formatter(FORMAT))
+        add_handler(_file_handler)
+
+
+def stop_logging():
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+def _level(value):
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).upper())
+    return level if isinstance(level, int) else None
@@ -5,18 +5,28 @@ import sys
 import threading
 import time
 from datetime import datetime
-from engine import MeshEngine
+from engine import MeshEngine, PRIORITY_ALERT, PRIORITY_INTERACTIVE
+from logsetup import setup_logging, add_handler as add_log_handler, apply_settings as apply_log_settings
+import endpoints
+
+log = logging.getLogger("gui")
 
 START_TIME = time.time()
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Setup logging (queued; per-subsystem levels are applied once settings are loaded)
+setup_logging()
 
 class GuiLogHandler(logging.Handler):
+    """Appends records to the log terminal. Runs on the logging listener thread and
+    redraws the page at most every UPDATE_INTERVAL seconds instead of once per record."""
+    UPDATE_INTERVAL = 0.25
+
     def __init__(self, log_list, page):
         super().__init__()
         self.log_list = log_list
         self.page = page
+        self._last_update = 0
+        self._pending = None
 
     def emit(self, record):
         try:
@@ -24,11 +34,26 @@ class GuiLogHandler(logging.Handler):
             self.log_list.controls.append(ft.Text(msg, font_family="monospace", size=12))
             if len(self.log_list.controls) > 100:
                 self.log_list.controls.pop(0)
-            self.page.update()
+            wait = self._last_update + self.UPDATE_INTERVAL - time.monotonic()
+            if wait <= 0:
+                self._refresh()
+            elif not self._pending:
+                # Trailing redraw so the last lines of a burst still show up
+                self._pending = threading.Timer(wait, self._refresh)
+                self._pending.daemon = True
+                self._pending.start()
         except Exception:
             # Page likely closed/destroyed
             pass
 
+    def _refresh(self):
+        self._pending = None
+        self._last_update = time.monotonic()
+        try:
+            self.page.update()
+        except Exception:
+            pass
+
 import json
 import re
 
@@ -60,7 +85,7 @@ def load_settings():
             try:
                 return json.loads(cleaned)
             except json.JSONDecodeError as e:
-                logging.error(f"Error parsing settings.json: {e}")
+                log.error(f"Error parsing settings.json: {e}")
                 return {}
     return {}
 
@@ -71,18 +96,22 @@ from bbs_manager import BbsManager
 from sms_contacts import SmsContactsManager
 from ai_chat import AiChatManager
 from aprs_manager import AprsManager
+from dispatcher import CommandDispatcher
 
 def main(page: ft.Page):
     page.title = "MeshUpGrade"
     page.padding = 20
     
     settings = load_settings()
+    apply_log_settings(settings)
+    endpoints.configure(settings.get("endpoints"))
     engine = MeshEngine()
     
     sms_gateway = AprsIsGateway()
     sms_quick_cache = {}
     sms_sessions = {}
     sms_pending_confirm = {}
+    sms_lock = threading.Lock()  # The SMS dicts above: APRS-IS receive thread and command workers
     SMS_SESSION_TTL = 1800
 
     MESH_MENU = (
@@ -90,11 +119,7 @@ def main(page: ft.Page):
     )
 
     def _get_node_shortname(node_id):
-        if engine.interface and hasattr(engine.interface, 'nodes'):
-            node = engine.interface.nodes.get(node_id)
-            if node:
-                return node.get('user', {}).get('shortName', node_id)
-        return node_id
+        return engine.node_directory.shortname(node_id) or node_id
 
     def on_offline_message_acked(dest_id, message_text):
         if message_text.startswith("SMS from "):
@@ -103,46 +128,25 @@ def main(page: ft.Page):
                 short = _get_node_shortname(dest_id) or dest_id
                 sms_gateway.send_sms(phone, f"Prior message finally delivered to {short}!", "SYSTEM", update_route=False)
             except Exception as e:
-                logging.error(f"Error in offline ACK parsing: {e}")
+                log.error(f"Error in offline ACK parsing: {e}")
 
     engine.global_ack_callback = on_offline_message_acked
 
     def _find_node_by_shortname(name):
-        exact = None
-        fuzzy = None
-        fuzzy_short = None
-        if engine.interface and hasattr(engine.interface, 'nodes'):
-            for node_id, node_info in engine.interface.nodes.items():
-                sn = node_info.get('user', {}).get('shortName', '')
-                if sn == name:
-                    return node_id, sn, True
-                if sn.lower() == name.lower() and not fuzzy:
-                    fuzzy = node_id
-                    fuzzy_short = sn
-        if not exact and not fuzzy:
-            for node_id, info in engine.node_cache.items():
-                sn = info.get('shortName', '')
-                if sn == name:
-                    return node_id, sn, True
-                if sn.lower() == name.lower() and not fuzzy:
-                    fuzzy = node_id
-                    fuzzy_short = sn
-        if fuzzy:
-            return fuzzy, fuzzy_short, False
-        return None, None, False
+        return engine.node_directory.find_shortname(name)
 
     def _send_to_node(phone, node_id, message):
         def on_ack(dest):
-            logging.info(f"ACK CALLBACK FIRED for {phone} to node {node_id}")
+            log.info(f"ACK CALLBACK FIRED for {phone} to node {node_id}")
             short = _get_node_shortname(node_id) or node_id
             sms_gateway.send_sms(phone, f"Delivered to {short}!", "SYSTEM", update_route=False)
 
         def on_fail(dest):
-            logging.info(f"FAIL CALLBACK FIRED for {phone} to node {node_id}")
+            log.info(f"FAIL CALLBACK FIRED for {phone} to node {node_id}")
             short = _get_node_shortname(node_id) or node_id
             sms_gateway.send_sms(phone, f"Not delivered yet. We'll text you 'Delivered to {short}!' once they receive it.", "SYSTEM", update_route=False)
 
-        logging.info(f"Sending SMS via mesh to {node_id}: {message}")
+        log.info(f"Sending SMS via mesh to {node_id}: {message}")
         engine.send_dm(node_id, f"SMS from {phone}:\n{message}", ack_callback=on_ack, fail_callback=on_fail)
 
     def handle_sms_reply(phone, txt, target):
@@ -151,14 +155,15 @@ def main(page: ft.Page):
         txt_cmd = txt_stripped.upper()
 
         # ── Check for pending yes/no confirmation ──
-        if phone in sms_pending_confirm:
-            pending = sms_pending_confirm.pop(phone)
+        with sms_lock:
+            pending = sms_pending_confirm.pop(phone, None)
+        if pending is not None:
             if txt_cmd in ("YES", "Y"):
                 node_id = pending['node_id']
-                sms_gateway.routing_table[phone] = node_id
-                sms_gateway.save_routes()
-                sms_quick_cache[node_id] = {'phone': phone, 'time': now}
-                sms_sessions[phone] = {'node_id': node_id, 'last_active': now}
+                sms_gateway.set_route(phone, node_id)
+                with sms_lock:
+                    sms_quick_cache[node_id] = {'phone': phone, 'time': now}
+                    sms_sessions[phone] = {'node_id': node_id, 'last_active': now}
                 
                 if pending.get('connect_only'):
                     sms_gateway.send_sms(phone, f"Connected to {pending['short']}! Just type your message and it will be sent to them. Reply END when done.", "SYSTEM", update_route=False)
@@ -172,9 +177,9 @@ def main(page: ft.Page):
 
         # ── Processing commands & Active route ──
         if txt_cmd == "ENDCONVO":
-            sms_gateway.routing_table.pop(phone, None)
-            sms_gateway.save_routes()
-            sms_sessions.pop(phone, None)
+            sms_gateway.set_route(phone, None)
+            with sms_lock:
+                sms_sessions.pop(phone, None)
             sms_gateway.send_sms(phone, "Chat ended. Text a radio name anytime to start a new one.", "SYSTEM", update_route=False)
             return
             
@@ -184,8 +189,9 @@ def main(page: ft.Page):
 
         if target:
             # Active route exists, forward the message
-            sms_quick_cache[target] = {'phone': phone, 'time': now}
-            sms_sessions[phone] = {'node_id': target, 'last_active': now}
+            with sms_lock:
+                sms_quick_cache[target] = {'phone': phone, 'time': now}
+                sms_sessions[phone] = {'node_id': target, 'last_active': now}
             _send_to_node(phone, target, txt_stripped)
             return
 
@@ -193,20 +199,21 @@ def main(page: ft.Page):
         if len(txt_stripped) <= 4 and txt_stripped.isalnum():
             found_id, actual_short, exact = _find_node_by_shortname(txt_stripped)
             if found_id and exact:
-                sms_gateway.routing_table[phone] = found_id
-                sms_gateway.save_routes()
-                sms_quick_cache[found_id] = {'phone': phone, 'time': now}
-                sms_sessions[phone] = {'node_id': found_id, 'last_active': now}
+                sms_gateway.set_route(phone, found_id)
+                with sms_lock:
+                    sms_quick_cache[found_id] = {'phone': phone, 'time': now}
+                    sms_sessions[phone] = {'node_id': found_id, 'last_active': now}
                 sms_gateway.send_sms(phone, f"Connected to {actual_short}! Just type your message and it will be sent to them. Reply ENDCONVO when done.", "SYSTEM", update_route=False)
                 return
             elif found_id and not exact:
                 # Fuzzy match — ask for confirmation
-                sms_pending_confirm[phone] = {
-                    'node_id': found_id,
-                    'message': None,  # connect only
-                    'short': actual_short,
-                    'connect_only': True
-                }
+                with sms_lock:
+                    sms_pending_confirm[phone] = {
+                        'node_id': found_id,
+                        'message': None,  # connect only
+                        'short': actual_short,
+                        'connect_only': True
+                    }
                 sms_gateway.send_sms(phone, f"Did you mean {actual_short}? Reply YES or NO.", "SYSTEM", update_route=False)
                 return
             else:
@@ -214,17 +221,18 @@ def main(page: ft.Page):
                 return
 
         # ── Smart guess: Returning user ──
-        if phone in sms_sessions:
-            last_node = sms_sessions[phone].get('node_id')
-            if last_node:
-                short = _get_node_shortname(last_node)
+        with sms_lock:
+            last_node = sms_sessions.get(phone, {}).get('node_id')
+        if last_node:
+            short = _get_node_shortname(last_node)
+            with sms_lock:
                 sms_pending_confirm[phone] = {
                     'node_id': last_node,
                     'message': txt_stripped,
                     'short': short
                 }
-                sms_gateway.send_sms(phone, f"Would you like to send that to {short}? Reply YES or NO.", "SYSTEM", update_route=False)
-                return
+            sms_gateway.send_sms(phone, f"Would you like to send that to {short}? Reply YES or NO.", "SYSTEM", update_route=False)
+            return
 
         # ── Truly new user ──
         sms_gateway.send_sms(phone, MESH_MENU, "SYSTEM", update_route=False)
@@ -249,28 +257,34 @@ def main(page: ft.Page):
             if node and 'position' in node:
                 pos = node['position']
                 if 'latitude' in pos and 'longitude' in pos:
-                    logging.info(f"Using GPS from node {sender_id}: {pos['latitude']}, {pos['longitude']}")
+                    log.info(f"Using GPS from node {sender_id}: {pos['latitude']}, {pos['longitude']}")
                     return pos['latitude'], pos['longitude']
-        logging.info(f"Using backup location: {lat_field.value}, {lon_field.value}")
+        log.info(f"Using backup location: {lat_field.value}, {lon_field.value}")
         return float(lat_field.value), float(lon_field.value)
 
     # Log Terminal Component
     log_terminal = ft.Column(scroll=ft.ScrollMode.ALWAYS, height=400, expand=True)
     gui_handler = GuiLogHandler(log_terminal, page)
     gui_handler.setFormatter(logging.Formatter('%(asctime)s: %(message)s', datefmt='%H:%M:%S'))
-    logging.getLogger().addHandler(gui_handler)
+    add_log_handler(gui_handler)
 
-    def send_reply(sender, text, channel_index=None):
+    def send_reply(sender, text, channel_index=None, priority=PRIORITY_INTERACTIVE):
         if channel_index is not None:
-            engine.send_broadcast(text, channel_index=channel_index)
+            engine.send_broadcast(text, channel_index=channel_index, priority=priority)
         else:
-            engine.send_dm(sender, text)
+            engine.send_dm(sender, text, priority=priority)
 
     reminder_mgr = ReminderManager(send_reply)
     bbs_mgr = BbsManager(engine, send_reply, settings)
     sms_contacts_mgr = SmsContactsManager()
     ai_mgr = AiChatManager(settings)
     aprs_mgr = AprsManager(engine, send_reply)
+    aprs_mgr.start_rx(sms_gateway.session)
+    # Commands run off the meshtastic reader thread; per-sender order is preserved
+    dispatcher = CommandDispatcher(
+        workers=int(settings.get("dispatch_workers", 4)),
+        max_queue=int(settings.get("dispatch_queue_depth", 100)),
+    )
 
     def process_command(msg, sender, packet, channel_index=None):
         msg_original = msg.lstrip("/")
@@ -286,14 +300,12 @@ def main(page: ft.Page):
             return
 
         if msg == "INBOX":
-            pending = engine.check_inbox(sender)
-            if not pending:
+            # Spooled messages are private: always delivered by DM, packed into as few packets as possible
+            count = engine.flush_inbox(sender)
+            if not count:
                 send_reply(sender, "Inbox empty.", channel_index)
             else:
-                send_reply(sender, f"Flushing {len(pending)} messages from Offline Inbox...", channel_index)
-                for i, txt in enumerate(pending):
-                    time.sleep(1) # small delay if multiple
-                    send_reply(sender, txt, channel_index)
+                send_reply(sender, f"Flushing {count} messages from Offline Inbox...", channel_index)
             return
 
         if msg == "STATUS":
@@ -341,12 +353,8 @@ def main(page: ft.Page):
                 send_reply(sender, "AI chat history cleared!", channel_index)
                 return
             response = ai_mgr.chat(sender, ai_body)
-            if len(response) <= 200:
-                send_reply(sender, response, channel_index)
-            else:
-                send_reply(sender, response[:200], channel_index)
-                time.sleep(5)
-                send_reply(sender, response[200:400], channel_index)
+            # The engine splits long replies into numbered packets
+            send_reply(sender, response, channel_index)
             return
 
         # Weather handling
@@ -381,7 +389,7 @@ def main(page: ft.Page):
                 if response:
                     send_reply(sender, response, channel_index)
             except Exception as e:
-                logging.error(f"Error processing WX command: {e}")
+                log.error(f"Error processing WX command: {e}")
                 send_reply(sender, "Error processing weather request.", channel_index)
             return
 
@@ -433,7 +441,8 @@ def main(page: ft.Page):
                 clean_phone = ""
                 
                 if phone_raw.upper() == "L":
-                    cached = sms_quick_cache.get(sender)
+                    with sms_lock:
+                        cached = sms_quick_cache.get(sender)
                     if cached and (time.time() - cached['time']) < 1800:
                         clean_phone = cached['phone']
                     else:
@@ -448,7 +457,8 @@ def main(page: ft.Page):
                 
                 # Verify numeric
                 if len(clean_phone) >= 7: # Basic check for valid phone number length
-                    sms_quick_cache[sender] = {'phone': clean_phone, 'time': time.time()}
+                    with sms_lock:
+                        sms_quick_cache[sender] = {'phone': clean_phone, 'time': time.time()}
                     if sms_gateway.connected:
                         send_reply(sender, f"Relaying SMS to {clean_phone} via APRS...", channel_index)
                         if not sms_gateway.send_sms(clean_phone, body, sender):
@@ -480,16 +490,16 @@ def main(page: ft.Page):
                 msg = packet['decoded']['payload'].decode('utf-8').strip()
             sender = packet['fromId']
             if packet.get('toId') != '^all':
-                logging.info(f"DM from {sender}: {msg}")
-                process_command(msg, sender, packet)
+                log.info("DM from %s: %s", sender, msg)
+                dispatcher.submit(sender, process_command, msg, sender, packet)
             else:
                 # Handle Broadcasts on the Command Channel
                 cmd_chan_idx = int(settings.get("cmd_channel", -1))
                 if packet.get('channel') == cmd_chan_idx and cmd_chan_idx != -1:
-                    logging.info(f"Command Channel broadcast from {sender}: {msg}")
-                    process_command(msg, sender, packet, channel_index=cmd_chan_idx)
+                    log.info("Command Channel broadcast from %s: %s", sender, msg)
+                    dispatcher.submit(sender, process_command, msg, sender, packet, channel_index=cmd_chan_idx)
                 else:
-                    logging.info(f"Ignored broadcast from {sender}")
+                    log.debug("Ignored broadcast from %s", sender)
 
     engine.callback_on_message = on_message_received
 
@@ -520,7 +530,7 @@ def main(page: ft.Page):
             threading.Timer(600, check_alerts).start()
             return
             
-        logging.info("Checking for weather alerts...")
+        log.info("Checking for weather alerts...")
         lat, lon = float(lat_field.value), float(lon_field.value)
         wx = WeatherPlugin(lat, lon, unit=unit_picker.value)
         alerts = wx.get_alerts()
@@ -531,10 +541,9 @@ def main(page: ft.Page):
                 last_alert_ids.add(aid)
                 # Meshtastic Alert Bell \a
                 msg = f"\a⚠️ WX ALERT: {alert['event']} - {alert['severity']}\n{alert['headline']}"
-                logging.info(f"Broadcasting Alert: {alert['event']}")
-                engine.send_broadcast(msg, channel_index=int(alert_channel.value))
-                # 7-second cooldown between multiple alerts to prevent packet loss
-                time.sleep(7)
+                log.info(f"Broadcasting Alert: {alert['event']}")
+                # Alert priority; the outbound scheduler spaces multiple alerts out
+                engine.send_broadcast(msg, channel_index=int(alert_channel.value), priority=PRIORITY_ALERT)
         
         threading.Timer(600, check_alerts).start()
 
@@ -543,8 +552,8 @@ def main(page: ft.Page):
 
     def send_test_alert_click(e):
         msg = f"\a⚠️ WX TEST: {test_alert_field.value}"
-        logging.info(f"Sending test broadcast on channel {alert_channel.value}")
-        engine.send_broadcast(msg, channel_index=int(alert_channel.value))
+        log.info(f"Sending test broadcast on channel {alert_channel.value}")
+        engine.send_broadcast(msg, channel_index=int(alert_channel.value), priority=PRIORITY_ALERT)
 
     def alert_channel_change(e):
         alert_warning.visible = (alert_channel.value == "0")
@@ -583,7 +592,7 @@ def main(page: ft.Page):
             try:
                 current_name = engine.interface.getShortName()
                 if current_name == short_name:
-                    logging.info(f"Node already named {short_name}. Skipping reboot.")
+                    log.info(f"Node already named {short_name}. Skipping reboot.")
                     status_text.value = f"Status: Connected ({engine.last_conn_type.upper()}) - Already Optimized"
                     page.update()
                     return
@@ -591,52 +600,34 @@ def main(page: ft.Page):
                 pass
 
             # 1-second settle time as requested
-            logging.info(f"Interface settle window (1s) before {short_name} command...")
+            log.info(f"Interface settle window (1s) before {short_name} command...")
             time.sleep(1)
             
             if not engine.set_short_name(short_name):
-                logging.error(f"Failed to set short name to {short_name}")
+                log.error(f"Failed to set short name to {short_name}")
                 return
 
-            logging.info(f"Node rebooting for name change to {short_name}. Waiting 40s...")
-            status_text.value = f"Status: Rebooting to {short_name} (40s)..."
+            log.info(f"Node rebooting for name change to {short_name}. Waiting for it to come back...")
+            status_text.value = f"Status: Rebooting to {short_name}..."
             page.update()
             
-            time.sleep(40)
+            engine.wait_for_reboot()
         
-        logging.info("Attempting to reconnect...")
+        log.info("Attempting to reconnect...")
         status_text.value = "Status: Reconnecting..."
         page.update()
-        
-        reconnected = False
-        for attempt in range(5):
-            status_text.value = f"Status: Reconnecting... (Attempt {attempt+1}/5)"
-            page.update()
-            
-            if engine.reconnect():
-                logging.info(f"Reconnected successfully on attempt {attempt+1}. Sending node info broadcast.")
-                engine.send_node_info(short_name=short_name)
-                status_text.value = f"Status: Connected ({engine.last_conn_type.upper()}) - Sync OK"
-                reconnected = True
-                break
-                
-            logging.info(f"Reconnect attempt {attempt+1}/5 failed. Waiting 30s...")
-            status_text.value = f"Status: Reconn Failed {attempt+1}/5. Wait 30s..."
-            page.update()
-            time.sleep(30)
-            
-        if not reconnected:
-            logging.warning(f"All 5 reconnect attempts failed. Searching network for '{short_name}'...")
-            status_text.value = f"Status: Searching network for {short_name}..."
+
+        def on_attempt(attempt, wait):
+            status_text.value = f"Status: Reconnecting... (Attempt {attempt}, next in {wait:.0f}s)"
             page.update()
-            
-            if engine.discover_node(short_name):
-                logging.info(f"Node found and reconnected via Discovery! Sending info broadcast.")
-                engine.send_node_info(short_name=short_name)
-                status_text.value = f"Status: Connected (ADAPTIVE) - Sync OK"
-            else:
-                logging.error("Discovery failed. Node not found on subnet.")
-                status_text.value = "Status: Reconnect Failed (Not Found)"
+
+        if engine.recover_connection(short_name, on_attempt=on_attempt):
+            log.info("Reconnected. Sending node info broadcast.")
+            engine.send_node_info(short_name=short_name)
+            status_text.value = f"Status: Connected ({engine.last_conn_type.upper()}) - Sync OK"
+        elif not engine.recovering:
+            log.error("Reconnect failed. Node not found on subnet.")
+            status_text.value = "Status: Reconnect Failed (Not Found)"
         page.update()
 
     def connect_tcp_click(e):
@@ -695,7 +686,7 @@ def main(page: ft.Page):
             "bbs_channel": int(bbs_channel.value)
         })
         save_settings(settings)
-        logging.info("Settings saved.")
+        log.info("Settings saved.")
         
         # Apply SMS settings
         engine.max_retries = settings["sms_retries"]
@@ -716,6 +707,14 @@ def main(page: ft.Page):
     # Apply initial SMS settings
     engine.max_retries = int(settings.get("sms_retries", 3))
     engine.retry_cooldown = int(settings.get("sms_cooldown", 15))
+    engine.max_cached_nodes = int(settings.get("node_cache_max", 5000))
+    engine.reconnect_timeout = int(settings.get("reconnect_timeout", 150))
+    engine.reboot_ready_timeout = int(settings.get("reboot_ready_timeout", 60))
+    engine.packet_dedup.ttl = int(settings.get("dedup_window", 600))
+    engine.sweep_networks = settings.get("sweep_networks", [])
+    engine.sweep_concurrency = int(settings.get("sweep_concurrency", 256))
+    engine.sweep_rate = int(settings.get("sweep_rate", 2000))
+    engine.add_radios(settings.get("extra_radios", []))
     if settings.get("callsign") and settings.get("passcode"):
         sms_gateway.configure(settings["callsign"], settings["passcode"])
         sms_gateway.connect()
@@ -883,7 +882,7 @@ def main(page: ft.Page):
         ai_mgr.vendor = settings["ai_vendor"]
         ai_mgr.model = settings["ai_model"]
         ai_mgr.api_key = settings["ai_api_key"]
-        logging.info("AI settings saved.")
+        log.info("AI settings saved.")
         page.update()
 
     def show_ai(e):
@@ -908,7 +907,7 @@ def main(page: ft.Page):
     ])
 
     def shutdown_app():
-        logging.info("Shutting down MeshUpGrade...")
+        log.info("Shutting down MeshUpGrade...")
         
         # Show a non-closable dialog to prevent further interaction
         shutdown_dialog = ft.AlertDialog(
@@ -924,7 +923,7 @@ def main(page: ft.Page):
             try:
                 engine.close()
             except Exception as e:
-                logging.debug(f"Shutdown sync error (suppressed): {e}")
+                log.debug(f"Shutdown sync error (suppressed): {e}")
             finally:
                 os._exit(0)
 
@@ -941,25 +940,25 @@ def main(page: ft.Page):
                 try:
                     engine.interface.sendHeartbeat()
                 except BaseException as e:
-                    logging.debug(f"Watchdog keepalive failed (expected if node offline): {e}")
+                    log.debug(f"Watchdog keepalive failed (expected if node offline): {e}")
                     
             # SMS Gateway Auto-Reconnect
             if getattr(sms_gateway, 'callsign', None) and getattr(sms_gateway, 'passcode', None):
                 if not sms_gateway.connected:
-                    logging.warning("APRS-IS Connection dropped. Auto-reconnecting in background...")
+                    log.warning("APRS-IS Connection dropped. Auto-reconnecting in background...")
                     sms_gateway.connect()
                     
             # Only trigger if we WERE connected before (params exist) but aren't now
             if engine.last_conn_params and not engine.is_connected:
                 # Avoid triggering if we are already in the middle of a recovery
-                if status_text.value and "Rebooting" in status_text.value:
+                if engine.recovering or (status_text.value and "Rebooting" in status_text.value):
                     continue
                     
                 # Suspend watchdog if the user is actively manually scanning for nodes
                 if getattr(page, 'dialog', None) and page.dialog.open:
                     continue
                     
-                logging.warning("Connection watchdog detected unexpected drop. Triggering recovery...")
+                log.warning("Connection watchdog detected unexpected drop. Triggering recovery...")
                 target_name = engine.last_short_name if engine.last_short_name else "ON"
                 
                 # For watchdog drops, skip the initial name-change wait (was_planned=False)
@@ -975,5 +974,5 @@ def main(page: ft.Page):
 if __name__ == "__main__":
     if not os.path.exists("assets"):
         os.makedirs("assets")
-    logging.info("Starting MeshUpGrade GUI...")
+    log.info("Starting MeshUpGrade GUI...")
     ft.app(target=main)
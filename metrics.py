@@ -0,0 +1,292 @@
+"""
+metrics.py — MeshUpGrade Metrics
+Counters, gauges and histograms for capacity planning, rendered in the
+Prometheus text format by a small stdlib HTTP server bound to localhost.
+Recording a sample is a dict update under a lock, so modules instrument their
+hot paths unconditionally; nothing is served unless headless.py is started
+with "metrics_port" in settings.json:
+
+    curl http://127.0.0.1:9464/metrics
+"""
+
+import contextlib
+import http.server
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = {}  # name -> metric, in registration order
+_registry_lock = threading.Lock()
+
+
+class DurationHistogram:
+    """Cumulative-bucket histogram of durations in seconds (same shape Prometheus uses)."""
+
+    def __init__(self, buckets=(1, 2, 5, 10, 15, 20, 30, 60, 120, 300)):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            i = 0
+            while i < len(self.buckets) and seconds > self.buckets[i]:
+                i += 1
+            self._counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        """{'buckets': [(upper_bound, cumulative_count), ...], 'sum': s, 'count': n}"""
+        with self._lock:
+            total, rows = 0, []
+            for bound, n in zip(self.buckets + (float('inf'),), self._counts):
+                total += n
+                rows.append((bound, total))
+            return {'buckets': rows, 'sum': self.sum, 'count': self.count}
+
+    def summary(self):
+        snap = self.snapshot()
+        if not snap['count']:
+            return "no samples"
+        parts = [f"n={snap['count']}", f"avg={snap['sum'] / snap['count']:.1f}s"]
+        previous = 0
+        for bound, cumulative in snap['buckets']:
+            if cumulative > previous:
+                label = "+Inf" if bound == float('inf') else f"{bound:g}s"
+                parts.append(f"<={label}:{cumulative - previous}")
+            previous = cumulative
+        return " ".join(parts)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self.fn = fn  # Optional scrape-time source: number, or [(labels_dict, value), ...]
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _rows(self):
+        """[(labels_dict, value), ...] for rendering."""
+        if self.fn:
+            result = self.fn()
+            return list(result) if isinstance(result, (list, tuple)) else [({}, result)]
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), v) for key, v in self._values.items()]
+
+    def render(self):
+        return [f"{self.name}{_labels(labels)} {_number(v)}" for labels, v in self._rows() if v is not None]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def _hist(self, labels):
+        key = self._key(labels)
+        with self._lock:
+            hist = self._values.get(key)
+            if hist is None:
+                hist = self._values[key] = DurationHistogram(self.buckets)
+            return hist
+
+    def observe(self, seconds, **labels):
+        self._hist(labels).observe(seconds)
+
+    def attach(self, hist, **labels):
+        """Export an existing DurationHistogram (e.g. engine.reconnect_stats) under these labels."""
+        with self._lock:
+            self._values[self._key(labels)] = hist
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        lines = []
+        for key, hist in items:
+            labels = dict(zip(self.labelnames, key))
+            snap = hist.snapshot()
+            for bound, cumulative in snap['buckets']:
+                le = "+Inf" if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels(dict(labels, le=le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(snap['sum'])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {snap['count']}")
+        return lines
+
+
+def _register(cls, name, *args, **kwargs):
+    """Metrics are get-or-create by name, so two modules can share one (e.g. APRS-IS connects)."""
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, *args, **kwargs)
+        elif kwargs.get('fn'):
+            metric.fn = kwargs['fn']  # Re-registering a scrape-time metric points it at the new source
+        return metric
+
+
+def counter(name, help_text, labels=(), fn=None):
+    return _register(Counter, name, help_text, labels, fn=fn)
+
+
+def gauge(name, help_text, labels=(), fn=None):
+    return _register(Gauge, name, help_text, labels, fn=fn)
+
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram, name, help_text, labels, buckets=buckets)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{k}="{v}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float('inf'), float('-inf')):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+# Shared by every module that calls a web API (weather, AI, aprs.fi, satellites, APRS HTTP uplink)
+HTTP_LATENCY = histogram("meshupgrade_http_request_seconds", "Upstream HTTP request time by host and outcome",
+                         ("host", "outcome"))
+
+
+@contextlib.contextmanager
+def http_timer(url):
+    """Time one upstream HTTP call; url may be a full URL or a bare host name."""
+    host = urlsplit(url).hostname if "://" in url else url
+    start = time.monotonic()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        HTTP_LATENCY.observe(time.monotonic() - start, host=host, outcome=outcome)
+
+
+def _resident_memory():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _max_resident_memory():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+_start_time = time.time()
+gauge("process_threads", "Live Python threads", fn=threading.active_count)
+gauge("process_resident_memory_bytes", "Resident set size", fn=_resident_memory)
+gauge("process_max_resident_memory_bytes", "Peak resident set size", fn=_max_resident_memory)
+counter("process_cpu_seconds_total", "CPU time used by the process", fn=time.process_time)
+gauge("process_start_time_seconds", "Process start time (unix epoch)", fn=lambda: _start_time)
+
+
+def render():
+    """Everything in the registry in the Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    out = []
+    for metric in metrics:
+        try:
+            lines = metric.render()
+        except Exception as e:
+            log.debug(f"Metric {metric.name} failed to collect: {e}")
+            continue
+        out.append(f"# HELP {metric.name} {metric.help}")
+        out.append(f"# TYPE {metric.name} {metric.kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        log.debug("Metrics request from %s: %s", self.client_address[0], fmt % args)
+
+
+def start_server(port, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread. Binds to localhost unless told otherwise."""
+    server = http.server.ThreadingHTTPServer((host, int(port)), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info(f"Metrics endpoint listening on http://{host}:{server.server_port}/metrics")
+    return server
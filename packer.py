@@ -0,0 +1,76 @@
+"""
+packer.py — MeshUpGrade Message Packer
+Splits outbound text into as few mesh packets as possible. Sizes are measured
+in UTF-8 bytes (what the radio actually carries, so emoji count 4), splits land
+on whitespace whenever a word fits, and multi-part messages get compact
+" (1/3)" markers. Nothing is cut silently: if a message needs more than
+max_parts packets, the last one ends with "…" and pack() reports it.
+"""
+
+MAX_PACKET_BYTES = 200  # RULE #1: every packet stays under 200 characters (bytes >= characters)
+TRUNCATED = "…"
+
+_SPACES = b" \n\t"
+
+
+def utf8_len(text):
+    return len(text.encode('utf-8'))
+
+
+def _marker(i, n):
+    return f" ({i}/{n})"
+
+
+def _cut(data, limit):
+    """Index to cut UTF-8 bytes at so the head is <= limit bytes, preferring whitespace."""
+    if len(data) <= limit:
+        return len(data)
+    cut = limit
+    while cut > 0 and (data[cut] & 0xC0) == 0x80:  # Never split inside a character
+        cut -= 1
+    space = max(data.rfind(c, 0, cut + 1) for c in _SPACES)
+    if space > 0:
+        return space
+    return cut or limit
+
+
+def _split(data, limit):
+    parts = []
+    while data:
+        cut = _cut(data, limit)
+        head = data[:cut].rstrip(_SPACES)
+        if head:
+            parts.append(head)
+        data = data[cut:].lstrip(_SPACES)
+    return parts
+
+
+def pack(text, budget=MAX_PACKET_BYTES, max_parts=None):
+    """Split text into packets of at most budget UTF-8 bytes. Returns (parts, truncated)."""
+    data = text.strip().encode('utf-8')
+    if len(data) <= budget:
+        return [text.strip()], False
+
+    # The marker width depends on the part count, so settle the count first (1-2 rounds)
+    n = 2
+    while True:
+        parts = _split(data, budget - utf8_len(_marker(n, n)))
+        if len(parts) <= n or len(str(len(parts))) == len(str(n)):
+            n = len(parts)
+            break
+        n = len(parts)
+
+    truncated = bool(max_parts) and n > max_parts
+    if truncated:
+        n = max_parts
+        limit = budget - utf8_len(_marker(n, n))
+        parts = parts[:n]
+        tail = TRUNCATED.encode('utf-8')
+        last = parts[-1]
+        if len(last) + len(tail) > limit:
+            last = last[:_cut(last, limit - len(tail))].rstrip(_SPACES)
+        parts[-1] = last + tail
+
+    if n == 1:
+        return [parts[0].decode('utf-8')], truncated
+    return [p.decode('utf-8') + _marker(i, n) for i, p in enumerate(parts, 1)], truncated
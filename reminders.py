@@ -1,16 +1,21 @@
 import threading
 import time
-import json
-import os
 import logging
 import re
+import uuid
 from datetime import datetime
 
+from storage import get_storage
+
+log = logging.getLogger(__name__)
+
 class ReminderManager:
     def __init__(self, callback_send):
         self.filename = "reminders.json"
+        self.storage = get_storage()
         self.callback_send = callback_send
         self.reminders = []
+        self._lock = threading.Lock()  # Command workers add while the sweep thread removes
         self.load_reminders()
         
         # Start the background sweep thread
@@ -18,29 +23,37 @@ class ReminderManager:
         self.thread.start()
 
     def load_reminders(self):
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, 'r') as f:
-                    self.reminders = json.load(f)
-            except Exception as e:
-                logging.error(f"Failed to load reminders.json: {e}")
-                self.reminders = []
+        try:
+            # Each reminder is its own row, keyed by a generated id
+            self.storage.migrate_json(self.filename, {
+                "reminders": lambda lst: {uuid.uuid4().hex[:12]: r for r in lst},
+            })
+            rows = self.storage.load("reminders")
+            self.reminders = []
+            for rid, r in rows.items():
+                r["id"] = rid
+                self.reminders.append(r)
+            self.reminders.sort(key=lambda r: r["timestamp"])
+        except Exception as e:
+            log.error(f"Failed to load reminders: {e}")
+            self.reminders = []
 
     def save_reminders(self):
         try:
-            with open(self.filename, 'w') as f:
-                json.dump(self.reminders, f, indent=4)
+            self.storage.sync("reminders", {r["id"]: r for r in self.reminders})
         except Exception as e:
-            logging.error(f"Failed to save reminders.json: {e}")
+            log.error(f"Failed to save reminders: {e}")
 
     def add_reminder(self, sender, channel_index, timestamp, message):
-        self.reminders.append({
-            "sender": sender,
-            "channel_index": channel_index,
-            "timestamp": timestamp,
-            "message": message
-        })
-        self.save_reminders()
+        with self._lock:
+            self.reminders.append({
+                "id": uuid.uuid4().hex[:12],
+                "sender": sender,
+                "channel_index": channel_index,
+                "timestamp": timestamp,
+                "message": message
+            })
+            self.save_reminders()
 
     def parse_command(self, msg, sender, channel_index):
         # Expected: RMD HH:MM [YYYY-MM-DD] Message
@@ -109,25 +122,26 @@ class ReminderManager:
                 pending = []
                 remaining = []
                 
-                for r in self.reminders:
-                    if r["timestamp"] <= now:
-                        pending.append(r)
-                    else:
-                        remaining.append(r)
-                        
-                if pending:
-                    self.reminders = remaining
-                    self.save_reminders()
-                    
-                    for task in pending:
-                        formatted_msg = f"⏰ REMINDER:\n{task['message']}"
-                        logging.info(f"Triggering reminder for {task['sender']}")
-                        try:
-                            self.callback_send(task['sender'], formatted_msg, task['channel_index'])
-                        except Exception as e:
-                            logging.error(f"Failed to trigger reminder callback: {e}")
+                with self._lock:
+                    for r in self.reminders:
+                        if r["timestamp"] <= now:
+                            pending.append(r)
+                        else:
+                            remaining.append(r)
+
+                    if pending:
+                        self.reminders = remaining
+                        self.save_reminders()
+
+                for task in pending:
+                    formatted_msg = f"⏰ REMINDER:\n{task['message']}"
+                    log.info(f"Triggering reminder for {task['sender']}")
+                    try:
+                        self.callback_send(task['sender'], formatted_msg, task['channel_index'])
+                    except Exception as e:
+                        log.error(f"Failed to trigger reminder callback: {e}")
                             
             except Exception as e:
-                logging.error(f"Reminder sweep encountered an error: {e}")
+                log.error(f"Reminder sweep encountered an error: {e}")
                 
             time.sleep(60) # Sweep every minute
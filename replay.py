@@ -0,0 +1,252 @@
+"""
+replay.py — MeshUpGrade Capture Replay
+Feeds a capture file (see capture.py, "capture_file" in settings.json) back
+through the headless command stack without a radio. Recorded packets enter
+MeshEngine through a stand-in interface exactly as the meshtastic reader
+delivers them, APRS-IS lines go to the SMS gateway and APRS parsers, and
+everything the gateway would transmit is recorded instead.
+
+    python replay.py capture.bin                      # recorded pacing
+    python replay.py capture.bin --speed 20           # 20x faster
+    python replay.py capture.bin --speed 0 --unpaced --out sent.jsonl
+
+Each run uses a scratch directory (its own meshupgrade.db), so the live inbox,
+node cache and SMS routes are never touched. Web lookups (WX, AI, SAT) still
+go to the real services.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+
+from capture import read_capture, KIND_PACKET, KIND_APRS
+
+log = logging.getLogger("replay")
+
+_packet_ids = itertools.count(0x10000000)  # Shared by every stand-in so ids never collide
+ACK_POLL = 0.005   # Seconds between checks that the engine has registered a DM before ACKing it
+ACK_GIVE_UP = 10   # Seconds to wait for that registration before dropping the ACK
+
+
+class ReplayInterface:
+    """Stand-in for a meshtastic interface: sendText is recorded, never transmitted."""
+
+    def __init__(self, radio_name, sent, on_dm=None):
+        self.radio_name = radio_name
+        self.sent = sent
+        self.on_dm = on_dm  # on_dm(iface, dest_id, packet_id) for every DM sent with wantAck
+        self.nodes = {}
+        self.localNode = None
+        self.queue = {}
+
+    def sendText(self, text, destinationId=None, wantAck=False, channelIndex=0, **kwargs):
+        packet_id = next(_packet_ids)
+        self.sent.append({'t': time.time(), 'radio': self.radio_name, 'id': packet_id, 'dest': destinationId,
+                          'channel': channelIndex, 'want_ack': wantAck, 'text': text})
+        if wantAck and destinationId and self.on_dm:
+            self.on_dm(self, destinationId, packet_id)
+        return types.SimpleNamespace(id=packet_id)
+
+    def sendHeartbeat(self):
+        pass
+
+    def getMyNodeInfo(self):
+        return None
+
+    def getShortName(self):
+        return None
+
+    def getLongName(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class ReplaySocket:
+    """Stand-in for the APRS-IS session socket: send() is recorded."""
+
+    def __init__(self, sent):
+        self.sent = sent
+
+    def send(self, data):
+        self.sent.append({'t': time.time(), 'radio': 'aprs-is', 'text': data.decode('utf-8', errors='replace').strip()})
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class Replayer:
+    def __init__(self, app, speed=1.0, ack_delay=0.5, callsign=None):
+        self.engine = app['engine']
+        self.sms_gateway = app['sms_gateway']
+        self.aprs_mgr = app['aprs_mgr']
+        self.dispatcher = app['dispatcher']
+        self.speed = speed            # 1 = recorded pacing, N = N times faster, 0 = no waiting at all
+        self.ack_delay = ack_delay    # Seconds before a DM is ACKed back; None = never (exercises retries)
+        self.sent = []
+        self.interfaces = {}
+        self.stats = {'packets': 0, 'aprs_lines': 0, 'unknown': 0}
+
+        # The APRS-IS session "is connected" and writes into the sent log
+        self.sms_gateway.callsign = (callsign or self.sms_gateway.callsign or "NOCALL").upper()
+        self.session = self.sms_gateway.session
+        self.session.configure(self.sms_gateway.callsign, self.sms_gateway.passcode or "-1")
+        self.session.sock = ReplaySocket(self.sent)
+        self.session.connected = True
+
+    def unpace(self):
+        """Lift every airtime budget so the replay measures processing, not LoRa duty cycle."""
+        from engine import TokenBucket
+        outbound = self.engine.outbound
+        outbound.channel_rate = outbound.channel_burst = 1e6
+        outbound.dest_rate = outbound.dest_burst = 1e6
+        outbound.min_gap = 0
+        for radio in self.engine.radios:
+            radio.airtime = TokenBucket(1e6, 1e6)
+
+    def _interface(self, radio_name):
+        iface = self.interfaces.get(radio_name)
+        if iface is None:
+            on_dm = self._ack_later if self.ack_delay is not None else None
+            iface = self.interfaces[radio_name] = ReplayInterface(radio_name, self.sent, on_dm)
+            if radio_name == self.engine.primary.name:
+                self.engine.interface = iface
+            else:
+                from engine import Radio
+                radio = Radio(radio_name, 'replay')
+                radio.interface = iface
+                self.engine.extra_radios.append(radio)
+        return iface
+
+    def _ack_later(self, iface, dest_id, packet_id):
+        ack = {
+            'from': 0, 'fromId': dest_id, 'id': next(_packet_ids),
+            'decoded': {'portnum': 'ROUTING_APP', 'requestId': packet_id, 'routing': {'errorReason': 'NONE'}},
+        }
+        delay = self.ack_delay / self.speed if self.speed else self.ack_delay
+        self._ack_when_tracked(ack, iface, packet_id, delay, time.monotonic() + delay + ACK_GIVE_UP)
+
+    def _ack_when_tracked(self, ack, iface, packet_id, delay, give_up):
+        """Deliver ack after delay, but never before the engine has put packet_id in its ACK tracker.
+
+        on_dm runs inside sendText, before the engine has even seen the packet id, so however
+        short the delay, the ACK waits until the DM it acknowledges is registered.
+        """
+        def check():
+            if packet_id in self.engine.ack_tracker:
+                self.engine._on_receive(ack, iface)
+            elif time.monotonic() < give_up:
+                self._ack_when_tracked(ack, iface, packet_id, ACK_POLL, give_up)
+            else:
+                log.debug(f"DM {packet_id} never showed up in the ACK tracker; not ACKing it.")
+        timer = threading.Timer(delay, check)
+        timer.daemon = True
+        timer.start()
+
+    def feed(self, kind, record):
+        if kind == KIND_PACKET:
+            self.stats['packets'] += 1
+            self.engine._on_receive(record['packet'], self._interface(record['radio']))
+        elif kind == KIND_APRS:
+            self.stats['aprs_lines'] += 1
+            if record['source'] == 'is':
+                self.session.dispatch(record['line'])
+            elif record['source'] == 'sms':  # Captures from before the shared session
+                self.sms_gateway._parse_line(record['line'])
+            else:
+                self.aprs_mgr._parse_rx(record['line'], self.aprs_mgr.rx_users)
+        else:
+            self.stats['unknown'] += 1
+
+    def run(self, path):
+        """Replay path at the configured speed; returns seconds spent feeding it."""
+        self._interface(self.engine.primary.name)  # Outbound works even before the first packet
+        start = first_ts = None
+        for ts, kind, record in read_capture(path):
+            if start is None:
+                start, first_ts = time.monotonic(), ts
+            elif self.speed:
+                delay = (ts - first_ts) / self.speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            self.feed(kind, record)
+        return time.monotonic() - start if start is not None else 0.0
+
+    def idle(self):
+        d = self.dispatcher.stats()
+        return (not d['queue_depth'] and not d['active_senders']
+                and not any(self.engine.outbound.depths().values()) and not len(self.engine.ack_tracker))
+
+    def drain(self, timeout):
+        """Wait for queued commands, transmissions and ACKs to settle. False on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.idle():
+                return True
+            time.sleep(0.05)
+        return self.idle()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a MeshUpGrade capture without a radio.")
+    parser.add_argument("capture", help="capture file written in capture mode")
+    parser.add_argument("--settings", default="settings.json", help="settings.json to build the gateway from")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = recorded pacing, N = N times faster, 0 = flat out")
+    parser.add_argument("--unpaced", action="store_true", help="ignore airtime budgets when transmitting")
+    parser.add_argument("--ack-delay", type=float, default=0.5, help="seconds until each DM is ACKed")
+    parser.add_argument("--no-acks", action="store_true", help="never ACK DMs (exercises retries and the inbox)")
+    parser.add_argument("--drain", type=float, default=60, help="max seconds to wait for work to settle at the end")
+    parser.add_argument("--workdir", help="directory for the replay's database (default: a new temp dir)")
+    parser.add_argument("--out", help="write every captured send as JSON lines here")
+    args = parser.parse_args()
+
+    import headless  # Sets up logging
+    settings = headless.load_settings(args.settings)
+    headless.apply_log_settings(settings)
+
+    capture_path = os.path.abspath(args.capture)
+    out_path = os.path.abspath(args.out) if args.out else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="meshupgrade-replay-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    log.info(f"Replaying {capture_path} in {workdir}")
+
+    app = headless.build(settings)
+    replayer = Replayer(app, speed=args.speed, ack_delay=None if args.no_acks else args.ack_delay,
+                        callsign=settings.get("callsign"))
+    if args.unpaced:
+        replayer.unpace()
+
+    started = time.monotonic()
+    fed = replayer.run(capture_path)
+    settled = replayer.drain(args.drain)
+    elapsed = time.monotonic() - started
+    d = app['dispatcher'].stats()
+    app['engine'].close()
+
+    if out_path:
+        with open(out_path, "w") as f:
+            for row in replayer.sent:
+                f.write(json.dumps(row) + "\n")
+
+    s = replayer.stats
+    print(f"Replayed {s['packets']} packets and {s['aprs_lines']} APRS-IS lines in {fed:.2f}s")
+    print(f"Commands: {d['completed']} done ({d['completed'] / max(elapsed, 1e-9):.1f}/s end to end), "
+          f"{d['dropped']} dropped, {d['errors']} errors; "
+          f"queue wait avg {d['queue_wait_avg'] * 1000:.1f} ms / max {d['queue_wait_max'] * 1000:.1f} ms; "
+          f"handler avg {d['latency_avg'] * 1000:.1f} ms / max {d['latency_max'] * 1000:.1f} ms")
+    print(f"Captured sends: {len(replayer.sent)}" + ("" if settled else " (timed out waiting for work to settle)"))
+    return 0 if settled else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,6 @@ Provides real-time ISS position and next-pass predictions for any location.
 Uses only Python stdlib + free public APIs (no API key required).
 """
 
-import http.client
 import json
 import logging
 import math
@@ -12,20 +11,28 @@ import threading
 import time
 import urllib.parse
 
+import endpoints
+import metrics
 
-WHICHSAT_HOST = "api.wheretheiss.at"
+log = logging.getLogger(__name__)
 
 
-def _http_get_json(host, path, timeout=8):
+WHICHSAT = "wheretheiss"  # Endpoint names, see endpoints.py
+PEOPLE_IN_SPACE = "people_in_space"
+
+
+def _http_get_json(service, path, timeout=8):
+    host = endpoints.host(service)
     try:
-        conn = http.client.HTTPSConnection(host, 443, timeout=timeout)
-        conn.request("GET", path, headers={"User-Agent": "MeshUpGrade/0.3"})
-        resp = conn.getresponse()
-        raw = resp.read().decode("utf-8", errors="ignore")
-        conn.close()
+        with metrics.http_timer(host):
+            conn, base_path = endpoints.http_connection(service, timeout=timeout)
+            conn.request("GET", base_path + path, headers={"User-Agent": "MeshUpGrade/0.3"})
+            resp = conn.getresponse()
+            raw = resp.read().decode("utf-8", errors="ignore")
+            conn.close()
         return json.loads(raw)
     except Exception as e:
-        logging.error(f"SAT HTTP error ({host}{path}): {e}")
+        log.error(f"SAT HTTP error ({host}{path}): {e}")
         return None
 
 
@@ -38,7 +45,7 @@ def _compass(degrees):
 
 def get_iss_position():
     """Return a formatted string with the ISS's current position and speed."""
-    data = _http_get_json(WHICHSAT_HOST, "/v1/satellites/25544")
+    data = _http_get_json(WHICHSAT, "/v1/satellites/25544")
     if not data:
         return "Couldn't reach satellite API. Try again shortly."
 
@@ -66,7 +73,7 @@ def get_next_pass(lat, lon, alt_m=0, n=2):
     Estimate the next ISS passes over (lat, lon) using live ISS position
     and simple ground-track projection. Accurate to ±5–10 minutes.
     """
-    data = _http_get_json(WHICHSAT_HOST, "/v1/satellites/25544")
+    data = _http_get_json(WHICHSAT, "/v1/satellites/25544")
     if not data:
         return "Couldn't reach satellite API. Try again shortly."
 
@@ -152,7 +159,7 @@ def get_next_pass(lat, lon, alt_m=0, n=2):
 def get_iss_crew():
     """Return who is currently aboard the ISS."""
     # Use the lldev.de openly maintained space people API
-    data = _http_get_json("www.howmanypeopleareinspacerightnow.com", "/peopleinspaceapi.php")
+    data = _http_get_json(PEOPLE_IN_SPACE, "/peopleinspaceapi.php")
     if data:
         crew_list = [p.get("name", "?") for p in data.get("people", []) if p.get("craft", "").upper() == "ISS"]
         if crew_list:
@@ -161,7 +168,7 @@ def get_iss_crew():
             return "\n".join(lines)
 
     # Fallback: at minimum confirm ISS is crewed from its own API status
-    meta = _http_get_json(WHICHSAT_HOST, "/v1/satellites/25544")
+    meta = _http_get_json(WHICHSAT, "/v1/satellites/25544")
     if meta:
         alt = float(meta.get("altitude", 0))
         return f"👨‍🚀 ISS is active at {alt:.0f} km.\nCrew names temporarily unavailable."
@@ -1,27 +1,31 @@
-import os
-import json
 import logging
+import threading
+
+from storage import get_storage
+
+log = logging.getLogger(__name__)
 
 class SmsContactsManager:
     def __init__(self):
         self.filename = "sms_contacts.json"
+        self.storage = get_storage()
         self.contacts = {}
+        self._lock = threading.Lock()  # Senders' commands run on parallel workers
         self.load_contacts()
 
     def load_contacts(self):
-        if os.path.exists(self.filename):
-            try:
-                with open(self.filename, 'r') as f:
-                    self.contacts = json.load(f)
-            except Exception as e:
-                logging.error(f"Failed to load sms_contacts.json: {e}")
+        try:
+            self.storage.migrate_json(self.filename, {"sms_contacts": None})
+            self.contacts = self.storage.load("sms_contacts")
+        except Exception as e:
+            log.error(f"Failed to load SMS contacts: {e}")
 
     def save_contacts(self):
+        # One row per sender's address book
         try:
-            with open(self.filename, 'w') as f:
-                json.dump(self.contacts, f, indent=4)
+            self.storage.sync("sms_contacts", self.contacts)
         except Exception as e:
-            logging.error(f"Failed to save sms_contacts.json: {e}")
+            log.error(f"Failed to save SMS contacts: {e}")
 
     def add_contact(self, sender, name, number):
         name = name.lower().strip()
@@ -30,19 +34,18 @@ class SmsContactsManager:
         if len(stripped_num) < 10:
             return False, "Error: Invalid number. Must be at least 10 digits."
             
-        if sender not in self.contacts:
-            self.contacts[sender] = {}
-        
-        self.contacts[sender][name] = stripped_num
-        self.save_contacts()
+        with self._lock:
+            self.contacts.setdefault(sender, {})[name] = stripped_num
+            self.save_contacts()
         return True, f"Contact '{name}' successfully saved as {stripped_num}."
 
     def del_contact(self, sender, name):
         name = name.lower().strip()
-        if sender in self.contacts and name in self.contacts[sender]:
-            del self.contacts[sender][name]
-            self.save_contacts()
-            return True, f"Contact '{name}' deleted."
+        with self._lock:
+            if sender in self.contacts and name in self.contacts[sender]:
+                del self.contacts[sender][name]
+                self.save_contacts()
+                return True, f"Contact '{name}' deleted."
         return False, f"Error: Contact '{name}' not found in your directory."
 
     def get_number(self, sender, name):
@@ -55,6 +58,7 @@ class SmsContactsManager:
         if sender not in self.contacts or not self.contacts[sender]:
             return "No contacts saved."
         lines = ["-Your Contacts-"]
-        for name, number in self.contacts[sender].items():
-            lines.append(f"{name}: {number}")
+        with self._lock:
+            for name, number in self.contacts[sender].items():
+                lines.append(f"{name}: {number}")
         return "\n".join(lines)
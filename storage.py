@@ -0,0 +1,195 @@
+"""
+storage.py — MeshUpGrade State Store
+Embedded SQLite database (WAL mode) that holds every manager's persistent state
+as one row per record, replacing the JSON files that were rewritten in full on
+every change. Saves only touch the rows that actually changed and each save
+is a single atomic transaction, so a crash can no longer leave a half-written
+file behind.
+
+The legacy JSON files are imported once, the first time a namespace is used,
+and renamed to <file>.migrated afterwards.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+DB_FILE = "meshupgrade.db"
+
+
+class Storage:
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._lock = threading.RLock()
+        # Last value written per (namespace, key), serialized, so sync() can skip unchanged rows
+        self._written = {}
+        self._staged = None  # (ns, key) -> raw, or None for a delete; applied to _written on COMMIT
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (ns, key)) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS migrations (source TEXT PRIMARY KEY, migrated_at REAL NOT NULL)"
+        )
+
+    def migrate_json(self, json_file, namespaces):
+        """One-time import of a legacy JSON file.
+
+        namespaces maps namespace -> split function that turns the loaded JSON into
+        a {key: value} dict for that namespace (None means the file already is one).
+        """
+        with self._lock:
+            if self.conn.execute("SELECT 1 FROM migrations WHERE source = ?", (json_file,)).fetchone():
+                return
+            data = None
+            if os.path.exists(json_file):
+                try:
+                    with open(json_file, 'r') as f:
+                        data = json.load(f)
+                except Exception as e:
+                    log.error(f"Error loading {json_file} for migration: {e}")
+                    return
+
+            with self._transaction():
+                if data is not None:
+                    for ns, split in namespaces.items():
+                        records = split(data) if split else data
+                        for key, value in (records or {}).items():
+                            self._upsert(ns, key, value)
+                self.conn.execute("INSERT INTO migrations VALUES (?, ?)", (json_file, time.time()))
+
+            if data is not None:
+                try:
+                    os.replace(json_file, json_file + ".migrated")
+                except OSError as e:
+                    log.warning(f"Could not rename migrated {json_file}: {e}")
+                log.info(f"Migrated {json_file} into {self.path} ({', '.join(namespaces)}).")
+
+    def load(self, ns):
+        """Return {key: value} for every record in a namespace."""
+        with self._lock:
+            rows = self.conn.execute("SELECT key, value FROM records WHERE ns = ?", (ns,)).fetchall()
+            cache = self._written.setdefault(ns, {})
+            result = {}
+            for key, raw in rows:
+                cache[key] = raw
+                result[key] = json.loads(raw)
+            return result
+
+    def put(self, ns, key, value):
+        with self._lock, self._transaction():
+            self._upsert(ns, key, value)
+
+    def delete(self, ns, key):
+        with self._lock, self._transaction():
+            self._delete(ns, key)
+
+    def apply(self, ns, upserts=None, deletes=()):
+        """Write a batch of known changes (e.g. dirty records) in one transaction."""
+        with self._lock, self._transaction():
+            for key, value in (upserts or {}).items():
+                self._upsert(ns, key, value)
+            for key in deletes:
+                self._delete(ns, key)
+
+    def sync(self, ns, mapping):
+        """Make the namespace match mapping, writing only rows that changed. Returns rows written."""
+        with self._lock:
+            cache = self._written.setdefault(ns, {})
+            changed = []
+            for key, value in list(mapping.items()):
+                raw = json.dumps(value, separators=(',', ':'))
+                if cache.get(str(key)) != raw:
+                    changed.append((str(key), raw))
+            keys = {str(k) for k in list(mapping)}
+            removed = [key for key in cache if key not in keys]
+            if not changed and not removed:
+                return 0
+            with self._transaction():
+                for key, raw in changed:
+                    self._upsert_raw(ns, key, raw)
+                for key in removed:
+                    self._delete(ns, key)
+            return len(changed) + len(removed)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    def _upsert(self, ns, key, value):
+        self._upsert_raw(ns, str(key), json.dumps(value, separators=(',', ':')))
+
+    def _upsert_raw(self, ns, key, raw):
+        self.conn.execute(
+            "INSERT INTO records (ns, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (ns, key) DO UPDATE SET value = excluded.value",
+            (ns, key, raw),
+        )
+        self._staged[(ns, key)] = raw
+
+    def _delete(self, ns, key):
+        self.conn.execute("DELETE FROM records WHERE ns = ? AND key = ?", (ns, str(key)))
+        self._staged[(ns, str(key))] = None
+
+
+class _Transaction:
+    """BEGIN/COMMIT around a batch of writes. The write cache only learns about them once
+    COMMIT succeeds, so a rolled-back row is still seen as changed by the next sync()."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.conn = storage.conn
+
+    def __enter__(self):
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+            self.storage._staged = {}
+            self.owner = True
+        else:
+            self.owner = False
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.owner:
+            return False
+        staged, self.storage._staged = self.storage._staged, None
+        try:
+            if exc_type:
+                return False
+            self.conn.execute("COMMIT")
+        finally:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+        for (ns, key), raw in staged.items():
+            cache = self.storage._written.setdefault(ns, {})
+            if raw is None:
+                cache.pop(key, None)
+            else:
+                cache[key] = raw
+        return False
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_storage():
+    """Shared Storage instance for the process (one connection, one WAL)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Storage()
+        return _default
@@ -0,0 +1,186 @@
+"""
+sweeper.py — MeshUpGrade Subnet Sweeper
+Finds Meshtastic nodes by probing their TCP API port (4403) across one or more
+IPv4 networks. All probes run on a single asyncio event loop instead of a
+thread per host, with a cap on concurrent connects and on connects per second
+so a sweep does not flood a small Wi-Fi network. Hits are reported to the
+callback as soon as they answer, not at the end of the sweep.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+import struct
+import sys
+import time
+
+log = logging.getLogger(__name__)
+
+MESHTASTIC_PORT = 4403
+MIN_PREFIX = 16  # Largest network we agree to sweep (/16 = 65534 hosts)
+
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+
+
+def _default_route_ip():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(('10.255.255.255', 1))
+        return s.getsockname()[0]
+    except Exception:
+        return None
+    finally:
+        s.close()
+
+
+def _interface_addresses():
+    """(ip, netmask) for every IPv4 interface that is up. Linux only; empty elsewhere."""
+    try:
+        import fcntl
+    except ImportError:
+        return []
+    found = []
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for _, name in socket.if_nameindex():
+            req = struct.pack('256s', name[:15].encode())
+            try:
+                ip = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, req)[20:24])
+                mask = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFNETMASK, req)[20:24])
+            except OSError:
+                continue  # No IPv4 address on this interface
+            found.append((ip, mask))
+    except OSError as e:
+        log.debug(f"Interface enumeration failed: {e}")
+    finally:
+        s.close()
+    return found
+
+
+def local_addresses():
+    """Every local IPv4 address we know about (used to skip ourselves in a sweep)."""
+    addrs = {ip for ip, _ in _interface_addresses()}
+    default_ip = _default_route_ip()
+    if default_ip:
+        addrs.add(default_ip)
+    return addrs
+
+
+def local_networks(max_prefix=24):
+    """The network of every non-loopback local interface, narrowed to at most a /max_prefix
+    around the interface address (a 10.0.0.0/8 LAN is swept as its /24, like before)."""
+    networks = []
+    for ip, mask in _interface_addresses():
+        net = ipaddress.ip_network(f"{ip}/{mask}", strict=False)
+        if net.is_loopback or net.is_link_local:
+            continue
+        if net.prefixlen < max_prefix:
+            net = ipaddress.ip_network(f"{ip}/{max_prefix}", strict=False)
+        if net not in networks:
+            networks.append(net)
+    if not networks:
+        default_ip = _default_route_ip()
+        if default_ip and not default_ip.startswith('127.'):
+            networks.append(ipaddress.ip_network(f"{default_ip}/{max_prefix}", strict=False))
+    return networks
+
+
+def parse_networks(specs):
+    """Turn CIDR strings (or networks) into IPv4Network objects, refusing anything wider than /16."""
+    if isinstance(specs, (str, ipaddress.IPv4Network)):
+        specs = [specs]
+    networks = []
+    for spec in specs:
+        net = ipaddress.ip_network(spec, strict=False)
+        if net.version != 4:
+            raise ValueError(f"Only IPv4 networks can be swept: {spec}")
+        if net.prefixlen < MIN_PREFIX:
+            raise ValueError(f"Network {net} is larger than /{MIN_PREFIX}")
+        if net not in networks:
+            networks.append(net)
+    return networks
+
+
+def port_open(host, port=MESHTASTIC_PORT, timeout=0.75):
+    """Single blocking probe: does host accept TCP connections on port?"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class SubnetSweeper:
+    def __init__(self, port=MESHTASTIC_PORT, timeout=0.75, concurrency=256, rate=2000):
+        self.port = port
+        self.timeout = timeout          # Per-host connect timeout (slow ESP32 handshakes need ~750ms)
+        self.concurrency = concurrency  # Connects in flight at once
+        self.rate = rate                # New connects per second (0 = unlimited)
+        self.stats = {'probed': 0, 'found': 0, 'elapsed': 0.0}
+
+    async def _probe(self, ip, sem, found, on_found):
+        loop = asyncio.get_running_loop()
+        sock = None
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            await asyncio.wait_for(loop.sock_connect(sock, (ip, self.port)), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return
+        finally:
+            if sock:
+                sock.close()
+            sem.release()
+        found.append(ip)
+        if on_found:
+            try:
+                on_found(ip)
+            except Exception as e:
+                log.error(f"Sweep callback failed for {ip}: {e}")
+
+    async def sweep_async(self, networks, on_found=None, exclude=None):
+        """Probe every host in networks; returns the list of IPs with the port open."""
+        networks = parse_networks(networks)
+        exclude = local_addresses() if exclude is None else set(exclude)
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(self.concurrency)
+        interval = 1.0 / self.rate if self.rate else 0
+        found, tasks = [], set()
+        probed = 0
+        start = next_start = loop.time()
+
+        for net in networks:
+            for host in (net.hosts() if net.num_addresses > 1 else [net.network_address]):
+                ip = str(host)
+                if ip in exclude:
+                    continue
+                await sem.acquire()
+                if interval:
+                    delay = next_start - loop.time()
+                    if delay > 0.002:  # Sleep in small batches; asyncio timers are ~1ms coarse
+                        await asyncio.sleep(delay)
+                    next_start = max(next_start, loop.time() - 0.01) + interval
+                task = loop.create_task(self._probe(ip, sem, found, on_found))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                probed += 1
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        self.stats = {'probed': probed, 'found': len(found), 'elapsed': loop.time() - start}
+        return found
+
+    def sweep(self, networks, on_found=None, exclude=None):
+        """Blocking wrapper around sweep_async (runs its own event loop; call from a worker thread)."""
+        return asyncio.run(self.sweep_async(networks, on_found, exclude))
+
+
+if __name__ == "__main__":
+    targets = sys.argv[1:] or [str(n) for n in local_networks()]
+    print(f"Sweeping {', '.join(targets)} for port {MESHTASTIC_PORT}...")
+    sweeper = SubnetSweeper()
+    t0 = time.time()
+    hits = sweeper.sweep(targets, on_found=lambda ip: print(f"FOUND: {ip}"))
+    print(f"Done in {time.time() - t0:.2f}s. Probed {sweeper.stats['probed']}, found {len(hits)}: {hits}")
@@ -1,6 +1,11 @@
 import requests
 import logging
 from datetime import datetime, timedelta
+from packer import utf8_len, MAX_PACKET_BYTES
+import endpoints
+import metrics
+
+log = logging.getLogger(__name__)
 
 class WeatherPlugin:
     WMO_CODES = {
@@ -14,7 +19,7 @@ class WeatherPlugin:
         self.lat = lat
         self.lon = lon
         self.unit = unit.upper()
-        self.base_url = "https://api.open-meteo.com/v1/forecast"
+        self.base_url = endpoints.url('open_meteo')
 
     def get_weather_data(self):
         params = {
@@ -28,10 +33,11 @@ class WeatherPlugin:
             "timezone": "auto"
         }
         try:
-            response = requests.get(self.base_url, params=params, timeout=10)
+            with metrics.http_timer(self.base_url):
+                response = requests.get(self.base_url, params=params, timeout=10)
             return response.json()
         except Exception as e:
-            logging.error(f"Weather API error: {e}")
+            log.error(f"Weather API error: {e}")
             return None
 
     def format_wx1(self):
@@ -48,9 +54,9 @@ class WeatherPlugin:
             cond = self.WMO_CODES.get(daily['weathercode'][i], "Cldy")
             lines.append(f"{day_name}:{hi}/{lo}{'°' + self.unit} {cond}")
 
-        # Join with | separator and confirm it fits
+        # Join with | separator and confirm it fits one packet
         result = " | ".join(lines)
-        if len(result) > 190:
+        if utf8_len(result) > MAX_PACKET_BYTES:
             result = "\n".join(lines)  # fallback: newline-separated is more compact
         return result
 
@@ -139,17 +145,15 @@ class WeatherPlugin:
             sev   = (alert['severity'] or '?')[:10]
             lines.append(f"{event} ({sev})")
 
-        result = "\n".join(lines)
-        if len(result) > 190:
-            result = result[:187] + "..."
-        return result
+        return "\n".join(lines)
 
     def get_alerts(self):
         # NWS API requires a User-Agent
         headers = {'User-Agent': 'MeshUpGrade (meshtastic-alert-system)'}
-        url = f"https://api.weather.gov/alerts/active?point={self.lat},{self.lon}"
+        url = f"{endpoints.url('nws')}/alerts/active?point={self.lat},{self.lon}"
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            with metrics.http_timer(url):
+                response = requests.get(url, headers=headers, timeout=10)
             data = response.json()
             alerts = []
             for feature in data.get('features', []):
@@ -163,5 +167,5 @@ class WeatherPlugin:
                 })
             return alerts
         except Exception as e:
-            logging.error(f"NWS Alert API error: {e}")
+            log.error(f"NWS Alert API error: {e}")
             return []